@@ -1,6 +1,6 @@
 # import needed packages
 import dash
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_floorplan
@@ -9,14 +9,27 @@ from dash.exceptions import PreventUpdate
 from datetime import datetime as dt
 import pandas as pd
 import numpy as np
-import base64
-import io
 import pickle
-
-app = dash.Dash(__name__) # create app; also uses assets folder for stylesheets
+import json
+from collections import OrderedDict
+from winterthur_data import PARAMETER_COLUMNS, PARAMETER_OPTIONS
+from winterthur_store import MISSING_ROOM, ingest_pm2, list_rooms, load_room, read_manifest
+from winterthur_cache import cached
+from winterthur_swing import SWING_OPTIONS, SWING_PERIODS, calendar_swings, swing_statistics
+from winterthur_setpoints import SETPOINT_OPTIONS, setpoint_bounds, setpoint_table
+from winterthur_excursions import (EXCURSION_COLUMNS, EXCURSION_HYSTERESIS, MIN_EXCURSION_MINUTES, find_excursions,
+                                   excursion_summary, excursion_records)
+from winterthur_preservation import MECHANICAL_RH_LIMIT, RISK_LEVELS, preservation_indices, risk_colors
+from winterthur_app import CallbackRegistry, make_app
+from winterthur_jobs import POLL_INTERVAL, submit_job, cancel_job, job_outputs, no_progress
+from winterthur_batch import (SUGGESTED_BOUNDS, SUGGESTED_SWING, batch_analysis, batch_cached, batch_view,
+                              batch_excursions, stack_rooms, room_bounds, room_rolling_swings, bounds_colors, swing_colors)
+from winterthur_metrics import stage
+
+callbacks = CallbackRegistry() # callbacks of the interface; the app is made by create_app
 
 # app layout
-app.layout = html.Div([
+layout = html.Div([
     # title
     html.Div([
         html.H1(children='Winterthur Bounds and Swing Analysis Interface', style={'textAlign': 'center',"margin-bottom": "0px"}),
@@ -33,6 +46,11 @@ app.layout = html.Div([
         ),
         # output selected data file filename
         html.Div(id='output-data-upload', style={'display': 'inline-block'}),
+        # rooms uploaded in an earlier session are kept in the local data store and can be analyzed again
+        html.H6('Rooms from earlier uploads are kept in the local data store. Select any stored rooms to analyze '
+                'along with the uploaded files:'),
+        html.Div([dcc.Dropdown(id='stored-rooms-dropdown', placeholder='Select stored rooms...', multi=True)],
+                 className='ten columns'),
     ],className='pretty_container twelve columns'),
 
     # data range, parameter, analysis, and bounds selection
@@ -140,24 +158,49 @@ app.layout = html.Div([
         html.Div([
             dcc.Dropdown(
                 id='parameter-dropdown',
-                options=[{'label': 'Temperature', 'value':'Temp'},{'label': 'Relative Humidity','value': 'RH'},
-                         {'label': 'Dew Point', 'value': 'DP'}],
+                options=PARAMETER_OPTIONS, # temperature, RH and the channels derived from them
                 value = 'Temp'
             )
         ],className="three columns"),
+        # batch mode
+        html.Div([
+            dcc.Checklist(
+                id='batch-mode',
+                options=[{'label': 'Analyze every parameter at once (bounds and swing), so that choosing another '
+                                   'parameter or analysis afterwards shows its results without analyzing the files '
+                                   'again. The other parameters use their suggested bounds.', 'value': 'batch'}],
+                value=[]
+            )
+        ],className='twelve columns'),
         # analysis selection
         html.Div([
             html.H6('Select the type of analysis to perform on above selected parameter. '
                     '"Bounds" examines the minimum and maximum of the parameter and "Swing" examines the swing (i.e. '
-                    'the difference between the maximum and minimum value of the parameter over a 24 hour period.'),
+                    'the difference between the maximum and minimum value of the parameter over a 24 hour period. '
+                    'The preservation-risk analyses use temperature and relative humidity, whatever the parameter: '
+                    '"TWPI" is the time-weighted preservation index, the expected life (in years) of organic '
+                    'materials such as paper kept in the room; "Mould Risk" is the progress towards mould growth, '
+                    'where 1 means mould can have started growing; "Mechanical Risk" is the percentage of time the '
+                    'relative humidity was more than {}% from its 30-day moving average.'.format(MECHANICAL_RH_LIMIT)),
         ],className='twelve columns'),
         html.Div([
             dcc.Dropdown(
                 id='analysis-dropdown',
-                options=[{'label': 'Bounds', 'value': 'BoundsAnalysis'}, {'label': 'Swing', 'value': 'SwingAnalysis'}],
+                options=[{'label': 'Bounds', 'value': 'BoundsAnalysis'}, {'label': 'Swing', 'value': 'SwingAnalysis'},
+                         {'label': 'TWPI (preservation index)', 'value': 'TWPIAnalysis'},
+                         {'label': 'Mould Risk', 'value': 'MouldAnalysis'},
+                         {'label': 'Mechanical Risk', 'value': 'MechanicalAnalysis'}],
                 value = 'BoundsAnalysis'
             ),
         ],className="three columns"),
+        # swing mode
+        html.Div([
+            html.H6('Select how the swing is measured. The daily and weekly swings and the hourly rate of change '
+                    'are measured over calendar days, weeks (Monday to Sunday) and clock hours in local time.'),
+            html.Div([
+                dcc.Dropdown(id='swing-mode', options=SWING_OPTIONS, value='rolling')
+            ],className="six columns"),
+        ], id='swing-settings', className='twelve columns'),
         # bounds selection
         html.Div([
             html.H6('Enter minimum and maximum bounds on the parameter selected above:',
@@ -177,18 +220,55 @@ app.layout = html.Div([
             type='number',
             placeholder= 'Enter maximum value...'
         ),
+        # season-dependent set-points
+        html.Div([
+            html.H6('Select how the bounds change through the year. Monthly bounds are entered in the table below; '
+                    'ramped bounds apply in the middle of each month and change gradually in between. A floating '
+                    'band follows the 30-day running mean of the parameter, plus or minus the half-width entered '
+                    'below, within the minimum and maximum above.'),
+            html.Div([
+                dcc.Dropdown(id='setpoint-mode', options=SETPOINT_OPTIONS, value='fixed')
+            ],className="four columns"),
+            html.Div([
+                dash_table.DataTable(
+                    id='setpoint-table',
+                    columns=[{'name': 'Month', 'id': 'Month'},
+                             {'name': 'Minimum', 'id': 'Minimum', 'type': 'numeric', 'editable': True},
+                             {'name': 'Maximum', 'id': 'Maximum', 'type': 'numeric', 'editable': True}],
+                    data=setpoint_table(None, None))
+            ], id='setpoint-table-container', className='six columns'),
+            dcc.Input(id='float-band', type='number', value=5, placeholder='Enter band half-width...'),
+        ], id='setpoint-settings', className='twelve columns'),
+        # excursion settings
+        html.Div([
+            html.H6('Excursions out of bounds shorter than the minimum duration (minutes) are not counted, and an '
+                    'excursion only ends once the parameter is back inside the bounds by the hysteresis (in the units '
+                    'of the parameter; the time back inside the bounds before then is not counted):'),
+            dcc.Input(id='min-duration', type='number', value=MIN_EXCURSION_MINUTES,
+                      placeholder='Enter minimum duration...'),
+            dcc.Input(id='hysteresis', type='number', value=EXCURSION_HYSTERESIS, placeholder='Enter hysteresis...'),
+        ], id='excursion-settings'),
         # analyze button
         html.H6('Click submit button below to analyze data with the selected above constraints. This will output'
                 ' a table of the minimum value, maximum value, and percentage out of bounds for the selected '
                 'parameter for each file.'),
         html.Button(id='submit-button', children='Submit'),
+        html.Button(id='cancel-button', children='Cancel'),
     ], className="pretty_container twelve columns"),
 
     # output text and table
     html.Div([
         html.H4('Output:'),
+        html.Div(id='job-progress'), # progress of a running analysis
+        html.Div(id='job-id', style={'display': 'none'}),
+        dcc.Interval(id='job-interval', interval=POLL_INTERVAL, disabled=True),
         html.Div(id='output-state'),
         html.Div(id='analysis-results',style={'display': 'none'}),
+        html.Div(id='batch-settings',style={'display': 'none'}), # settings of the last batch analysis
+        # suggested values read by the clientside callbacks (see assets/clientside.js)
+        html.Div(id='ui-settings', style={'display': 'none'},
+                 children=json.dumps({'bounds': SUGGESTED_BOUNDS, 'swing': SUGGESTED_SWING,
+                                      'riskAnalyses': list(RISK_LEVELS)})),
         html.Div(id='table'),
     ],className='pretty_container twelve columns'),
 
@@ -260,6 +340,15 @@ app.layout = html.Div([
         html.H6(id='swing-explanation', children = 'For Swing Analysis, red shading indicates a swing over the maximum '
                                                    'desired swing in that room. Green indicates a swing within the desired '
                                                    'swing range.'),
+        html.H6(id='risk-explanation', children = 'For the preservation-risk analyses, green shading indicates a good '
+                                                  'environment, yellow a fair one, and red a risk: a TWPI of at least {} '
+                                                  'years is good and under {} years a risk; mould growth progress under '
+                                                  '{} is good and {} or more a risk; mechanical risk less than {}% of '
+                                                  'the time is good and {}% or more a risk.'.format(
+                                                      RISK_LEVELS['TWPIAnalysis'][0], RISK_LEVELS['TWPIAnalysis'][1],
+                                                      RISK_LEVELS['MouldAnalysis'][0], RISK_LEVELS['MouldAnalysis'][1],
+                                                      RISK_LEVELS['MechanicalAnalysis'][0],
+                                                      RISK_LEVELS['MechanicalAnalysis'][1])),
         # dash floorplan component
         dash_floorplan.DashFloorPlan(
             id='dash-floorplan',
@@ -277,66 +366,268 @@ app.layout = html.Div([
 ])
 
 # FUNCTIONS_____________________________________________________________________________________________________________
-# this function is very specific to Winterthur and their .pm2 files
-# creates dataframe of files
-def parse_data(contents, startDate, endDate, monthsArray):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3])
-    # set date and time column as datetime type
-    df['DATE AND TIME GMT'] = pd.to_datetime(df['DATE AND TIME GMT'])
-    # rename columns
-    df.columns = ['Date and Time in GMT', 'Temperature (Degrees Fahrenheit)', 'Relative Humidity (%)']
-    # select the entered date range, from startDate to endDate
-    maskRange = (df['Date and Time in GMT'] > startDate) & (df['Date and Time in GMT'] <= endDate)
-    df = df.loc[maskRange]
-    # if any specific months are selected, get rid of other months
-    if monthsArray != []: # if any month is selected the array will not be all zeros
-        df['month'] = df['Date and Time in GMT'].map(lambda x: x.strftime('%m'))  # pulls out month from data column
-        df['month'] = pd.to_numeric(df['month'])  # recast month column as ints, not objects
-        df = df[df['month'].isin(monthsArray)]
-    return df
-
-# add DP column to a dataframe that has T and RH
-def add_DP_column(df):
-    # convert F to C:
-    temp = ((df['Temperature (Degrees Fahrenheit)'] - 32) * (5 / 9))
-    RH = df['Relative Humidity (%)']
-    # because converted to C, convert back to F at end of eq
-    df['Dew Point'] =  ((((RH/100)**(1/8))*(112 + 0.9*temp)+0.1*temp - 112) * (9 / 5)) + 32
-    return df
-
-# swing analysis
-def swing_analysis(df, swingInt,columnName): # columnName is a 'string'
-    numEntries = len(df[columnName]) # length of data frame for rh
-    pointsInDay = 24 * 60 / 15  # constant; number data points separated in 15 minute increments = 96 points
-    lastValue = int(numEntries - pointsInDay - 1)     # calculate last "day", last possible complete 24 hour period
-
-    # initialize blank Swing storage array
-    swingArray = np.zeros(numEntries)  # could also be a new column in dataframe
-
-    # for the number of possible 24hr periods in the data set, loop; will be zero for end values
-    for k in range(0, lastValue):
-        jEnd = int(k + pointsInDay)
-        # find maximum and minimum value over a one day period
-        maxRH = max(df[columnName][k:jEnd])
-        minRH = min(df[columnName][k:jEnd])
-        # determine swing over 24 hour period and store in array
-        swingArray[k] = maxRH - minRH
-    df['swing'] = swingArray
-
-    # if swing is greater than permitted, note how many times it is
-    sum = 0
-    for i in range(0, numEntries):
-        if swingArray[i] >= swingInt:
-            sum = sum + 1
-    # sum = number of times RH Swing is out of bounds
-    return swingArray, sum, lastValue, df
+# results of a bounds, swing or preservation-risk analysis of the uploaded files and stored rooms: the text, the
+# floorplan colours, the table and the settings of a batch analysis (None for other analyses). Run as a job
+def analyze_rooms(list_contents, list_filenames, storedRooms, startDate, endDate, monthsArray, parameter, analysis,
+                  inputMin, inputMax, minDuration, hysteresis, setpointMode, setpointTable, band, swingMode, batchMode,
+                  progress=no_progress):
+    # uploaded files are added to the local data store (skipped if already there); every room is then read
+    # from the store, which only loads the year/month partitions of the selected dates
+    rooms = []
+    for filename, contents in zip(list_filenames or [], list_contents or []):
+        progress(0.3 * len(rooms) / len(list_filenames), 'Adding {} to the data store'.format(filename))
+        rooms.append(ingest_pm2(filename, contents)) # a new version of the room gets its own name
+    rooms = rooms + [room for room in storedRooms or [] if room not in rooms]
+    # results are cached under the contents of the rooms, so the same analysis is only run once for all users
+    fingerprint = [(read_manifest(room) or {}).get('contentKey') for room in rooms]
+    settings = [rooms, str(startDate), str(endDate), sorted(monthsArray or []), parameter, analysis, inputMin, inputMax,
+                minDuration, hysteresis, setpointMode, setpointTable, band, swingMode, batchMode]
+    return cached(fingerprint, settings, room_analysis, rooms, startDate, endDate, monthsArray, parameter, analysis,
+                  inputMin, inputMax, minDuration, hysteresis, setpointMode, setpointTable, band, swingMode, batchMode,
+                  progress)
+
+# results of analyze_rooms for rooms in the data store
+@stage('analyse')
+def room_analysis(rooms, startDate, endDate, monthsArray, parameter, analysis, inputMin, inputMax, minDuration,
+                  hysteresis, setpointMode, setpointTable, band, swingMode, batchMode, progress=no_progress):
+    Dict={} # storage
+    columnName = PARAMETER_COLUMNS[parameter]
+
+    if batchMode and analysis in ['BoundsAnalysis', 'SwingAnalysis']:
+        # every parameter at once; the bounds entered are used for the selected parameter
+        bounds = OrderedDict(SUGGESTED_BOUNDS)
+        swings = OrderedDict((name, SUGGESTED_SWING) for name in PARAMETER_COLUMNS)
+        if analysis == 'BoundsAnalysis':
+            bounds[parameter] = (inputMin, inputMax)
+        else:
+            swings[parameter] = inputMax
+        settings = {'rooms': rooms, 'startDate': str(startDate), 'endDate': str(endDate),
+                    'monthsArray': monthsArray, 'bounds': bounds, 'swings': swings,
+                    'minDuration': minDuration or 0, 'hysteresis': hysteresis or 0, 'swingMode': swingMode,
+                    'setpointMode': setpointMode}
+        div, Dict, table = batch_output(settings, parameter, analysis, progress)
+        return div, Dict, table, json.dumps(settings)
+
+    elif analysis == 'BoundsAnalysis':
+        # readings of every room stacked into one array, so the statistics of all rooms are computed at once
+        datasets = load_datasets(rooms, startDate, endDate, monthsArray, progress)
+        values, starts, counts = stack_rooms(datasets, columnName)
+        if setpointMode in [None, 'fixed']:
+            roomBounds = [(inputMin, inputMax)] * len(rooms)
+            lower, upper = inputMin, inputMax
+        else:
+            # bounds of every sample, looked up from its month or day of year (or the running mean)
+            roomBounds = []
+            for filename, dataset in zip(rooms, datasets):
+                progress(0.8 + 0.1 * len(roomBounds) / len(rooms), 'Finding the set-points of {}'.format(filename))
+                roomBounds.append(setpoint_bounds(dataset.times, dataset[columnName], setpointMode, inputMin,
+                                                  inputMax, setpointTable, band))
+            lower = np.concatenate([low for low, high in roomBounds] + [np.zeros(0)])
+            upper = np.concatenate([high for low, high in roomBounds] + [np.zeros(0)])
+        minValueB, maxValueB, numLow, numHigh = room_bounds(values, starts, counts, lower, upper)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentLow = np.round(numLow / counts, 2)
+            percentHigh = np.round(numHigh / counts, 2)
+        storage = pd.DataFrame({'Room Name': rooms,
+                                'Minimum Value': np.round(minValueB, 2),
+                                'Maximum Value': np.round(maxValueB, 2),
+                                'Percent Out of Bounds Total (%)': np.round(percentLow + percentHigh, 2) * 100,
+                                'Percent Over Upper Bound (%)': percentHigh * 100,
+                                'Percent Under Lower Bound (%)': percentLow * 100})
+        # floorplan colours
+        if setpointMode in [None, 'fixed']:
+            over = maxValueB > inputMax
+            under = minValueB < inputMin
+        else:
+            over = numHigh > 0
+            under = numLow > 0
+        Dict = dict(zip(rooms, bounds_colors(over, under).tolist()))
+        # excursions out of bounds, in one pass over the samples of each room
+        excursions = []
+        for filename, dataset, (low, high) in zip(rooms, datasets, roomBounds):
+            progress(0.9 + 0.1 * len(excursions) / len(rooms), 'Finding the excursions of {}'.format(filename))
+            excursions.append(find_excursions(filename, dataset.times.astype(np.int64), dataset[columnName], low,
+                                              high, (minDuration or 0) * 60, hysteresis or 0))
+        excursions = pd.concat(excursions, ignore_index=True) if excursions else \
+            pd.DataFrame(columns=EXCURSION_COLUMNS)
+        summary = excursion_summary(excursions, rooms).round(2)
+        storage = storage.join(summary, on='Room Name')
+        children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. ' \
+                   'You have selected to perform a Bounds Analysis for {} where the minimum bound was {} and ' \
+                   'the maximum bound was {}. Excursions out of bounds shorter than {} minutes are not ' \
+                   'counted.'.format(startDate, endDate, columnName, inputMin, inputMax, minDuration or 0)
+        if setpointMode not in [None, 'fixed']:
+            children += ' Set-points used: {}.'.format(
+                [option['label'] for option in SETPOINT_OPTIONS if option['value'] == setpointMode][0])
+        table = html.Div([
+            dash_table.DataTable(
+                columns=[{"name": i, "id": i} for i in storage.columns],
+                data=storage.to_dict('records')),
+            html.H6('Excursions out of bounds in every room:'),
+            dash_table.DataTable(
+                columns=[{"name": i, "id": i} for i in EXCURSION_COLUMNS],
+                data=excursion_records(excursions), sort_action='native', filter_action='native', page_size=20)
+        ])
+        div = html.Div([html.H6(children=children)])
+        return div, Dict, table, None
+
+    elif analysis == 'SwingAnalysis':
+        datasets = load_datasets(rooms, startDate, endDate, monthsArray, progress)
+        # largest swing and number of swings of at least the permitted swing over local calendar days, weeks and
+        # clock hours of every room, from grouped reductions
+        calendarStatistics = {}
+        for mode in ['daily', 'weekly', 'hourly']:
+            progress(0.8 + 0.05 * len(calendarStatistics), 'Finding the {} swings'.format(mode))
+            calendarStatistics[mode] = np.array([swing_statistics(calendar_swings(dataset, [columnName], mode)[1][0],
+                                                                  inputMax) for dataset in datasets],
+                                                dtype=float).reshape(-1, 3)
+        if swingMode in [None, 'rolling']:
+            progress(0.95, 'Finding the rolling swings')
+            # 24-hour rolling swing of the readings of every room stacked into one array
+            values, starts, counts = stack_rooms(datasets, columnName)
+            swings = room_rolling_swings(values, starts, counts)
+            nonEmpty = counts > 0
+            maxValueS = np.full(len(rooms), np.nan)
+            if nonEmpty.any():
+                maxValueS[nonEmpty] = np.fmax.reduceat(swings, starts[nonEmpty])
+            numSwing = np.bincount(np.repeat(np.arange(len(rooms)), counts), swings >= inputMax,
+                                   minlength=len(rooms))
+            numEntries = counts
+        else:
+            # share of the days, weeks or hours with too much swing
+            maxValueS, numSwing, numEntries = calendarStatistics[swingMode].T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentSwing = np.where(numEntries > 0, np.round(numSwing / numEntries, 2), 0)
+        storage = pd.DataFrame({'Room Name': rooms,
+                                'Maximum Swing': np.round(maxValueS, 2),
+                                'Percent of Data with Swing Greater than Desired Swing (%)': percentSwing * 100,
+                                'Maximum Daily Swing': np.round(calendarStatistics['daily'][:, 0], 2),
+                                'Maximum Weekly Swing': np.round(calendarStatistics['weekly'][:, 0], 2),
+                                'Maximum Hourly Rate of Change': np.round(calendarStatistics['hourly'][:, 0], 2)})
+        # for floorplan:
+        Dict = dict(zip(rooms, swing_colors(maxValueS, inputMax).tolist()))
+        children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. ' \
+                   'You have selected to perform a Swing Analysis for {} where the desired maximum swing' \
+                   ' was {}.'.format(startDate, endDate, columnName, inputMax)
+        if swingMode not in [None, 'rolling']:
+            children += ' The swing was measured as the {}; the percentage is of the {} with too much ' \
+                        'swing.'.format([option['label'] for option in SWING_OPTIONS
+                                         if option['value'] == swingMode][0].lower(),
+                                        SWING_PERIODS[swingMode])
+        table = dash_table.DataTable(
+            columns=[{"name": i, "id": i} for i in storage.columns],
+            data=storage.to_dict('records'))
+        div = html.Div([html.H6(children=children)])
+        return div, Dict, table, None
+
+    else: # preservation-risk analyses; all indices of all rooms are computed in one pass
+        datasets = load_datasets(rooms, startDate, endDate, monthsArray, progress)
+        indices = preservation_indices(datasets)
+        storage = pd.DataFrame({'Room Name': rooms,
+                                'Hours of Data': indices['hours'].round(1),
+                                'TWPI (years)': indices['twpi'].round(1),
+                                'Mould Growth Progress (1 = growth)': indices['mould'].round(2),
+                                'Time with Mechanical Risk (%)': indices['mechanical'].round(1)})
+        # for floorplan; rooms without data in the range are left uncoloured
+        values = indices[{'TWPIAnalysis': 'twpi', 'MouldAnalysis': 'mould',
+                          'MechanicalAnalysis': 'mechanical'}[analysis]]
+        for filename, value, color in zip(rooms, values, risk_colors(analysis, values)):
+            if not np.isnan(value):
+                Dict[filename] = float(color)
+        children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. ' \
+                   'The preservation-risk indices below are computed from temperature and relative humidity; ' \
+                   'the floorplan is shaded by the {}.'.format(startDate, endDate, {
+                       'TWPIAnalysis': 'TWPI', 'MouldAnalysis': 'mould growth progress',
+                       'MechanicalAnalysis': 'mechanical risk'}[analysis])
+        table = dash_table.DataTable(
+            columns=[{"name": i, "id": i} for i in storage.columns],
+            data=storage.to_dict('records'))
+        div = html.Div([html.H6(children=children)])
+        return div, Dict, table, None
+
+
+# selected readings (SensorDataset) of every room; raises LookupError for a room that is not in the store, which
+# fails the job with the message of MISSING_ROOM
+def load_datasets(rooms, startDate, endDate, monthsArray, progress=no_progress):
+    datasets = []
+    for filename in rooms:
+        progress(0.3 + 0.5 * len(datasets) / len(rooms), 'Reading {}'.format(filename))
+        pyramid = load_room(filename, startDate, endDate, monthsArray)
+        if pyramid is None:
+            raise LookupError(MISSING_ROOM.format(filename))
+        datasets.append(pyramid['dataset'].select(startDate, endDate, monthsArray))
+    progress(0.8, 'Analyzing')
+    return datasets
+
+# bounds or swing results of one parameter from a batch analysis of every parameter (settings as saved in
+# batch-settings); results still cached on the server are not computed again
+@stage('analyse')
+def batch_output(settings, parameter, analysis, progress=no_progress):
+    startDate, endDate, bounds = batch_selection(settings)
+    results = OrderedDict()
+    for filename in settings['rooms']:
+        progress(0.3 + 0.7 * len(results) / len(settings['rooms']), 'Analyzing {}'.format(filename))
+        roomResults = batch_analysis(filename, startDate, endDate, settings['monthsArray'], bounds,
+                                     settings['swings'], settings['minDuration'] * 60, settings['hysteresis'])
+        if roomResults is not None:
+            results[filename] = roomResults
+    storage, Dict = batch_view(results, parameter, analysis, settings['swingMode'])
+    columnName = PARAMETER_COLUMNS[parameter]
+    children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. Every ' \
+               'parameter was analyzed at once; '.format(startDate, endDate)
+    if analysis == 'BoundsAnalysis':
+        inputMin, inputMax = bounds[parameter]
+        children += 'shown is the Bounds Analysis for {} where the minimum bound was {} and the maximum bound was ' \
+                    '{}. Excursions out of bounds shorter than {} minutes are not counted.'.format(
+                        columnName, inputMin, inputMax, settings['minDuration'])
+        if settings['setpointMode'] not in [None, 'fixed']:
+            children += ' Batch analyses use fixed bounds.'
+        table = html.Div([
+            dash_table.DataTable(
+                columns=[{"name": i, "id": i} for i in storage.columns],
+                data=storage.to_dict('records')),
+            html.H6('Excursions out of bounds in every room:'),
+            dash_table.DataTable(
+                columns=[{"name": i, "id": i} for i in EXCURSION_COLUMNS],
+                data=excursion_records(batch_excursions(results, parameter)), sort_action='native',
+                filter_action='native', page_size=20)
+        ])
+    else:
+        swingMode = settings['swingMode']
+        children += 'shown is the Swing Analysis for {} where the desired maximum swing was {}.'.format(
+            columnName, settings['swings'][parameter])
+        if swingMode not in [None, 'rolling']:
+            children += ' The swing was measured as the {}; the percentage is of the {} with too much ' \
+                        'swing.'.format([option['label'] for option in SWING_OPTIONS
+                                         if option['value'] == swingMode][0].lower(), SWING_PERIODS[swingMode])
+        table = dash_table.DataTable(
+            columns=[{"name": i, "id": i} for i in storage.columns],
+            data=storage.to_dict('records'))
+    div = html.Div([html.H6(children=children)])
+    return div, Dict, table
+
+# dates and bounds of the settings of a batch analysis
+def batch_selection(settings):
+    startDate = pd.Timestamp(settings['startDate']).to_pydatetime()
+    endDate = pd.Timestamp(settings['endDate']).to_pydatetime()
+    bounds = {name: tuple(value) for name, value in settings['bounds'].items()}
+    return startDate, endDate, bounds
+
+# whether the results of every room of a batch analysis are still cached, so batch_output only re-renders them
+def batch_output_cached(settings):
+    startDate, endDate, bounds = batch_selection(settings)
+    return all(batch_cached(filename, startDate, endDate, settings['monthsArray'], bounds, settings['swings'],
+                            settings['minDuration'] * 60, settings['hysteresis']) for filename in settings['rooms'])
+
+# batch_output for the settings saved in batch-settings, with the settings, as the results of the analysis job
+def batch_output_job(batchSettings, parameter, analysis, progress=no_progress):
+    div, Dict, table = batch_output(json.loads(batchSettings), parameter, analysis, progress)
+    return div, Dict, table, batchSettings
 
 ## CALLBACKS_____________________________________________________________________________________________________________
 # displays name of file uploaded
-@app.callback(Output('output-data-upload', 'children'),
-              [Input('upload-data', 'filename')])
+@callbacks.callback(Output('output-data-upload', 'children'),
+                    [Input('upload-data', 'filename')])
 def update_output(list_of_names):
     if list_of_names is not None:
         children = 'The following selected files have been uploaded: {}'.format(list_of_names)
@@ -344,172 +635,133 @@ def update_output(list_of_names):
         return div
 
 # updates graph & analysis based on inputs
-@app.callback([Output('output-state','children'),
-               Output('analysis-results','children'),
-               Output('table', 'children')],
-            [Input('submit-button','n_clicks')],
-            [State('upload-data', 'contents'),
-            State('upload-data', 'filename'),
-            # start date
-            State('startDateYear', 'value'),  # input
-            State('startDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
-            State('start-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
-            State('start-hour-dropdown', 'value'),  # dropdown
-            State('start-minute-dropdown', 'value'),  # dropdown
-            # end date
-            State('endDateYear', 'value'),  # input
-            State('endDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
-            State('end-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
-            State('end-hour-dropdown', 'value'),  # dropdown
-            State('end-minute-dropdown', 'value'),  # dropdown
-            # dropdowns
-            State('monthsToAnalyze','value'),
-            State('parameter-dropdown','value'),
-            State('analysis-dropdown','value'),
-            State('input_min','value'),
-            State('input_max','value')
-            ])
-def update_graph__and_analysis(n_clicks, list_contents, list_filenames, startYr, startMonth, startDay, startHr,
-                               startMin, endYr, endMonth, endDay, endHr, endMin, monthsArray, parameter, analysis,
-                               inputMin, inputMax):
+# the analysis runs as a background job; the interval polls its progress and shows the results once it is done
+# in batch mode, changing the parameter or analysis shows the results of the last batch analysis again; they are read
+# from the cache, or analyzed again as a job if they were dropped from it
+@callbacks.callback([Output('output-state','children'),
+                     Output('analysis-results','children'),
+                     Output('table', 'children'),
+                     Output('batch-settings', 'children'),
+                     Output('job-id', 'children'),
+                     Output('job-interval', 'disabled'),
+                     Output('job-progress', 'children')],
+                  [Input('submit-button','n_clicks'),
+                   Input('parameter-dropdown','value'),
+                   Input('analysis-dropdown','value'),
+                   Input('job-interval', 'n_intervals'),
+                   Input('cancel-button', 'n_clicks')],
+                  [State('upload-data', 'contents'),
+                  State('upload-data', 'filename'),
+                  State('stored-rooms-dropdown', 'value'),
+                  # start date
+                  State('startDateYear', 'value'),  # input
+                  State('startDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
+                  State('start-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
+                  State('start-hour-dropdown', 'value'),  # dropdown
+                  State('start-minute-dropdown', 'value'),  # dropdown
+                  # end date
+                  State('endDateYear', 'value'),  # input
+                  State('endDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
+                  State('end-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
+                  State('end-hour-dropdown', 'value'),  # dropdown
+                  State('end-minute-dropdown', 'value'),  # dropdown
+                  # dropdowns
+                  State('monthsToAnalyze','value'),
+                  State('input_min','value'),
+                  State('input_max','value'),
+                  State('min-duration','value'),
+                  State('hysteresis','value'),
+                  State('setpoint-mode','value'),
+                  State('setpoint-table','data'),
+                  State('float-band','value'),
+                  State('swing-mode','value'),
+                  State('batch-mode','value'),
+                  State('batch-settings','children'),
+                  State('job-id','children')
+                  ])
+def update_graph__and_analysis(n_clicks, parameter, analysis, n_intervals, cancelClicks, list_contents, list_filenames,
+                               storedRooms, startYr, startMonth, startDay, startHr, startMin, endYr, endMonth, endDay,
+                               endHr, endMin, monthsArray, inputMin, inputMax, minDuration, hysteresis, setpointMode,
+                               setpointTable, band, swingMode, batchMode, batchSettings, jobId):
+    trigger = dash.callback_context.triggered[0]['prop_id']
     if n_clicks is None:
         raise PreventUpdate
-    else:
-        Dict={} # storage
+    elif trigger == 'job-interval.n_intervals':
+        outputs = job_outputs(jobId, 4)
+        return outputs[:4] + [dash.no_update] + outputs[4:]
+    elif trigger == 'cancel-button.n_clicks':
+        if jobId is None:
+            raise PreventUpdate
+        cancel_job(jobId)
+        return [dash.no_update] * 5 + job_outputs(jobId, 0)
+    elif trigger == 'submit-button.n_clicks':
         startDate = dt(startYr, startMonth, startDay, startHr, startMin)
         endDate = dt(endYr, endMonth, endDay, endHr, endMin)
-        if parameter == 'DP':
-            columnName = 'Dew Point'
-        elif parameter == 'Temp':
-            columnName = 'Temperature (Degrees Fahrenheit)'
-        else:
-            columnName = 'Relative Humidity (%)'
-
-        if analysis == 'BoundsAnalysis':
-            i = 0 # counter
-            storage = pd.DataFrame(columns=['Room Name','Minimum Value','Maximum Value',
-                                            'Percent Out of Bounds Total (%)', 'Percent Over Upper Bound (%)',
-                                            'Percent Under Lower Bound (%)'])
-            for filename, contents in zip(list_filenames, list_contents):
-                df = parse_data(contents, startDate, endDate, monthsArray)
-                if parameter == 'DP':
-                    df = add_DP_column(df)
-                # determine max and min
-                maxValueB = round(max(df[columnName]),2)
-                minValueB = round(min(df[columnName]),2)
-                # determine how often the data goes out of bounds
-                # too low:
-                numLow = np.sum(df[columnName] <= inputMin)
-                numEntries = len(df[columnName])
-                percentLow = round(numLow / numEntries,2)
-                # too high:
-                numHigh = np.sum(df[columnName] >= inputMax)
-                numEntries = len(df[columnName])
-                percentHigh = round(numHigh / numEntries,2)
-                # out of bounds in general:
-                percentOutOfBounds = round(percentLow + percentHigh,2)
-
-                #floorplan calcs:
-                if (maxValueB > inputMax and minValueB < inputMin):
-                    # color is yellow = 0.5
-                    Dict[filename] = 0.5 # percentOutOfBounds
-                elif maxValueB > inputMax:
-                    # color red = 0.2
-                    Dict[filename] = 0.2 # percentHigh
-                elif minValueB < inputMin:
-                    # color blue = 0.9
-                    Dict[filename] = 0.9# percentLow
-                else: #within bounds
-                    Dict[filename] = 0.7 # color green = 0.7
-                # for table:
-                storage.loc[i, ['Room Name']] = filename
-                storage.loc[i, ['Minimum Value']] = minValueB
-                storage.loc[i, ['Maximum Value']] = maxValueB
-                storage.loc[i, ['Percent Out of Bounds Total (%)']] = percentOutOfBounds * 100
-                storage.loc[i, ['Percent Over Upper Bound (%)']] = percentLow *100
-                storage.loc[i, ['Percent Under Lower Bound (%)']] = percentHigh *100
-                i=i+1 # increment count
-            children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. ' \
-                       'You have selected to perform a Bounds Analysis for {} where the minimum bound was {} and ' \
-                       'the maximum bound was {}.'.format(startDate, endDate, columnName, inputMin, inputMax)
-            table = dash_table.DataTable(
-                columns=[{"name": i, "id": i} for i in storage.columns],
-                data=storage.to_dict('records'))
-            div = html.Div([html.H6(children=children)])
-            return div, Dict, table
-
-        elif analysis == 'SwingAnalysis':
-            i = 0 # counter
-            storage = pd.DataFrame(columns=['Room Name','Maximum Swing','Percent of Data with Swing Greater '
-                                                                        'than Desired Swing (%)'])
-            for filename, contents in zip(list_filenames, list_contents):
-                df = parse_data(contents, startDate, endDate, monthsArray)
-                if parameter == 'DP':
-                    df = add_DP_column(df)
-                # perform analysis
-                swingArray, sum, lastValue, df = swing_analysis(df, inputMax, columnName) #sum is number of times out of bounds
-                maxValueS = round(max(swingArray),2) # max swing value
-                # determine percent of time out of bounds
-                numSwing = np.sum(swingArray >= inputMax)
-                numEntries = len(swingArray)
-                percentSwing = round(numSwing / numEntries, 2)
-
-                # for floorplan:
-                if maxValueS > inputMax:
-                    # color is red = 0.2
-                    Dict[filename]= 0.2 #percentSwing # opacity
-                else:
-                    Dict[filename]=0.7 # color is green = 0.7
-                storage.loc[i, ['Room Name']] = filename
-                storage.loc[i, ['Maximum Swing']] = maxValueS
-                storage.loc[i, ['Percent of Data with Swing Greater than Desired Swing (%)']] = percentSwing * 100
-                i = i + 1  # increment count
-            children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. ' \
-                       'You have selected to perform a Swing Analysis for {} where the desired maximum swing' \
-                       ' was {}.'.format(startDate, endDate, columnName, inputMax)
-            table = dash_table.DataTable(
-                columns=[{"name": i, "id": i} for i in storage.columns],
-                data=storage.to_dict('records'))
-            div = html.Div([html.H6(children=children)])
-            return div, Dict, table
-
+        jobId = submit_job(analyze_rooms, list_contents, list_filenames, storedRooms, startDate, endDate, monthsArray,
+                           parameter, analysis, inputMin, inputMax, minDuration, hysteresis, setpointMode,
+                           setpointTable, band, swingMode, batchMode)
+        # polled until the job is done, even if it is done already
+        return [dash.no_update] * 4 + [jobId, False, job_outputs(jobId, 0)[1]]
+    else:
+        # parameter or analysis changed; only batch results can be shown without submitting again
+        if batchSettings is None or analysis not in ['BoundsAnalysis', 'SwingAnalysis']:
+            raise PreventUpdate
+        if batch_output_cached(json.loads(batchSettings)):
+            div, Dict, table = batch_output(json.loads(batchSettings), parameter, analysis)
+            return div, Dict, table, batchSettings, dash.no_update, dash.no_update, dash.no_update
+        jobId = submit_job(batch_output_job, batchSettings, parameter, analysis)
+        return [dash.no_update] * 4 + [jobId, False, job_outputs(jobId, 0)[1]]
+
+
+# list the rooms in the local data store; refreshed after every analysis
+@callbacks.callback(Output('stored-rooms-dropdown', 'options'),
+                    [Input('output-state', 'children')])
+def update_stored_rooms(children):
+    return [{'label': room, 'value': room} for room in list_rooms()]
 
 # show/hide bound input boxes based on type of analysis being performed
-@app.callback(Output(component_id='input_min', component_property='style'),
-             [Input(component_id='analysis-dropdown', component_property='value')])
-def show_hide_element(analysis):
-    if analysis == 'SwingAnalysis':
-        return {'display': 'none'}
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'showBoundsInputs'),
+                              [Output(component_id='input_min', component_property='style'),
+                               Output(component_id='input_max', component_property='style'),
+                               Output(component_id='excursion-settings', component_property='style'),
+                               Output(component_id='setpoint-settings', component_property='style'),
+                               Output(component_id='swing-settings', component_property='style')],
+                              [Input(component_id='analysis-dropdown', component_property='value')],
+                              [State('ui-settings', 'children')])
+
+# show the set-point table for monthly and ramped bounds and the band half-width for floating bounds
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'showSetpointInputs'),
+                              [Output('setpoint-table-container', 'style'),
+                               Output('float-band', 'style')],
+                              [Input('setpoint-mode', 'value')])
+
+# fill the set-point table with the bounds above, to be edited month by month
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'updateSetpointTable'),
+                              Output('setpoint-table', 'data'),
+                              [Input('input_min', 'value'),
+                               Input('input_max', 'value')],
+                              [State('setpoint-table', 'data')])
 
 # change suggested bound values depending on parameter and type of analysis
-@app.callback([Output(component_id='input_min', component_property='value'),
-               Output(component_id='input_max', component_property='value'),
-               Output('bounds-explanation','style'),
-               Output('swing-explanation', 'style')],
-              [Input(component_id='analysis-dropdown', component_property='value'),
-              Input(component_id='parameter-dropdown', component_property= 'value')])
-def change_value2(analysis, parameter):
-    style1 = {'display': 'none'}
-    style2 = {'display':'block'}
-    if analysis == 'SwingAnalysis':
-        return 0, 10, style1, style2
-    else:
-        if parameter == 'Temp':
-            return 63, 74, style2, style1
-        elif parameter == 'RH':
-            return 35, 57, style2, style1
-        elif parameter == 'DP':
-            return 37, 56, style2, style1
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'suggestBoundsAndExplanation'),
+                              [Output(component_id='input_min', component_property='value'),
+                               Output(component_id='input_max', component_property='value'),
+                               Output('bounds-explanation','style'),
+                               Output('swing-explanation', 'style'),
+                               Output('risk-explanation', 'style')],
+                              [Input(component_id='analysis-dropdown', component_property='value'),
+                               Input(component_id='parameter-dropdown', component_property= 'value')],
+                              [State('ui-settings', 'children')])
 
 
 # update floorplan to have room names of data files uploaded
 # filters data based on the radio button picked, either temp or rh correlation comparison
 # colors are based on the number given as a value of the key in the data dictionary
 # i.e. 'room 2': 0.8 --> 0.8 is helps determine the color
-@app.callback([Output('dash-floorplan','data'),
-               Output('room-name-result','children')],
-              [Input('room-names-button','n_clicks')],
-              [State('analysis-results', 'children')]) #factors
+@callbacks.callback([Output('dash-floorplan','data'),
+                     Output('room-name-result','children')],
+                    [Input('room-names-button','n_clicks')],
+                    [State('analysis-results', 'children')]) #factors
 def send_data_to_floorplan(n_clicks, results):
     if n_clicks is None:
         raise PreventUpdate
@@ -520,14 +772,14 @@ def send_data_to_floorplan(n_clicks, results):
 
 
 # upload polygons from prior session; upload image for floorplan
-@app.callback([Output('upload-shapes-output', 'children'),
-               Output('dash-floorplan', 'shapes'),
-               Output('dash-floorplan', 'image'),
-               Output('dash-floorplan', 'update')],
-              [Input('shapes-upload', 'n_clicks'),
-               Input('floorplan-upload-button', 'n_clicks')],
-              [State('shapes-path', 'value'),
-               State('floorplan-image-input', 'value')])
+@callbacks.callback([Output('upload-shapes-output', 'children'),
+                     Output('dash-floorplan', 'shapes'),
+                     Output('dash-floorplan', 'image'),
+                     Output('dash-floorplan', 'update')],
+                    [Input('shapes-upload', 'n_clicks'),
+                     Input('floorplan-upload-button', 'n_clicks')],
+                    [State('shapes-path', 'value'),
+                     State('floorplan-image-input', 'value')])
 def save_shapes(n_clicks, n_clicks2, path, value):  # filename, contents):
     # figure out which button was clicked
     ctx = dash.callback_context
@@ -556,10 +808,10 @@ def save_shapes(n_clicks, n_clicks2, path, value):  # filename, contents):
 
 
 # save polygons to use again later
-@app.callback(Output('save-points-output','children'),
-              [Input('save-points','n_clicks')],
-              [State('save-points-input','value'),
-               State('dash-floorplan','shapes')])
+@callbacks.callback(Output('save-points-output','children'),
+                    [Input('save-points','n_clicks')],
+                    [State('save-points-input','value'),
+                     State('dash-floorplan','shapes')])
 def save_points(n_clicks, value, shapes):
     if n_clicks is None:
         raise PreventUpdate
@@ -572,17 +824,17 @@ def save_points(n_clicks, value, shapes):
 
 
 # change the text based on the analysis selected
-@app.callback([Output('bounds-text','style'),
-               Output('swing-text','style')],
-              [Input('analysis-dropdown','value')])
-def change_text(value):
-    styleOn = {'display': 'inline-block'}
-    styleOff = {'display': 'none'}
-    if value == 'SwingAnalysis':
-        return styleOff, styleOn
-    else:
-        return styleOn, styleOff
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'changeText'),
+                              [Output('bounds-text','style'),
+                               Output('swing-text','style')],
+                              [Input('analysis-dropdown','value')],
+                              [State('ui-settings', 'children')])
 
 # ______________________________________________________________________________________________________________________
+# Dash app of this interface, mounted on server (a Flask server, or True for a server of its own) under the URL path
+# prefix; see wsgi.py for serving every interface together
+def create_app(server=True, prefix='/'):
+    return make_app(__name__, layout, callbacks, server, prefix)
+
 if __name__ == '__main__':
-    app.run_server(debug = 'True') # runs app
+    create_app().run_server(debug = 'True') # runs app
@@ -1,21 +1,37 @@
 # import needed packages
 import dash
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import dash_core_components as dcc
 import dash_html_components as html
+import dash_table
 from datetime import datetime as dt
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from dash.exceptions import PreventUpdate
-import base64
-import io
+import json
 import textwrap
-
-app = dash.Dash(__name__) # create app; also uses assets folder for stylesheets
+from winterthur_data import (PARAMETER_COLUMNS, PARAMETER_OPTIONS, pyramid_count, pyramid_extremes, pyramid_frame,
+                             pyramid_series, sample_count)
+from winterthur_store import MISSING_ROOM, ingest_pm2, list_rooms, load_room
+from winterthur_swing import (SWING_OPTIONS, SWING_PERIODS, calendar_swings, monthly_percent_over, rolling_swings,
+                              swing_statistics)
+from winterthur_setpoints import SETPOINT_OPTIONS, setpoint_bounds, setpoint_table
+from winterthur_excursions import (EXCURSION_COLUMNS, EXCURSION_HYSTERESIS, MIN_EXCURSION_MINUTES, find_excursions,
+                                   excursion_records)
+from winterthur_app import CallbackRegistry, make_app
+from winterthur_batch import SUGGESTED_BOUNDS, SUGGESTED_SWING
+from winterthur_metrics import stage
+
+# the time series graph is decimated to about this many points, roughly one per horizontal pixel
+MAX_GRAPH_POINTS = 2000
+# the graph reads the finest pyramid level with at most this many rows in view, then decimates it
+MAX_GRAPH_ROWS = 50 * MAX_GRAPH_POINTS
+
+callbacks = CallbackRegistry() # callbacks of the interface; the app is made by create_app
 
 # app layout
-app.layout = html.Div([
+layout = html.Div([
     # title
     html.Div([
         html.H1(children='Winterthur Bounds and Swing Analysis Interface', style={'textAlign': 'center',"margin-bottom": "0px"}),
@@ -31,6 +47,11 @@ app.layout = html.Div([
         ),
         # output selected data file filename
         html.Div(id='output-data-upload', style={'display': 'inline-block'}),
+        # rooms uploaded in an earlier session are kept in the local data store and can be analyzed again
+        html.H6('Or select a room that is already in the local data store (an uploaded file is used instead if there '
+                'is one):'),
+        html.Div([dcc.Dropdown(id='stored-room-dropdown', placeholder='Select a stored room...')],
+                 className='four columns'),
     ],className="pretty_container twelve columns"),
 
     # select start date and end date for the overall period to examine
@@ -138,7 +159,11 @@ app.layout = html.Div([
             html.Button(id='submit-data',children='Submit date range selection.')
         ],style={"margin-top": "10px",'margin-bottom':'10px'}),
         html.Div(id='mask-range-output'), # output that file has been masked
-        html.Div(id='df-storage',style={'display': 'none'}) # hidden div to store date-adjusted df
+        html.Div(id='df-storage',style={'display': 'none'}), # hidden div to store date-adjusted df
+        # suggested values read by the clientside callbacks (see assets/clientside.js); this interface has no risk
+        # analyses
+        html.Div(id='ui-settings', style={'display': 'none'},
+                 children=json.dumps({'bounds': SUGGESTED_BOUNDS, 'swing': SUGGESTED_SWING, 'riskAnalyses': []}))
     ],className="pretty_container twelve columns"),
 
     # select the parameters, analysis, and bounds
@@ -149,9 +174,7 @@ app.layout = html.Div([
         html.Div([
             dcc.Dropdown(
                 id='parameter-dropdown',
-                options=[{'label': 'Temperature (Degrees Fahrenheit)', 'value':'Temp'},
-                         {'label': 'Relative Humidity (%)','value': 'RH'},
-                         {'label': 'Dew Point (Degrees Fahrenheit)', 'value': 'DP'}],
+                options=PARAMETER_OPTIONS, # temperature, RH and the channels derived from them
                 value = 'Temp'
             )
         ],className="four columns"),
@@ -169,6 +192,14 @@ app.layout = html.Div([
                 value = 'BoundsAnalysis'
             ),
         ],className="three columns"),
+        # swing mode
+        html.Div([
+            html.H6('Select how the swing is measured. The daily and weekly swings and the hourly rate of change '
+                    'are measured over calendar days, weeks (Monday to Sunday) and clock hours in local time.'),
+            html.Div([
+                dcc.Dropdown(id='swing-mode', options=SWING_OPTIONS, value='rolling')
+            ],className="six columns"),
+        ], id='swing-settings', className='twelve columns'),
         # bounds
         html.Div([
             html.H6('Enter minimum and maximum bounds on the parameter selected above:',
@@ -187,6 +218,34 @@ app.layout = html.Div([
             type='number',
             placeholder= 'Enter maximum value...'
         ),
+        # season-dependent set-points
+        html.Div([
+            html.H6('Select how the bounds change through the year. Monthly bounds are entered in the table below; '
+                    'ramped bounds apply in the middle of each month and change gradually in between. A floating '
+                    'band follows the 30-day running mean of the parameter, plus or minus the half-width entered '
+                    'below, within the minimum and maximum above.'),
+            html.Div([
+                dcc.Dropdown(id='setpoint-mode', options=SETPOINT_OPTIONS, value='fixed')
+            ],className="four columns"),
+            html.Div([
+                dash_table.DataTable(
+                    id='setpoint-table',
+                    columns=[{'name': 'Month', 'id': 'Month'},
+                             {'name': 'Minimum', 'id': 'Minimum', 'type': 'numeric', 'editable': True},
+                             {'name': 'Maximum', 'id': 'Maximum', 'type': 'numeric', 'editable': True}],
+                    data=setpoint_table(None, None))
+            ], id='setpoint-table-container', className='six columns'),
+            dcc.Input(id='float-band', type='number', value=5, placeholder='Enter band half-width...'),
+        ], id='setpoint-settings', className='twelve columns'),
+        # excursion settings
+        html.Div([
+            html.H6('Excursions out of bounds shorter than the minimum duration (minutes) are not counted, and an '
+                    'excursion only ends once the parameter is back inside the bounds by the hysteresis (in the units '
+                    'of the parameter; the time back inside the bounds before then is not counted):'),
+            dcc.Input(id='min-duration', type='number', value=MIN_EXCURSION_MINUTES,
+                      placeholder='Enter minimum duration...'),
+            dcc.Input(id='hysteresis', type='number', value=EXCURSION_HYSTERESIS, placeholder='Enter hysteresis...'),
+        ], id='excursion-settings'),
         # analyze button
         html.H6('Click submit to analyze the data file for the selected date range, parameter, and analyses above:'),
         html.Button(id='submit-button', children='Submit'),
@@ -200,7 +259,9 @@ app.layout = html.Div([
     # times series
     html.Div([
         html.H4('Time Series Graph'),
+        html.H6('Zoom in on the graph to see the data in the selected range at full resolution.'),
         dcc.Graph(id='Mygraph'),
+        html.Div(id='graph-settings', style={'display': 'none'}) # hidden div to store what the graph shows
     ],className='pretty_container twelve columns'),
     # contour plots
     html.Div([
@@ -217,68 +278,94 @@ app.layout = html.Div([
 ])
 
 # FUNCTIONS_____________________________________________________________________________________________________________
-# Note: This function is very specific to Winterthur and their .pm2 files
-# creates dataframe out of .pm2 file
-def parse_data(contents, startDate, endDate, monthsArray):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3]) # skiprows is based on Winterthur file format
-    df['DATE AND TIME GMT'] = pd.to_datetime(df['DATE AND TIME GMT']) # set date and time column as datetime type
-    # rename columns
-    df.columns = ['Date and Time in GMT', 'Temperature (Degrees Fahrenheit)', 'Relative Humidity (%)']
-
-    # select the entered date range, from startDate to endDate
-    maskRange = (df['Date and Time in GMT'] > startDate) & (df['Date and Time in GMT'] <= endDate)
-    df = df.loc[maskRange]
-
-    # if any specific months are selected, get rid of other months
-    if monthsArray != []:
-        df['month'] = df['Date and Time in GMT'].map(lambda x: x.strftime('%m'))  # pulls out month from data column
-        df['month'] = pd.to_numeric(df['month'])  # recast month column as ints, not objects
-        df = df[df['month'].isin(monthsArray)]
-
-    return df
-
-# if parameter selected is dew point, perform this function on the df to add a DP column
-def add_DP_column(df):
-    # convert F to C:
-    temp = ((df['Temperature (Degrees Fahrenheit)'] - 32) * (5 / 9))
-    RH = df['Relative Humidity (%)']
-    # because converted to C, convert back to F at end of eq
-    df['Dew Point'] =  ((((RH/100)**(1/8))*(112 + 0.9*temp)+0.1*temp - 112) * (9 / 5)) + 32
-    return df
-
-# perform swing analysis
-def swing_analysis(df, swingInt,columnName): # columnName is a 'string'
-    numEntries = len(df[columnName]) # length of data frame for rh
-    pointsInDay = 24 * 60 / 15  # constant; number data points separated in 15 minute increments = 96 points
-    lastValue = int(numEntries - pointsInDay - 1)     # calculate last "day", last possible complete 24 hour period
-
-    # initialize blank rhSwing storage array
-    swingArray = np.zeros(numEntries)  # could also be a new column in dataframe
-
-    # for the number of possible 24-hour-long periods in the data set, loop; will be zero for end values
-    for k in range(0, lastValue):
-        jEnd = int(k + pointsInDay)
-        # find maximum and minimum value over a one day (24 hour) period
-        maxRH = max(df[columnName][k:jEnd])
-        minRH = min(df[columnName][k:jEnd])
-        # determine swing over 24 hour period and store in array
-        swingArray[k] = maxRH - minRH
-    df['swing'] = swingArray
-
-    # if swing is greater than permitted, note how many times it is
-    sum = 0
-    for i in range(0, numEntries):
-        if swingArray[i] >= swingInt:
-            sum = sum + 1
-    # sum = number of times RH Swing is out of bounds
-    return swingArray, sum, lastValue, df
+# column name of the selected parameter
+def column_name(parameter):
+    return PARAMETER_COLUMNS[parameter]
+
+# date range and months stored in the hidden div by the date range selection
+def selection_range(selection):
+    return pd.Timestamp(selection['start']), pd.Timestamp(selection['end']), selection['months']
+
+# percentage of points per month (rows) and year (columns) for the contour plots, from monthly counts
+def contour_grid(counts, totals):
+    present = (totals > 0).values
+    years = totals.index.year[present]
+    months = totals.index.month[present]
+    yearsArray = np.unique(years)
+    monthsArray = np.unique(months)
+    storage = np.full([len(monthsArray), len(yearsArray)], np.nan) # months without data stay empty
+    storage[np.searchsorted(monthsArray, months), np.searchsorted(yearsArray, years)] = \
+        counts.values[present] / totals.values[present] * 100
+    return yearsArray, monthsArray, storage
+
+# Largest-Triangle-Three-Buckets downsampling; returns the indices of the numOut points that best keep the shape
+# of the line. x must be sorted and numeric (e.g. datetimes as int64 nanoseconds)
+def lttb_downsample(x, y, numOut):
+    numPoints = len(x)
+    if numOut >= numPoints or numOut < 3:
+        return np.arange(numPoints)
+    x = np.asarray(x, dtype=np.float64) - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    # split the interior points into numOut - 2 buckets; the first and last points are always kept
+    edges = np.linspace(1, numPoints - 1, numOut - 1).astype(np.int64)
+    lengths = np.diff(edges)
+    avgX = np.add.reduceat(x[1:-1], edges[:-1] - 1) / lengths
+    avgY = np.add.reduceat(y[1:-1], edges[:-1] - 1) / lengths
+    # the last bucket looks ahead to the last point
+    avgX = np.append(avgX[1:], x[-1])
+    avgY = np.append(avgY[1:], y[-1])
+
+    selected = np.zeros(numOut, dtype=np.int64)
+    selected[-1] = numPoints - 1
+    a = 0 # index of the point selected in the previous bucket
+    for i in range(numOut - 2):
+        start, end = edges[i], edges[i + 1]
+        # area of the triangle made by the previous point, each candidate, and the next bucket's average
+        area = np.abs((x[a] - avgX[i]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avgY[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+# time series figure of the given times and values, decimated to MAX_GRAPH_POINTS points
+# bounds that change through the year (setpoints is the graph settings) are drawn as lines along the graph
+@stage('figure')
+def time_series_figure(times, values, columnName, filename, analysis, inputMin, inputMax, xRange=None,
+                       setpoints=None):
+    keep = ~np.isnan(values)
+    times = times[keep]
+    values = values[keep]
+    keep = lttb_downsample(times.astype(np.int64), values, MAX_GRAPH_POINTS)
+    data = [{'x': pd.DatetimeIndex(times[keep]), 'y': values[keep], 'name': filename}]
+
+    # wrap title text
+    title1 = columnName + ' Time Series for ' + filename
+    split_text = textwrap.wrap(title1, width=100)
+    title2 = '<br>'.join(split_text)
+    layout = {'title': title2, 'xaxis': {'title': 'Year'}, 'yaxis': {'title': columnName},
+              'uirevision': filename + columnName} # keeps the zoom when the graph is re-fetched
+    if xRange is not None:
+        layout['xaxis']['range'] = xRange
+    # bound lines are drawn as shapes across the whole graph instead of as full-length series
+    if analysis == 'BoundsAnalysis' and setpoints is not None and setpoints.get('setpointMode') not in [None, 'fixed']:
+        lower, upper = setpoint_bounds(times, values, setpoints['setpointMode'], inputMin, inputMax,
+                                       setpoints['setpointTable'], setpoints['band'])
+        for bounds, name, color in [(lower, 'Lower Bound', '#1f77b4'), (upper, 'Upper Bound', '#d62728')]:
+            data.append({'x': pd.DatetimeIndex(times[keep]), 'y': bounds[keep], 'name': name,
+                         'line': {'color': color, 'dash': 'dash'}})
+    elif analysis == 'BoundsAnalysis':
+        layout['shapes'] = [{'type': 'line', 'xref': 'paper', 'x0': 0, 'x1': 1, 'yref': 'y', 'y0': bound, 'y1': bound,
+                             'line': {'color': color, 'dash': 'dash'}}
+                            for bound, color in [(inputMin, '#1f77b4'), (inputMax, '#d62728')]]
+        layout['annotations'] = [{'xref': 'paper', 'x': 1, 'xanchor': 'right', 'yref': 'y', 'y': bound,
+                                  'yanchor': 'bottom', 'text': name, 'showarrow': False}
+                                 for bound, name in [(inputMin, 'Lower Bound'), (inputMax, 'Upper Bound')]]
+    figure = {'data': data, 'layout': layout}
+    return figure
 
 ## CALLBACKS_____________________________________________________________________________________________________________
 # displays name of file uploaded
-@app.callback(Output('output-data-upload', 'children'),
-              [Input('upload-data', 'filename')])
+@callbacks.callback(Output('output-data-upload', 'children'),
+                    [Input('upload-data', 'filename')])
 def update_output(filename):
     if filename is not None:
         children = 'You have selected the following file: {}'.format(filename)
@@ -286,26 +373,27 @@ def update_output(filename):
         return div
 
 # create df based on input date selection
-@app.callback([Output('df-storage','children'),
-              Output('mask-range-output','children')],
-              [Input('submit-data','n_clicks')],
-              [State('upload-data','contents'),
-              State('upload-data', 'filename'),
-              # start date
-              State('startDateYear', 'value'),  # input
-              State('startDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
-              State('start-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
-              State('start-hour-dropdown', 'value'),  # dropdown
-              State('start-minute-dropdown', 'value'),  # dropdown
-              # end date
-              State('endDateYear', 'value'),  # input
-              State('endDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
-              State('end-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
-              State('end-hour-dropdown', 'value'),  # dropdown
-              State('end-minute-dropdown', 'value'),  # dropdown
-              # dropdowns
-              State('monthsToAnalyze','value')])
-def upload_files(n_clicks, contents, filename, startYr, startMonth, startDay, startHr, startMin, endYr,
+@callbacks.callback([Output('df-storage','children'),
+                    Output('mask-range-output','children')],
+                    [Input('submit-data','n_clicks')],
+                    [State('upload-data','contents'),
+                    State('upload-data', 'filename'),
+                    State('stored-room-dropdown', 'value'),
+                    # start date
+                    State('startDateYear', 'value'),  # input
+                    State('startDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
+                    State('start-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
+                    State('start-hour-dropdown', 'value'),  # dropdown
+                    State('start-minute-dropdown', 'value'),  # dropdown
+                    # end date
+                    State('endDateYear', 'value'),  # input
+                    State('endDateMonth', 'value'),  # dropdown, '1', '2', etc. for Jan, Feb, etc.
+                    State('end-day-dropdown', 'value'),  # dropdown, values come as string, corresponding to options
+                    State('end-hour-dropdown', 'value'),  # dropdown
+                    State('end-minute-dropdown', 'value'),  # dropdown
+                    # dropdowns
+                    State('monthsToAnalyze','value')])
+def upload_files(n_clicks, contents, filename, storedRoom, startYr, startMonth, startDay, startHr, startMin, endYr,
                                endMonth, endDay, endHr, endMin, monthsArray):
     if n_clicks is None:
         raise PreventUpdate
@@ -313,69 +401,98 @@ def upload_files(n_clicks, contents, filename, startYr, startMonth, startDay, st
         # make dates into datetime format
         startDate = dt(startYr, startMonth, startDay, startHr, startMin)
         endDate = dt(endYr, endMonth, endDay, endHr, endMin)
-        df = parse_data(contents, startDate, endDate, monthsArray)
-        first = df['Date and Time in GMT'].iloc[0]
-        last = df['Date and Time in GMT'].iloc[-1]
+        # an uploaded file is added to the local data store (skipped if it is already there) and every query then
+        # reads only the year/month partitions of the selected dates; the hidden div only stores the selection
+        if contents is not None:
+            filename = ingest_pm2(filename, contents) # a new version of the room gets its own name
+        else:
+            filename = storedRoom
+        if filename is None:
+            raise PreventUpdate
+        pyramid = load_room(filename, startDate, endDate, monthsArray)
+        if pyramid is None:
+            return dash.no_update, html.Div([html.H6(children=MISSING_ROOM.format(filename))])
+        times = pyramid['dataset'].times
+        if len(times) == 0:
+            children = '{} has no data between {} and {} (in GMT) for the months selected.'.format(filename, startDate,
+                                                                                                  endDate)
+            return dash.no_update, html.Div([html.H6(children=children)])
+        first = pd.Timestamp(times[0])
+        last = pd.Timestamp(times[-1])
+        selection = {'room': filename, 'start': startDate.isoformat(), 'end': endDate.isoformat(),
+                     'months': monthsArray}
 
         children = 'You selected to look at the data between {} and {} (in GMT) for the months selected. For {}, ' \
                    'the date range is now {} to {} (GMT) based on the available data in the file (since some files ' \
                    'will not have data for all dates entered).'.format(startDate,endDate, filename, first, last)
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
-        return df.to_json(date_format='iso', orient='split'), div
+        return json.dumps(selection), div
 
 
 # updates graph & analysis based on inputs
-@app.callback([Output('Mygraph', 'figure'),
-               Output('output-state','children'),
-               Output('contour-min', 'figure'),
-               Output('contour-max', 'figure')],
-            [Input('submit-button','n_clicks')],
-            [State('upload-data','filename'),
-            State('df-storage','children'),
-            State('parameter-dropdown','value'),
-            State('analysis-dropdown','value'),
-            State('input_min','value'),
-            State('input_max','value')])
-def update_graph_and_analysis(n_clicks, filename, df_storage, parameter, analysis, inputMin, inputMax):
+@callbacks.callback([Output('output-state','children'),
+                     Output('contour-min', 'figure'),
+                     Output('contour-max', 'figure'),
+                     Output('graph-settings', 'children')],
+                  [Input('submit-button','n_clicks')],
+                  [State('df-storage','children'),
+                  State('parameter-dropdown','value'),
+                  State('analysis-dropdown','value'),
+                  State('input_min','value'),
+                  State('input_max','value'),
+                  State('min-duration','value'),
+                  State('hysteresis','value'),
+                  State('setpoint-mode','value'),
+                  State('setpoint-table','data'),
+                  State('float-band','value'),
+                  State('swing-mode','value')])
+def update_graph_and_analysis(n_clicks, df_storage, parameter, analysis, inputMin, inputMax, minDuration, hysteresis,
+                              setpointMode, setpointTable, band, swingMode):
     if n_clicks is None:
         figure = {'data': [{'x': [0], 'y': [0], 'name': 'N/A'}, ], 'layout':
             {'title': 'No data uploaded yet'}}
-        return figure, dash.no_update, figure, figure
+        return dash.no_update, figure, figure, dash.no_update
     else:
-        df = pd.read_json(df_storage, orient='split')
-        df['Date and Time in GMT'] = pd.to_datetime(df['Date and Time in GMT'])
+        selection = json.loads(df_storage)
+        filename = selection['room']
+        startDate, endDate, months = selection_range(selection)
+        pyramid = load_room(filename, startDate, endDate, months)
+        if pyramid is None:
+            children = MISSING_ROOM.format(filename)
+            return html.Div([html.H6(children=children)]), dash.no_update, dash.no_update, dash.no_update
 
         # assign column name according to parameter
-        if parameter == 'DP':
-            df = add_DP_column(df)
-            columnName = 'Dew Point'
-        elif parameter == 'Temp':
-            columnName = 'Temperature (Degrees Fahrenheit)'
-        else:
-            columnName = 'Relative Humidity (%)'
-
-        # pull out year and month
-        df['year'] = pd.DatetimeIndex(df['Date and Time in GMT']).year
-        # make arrays of years and months (just unique values)
-        yearsArray = np.unique(df['year'])
-        monthsArray = np.unique(df['month'])
-        # create storage arrays
-        storageMin = np.zeros([len(monthsArray), len(yearsArray)])
-        storageMax = np.zeros([len(monthsArray), len(yearsArray)])
+        columnName = column_name(parameter)
+        # settings for the time series graph, which is drawn by its own callback
+        settings = json.dumps({'filename': filename, 'parameter': parameter, 'analysis': analysis,
+                               'inputMin': inputMin, 'inputMax': inputMax, 'setpointMode': setpointMode,
+                               'setpointTable': setpointTable, 'band': band})
 
         if analysis == 'BoundsAnalysis':
-            # determine max and min
-            maxValueB = round(max(df[columnName]),2)
-            minValueB = round(min(df[columnName]),2)
-            # determine how often the data goes out of bounds
+            # determine max and min; answered from the coarsest pyramid levels that give the exact values
+            minValueB, maxValueB = pyramid_extremes(pyramid, columnName, startDate, endDate, months)
+            maxValueB = round(maxValueB,2)
+            minValueB = round(minValueB,2)
+            # determine how often the data goes out of bounds; number of points per month
+            dataset = pyramid['dataset'].select(startDate, endDate, months)
+            values = dataset[columnName]
+            totals = pyramid_count(pyramid, startDate, endDate, months)
+            if setpointMode in [None, 'fixed']:
+                lower, upper = inputMin, inputMax
+                lows = pyramid_count(pyramid, startDate, endDate, months, columnName, below=inputMin)
+                highs = pyramid_count(pyramid, startDate, endDate, months, columnName, above=inputMax)
+            else:
+                # bounds of every sample, looked up from its month or day of year (or the running mean)
+                lower, upper = setpoint_bounds(dataset.times, values, setpointMode, inputMin, inputMax, setpointTable,
+                                               band)
+                with np.errstate(invalid='ignore'):
+                    lows = sample_count(pyramid, dataset.times, values <= lower.astype(values.dtype))
+                    highs = sample_count(pyramid, dataset.times, values >= upper.astype(values.dtype))
+            numEntries = totals.sum()
             # too low:
-            numLow = np.sum(df[columnName] <= inputMin)
-            numEntries = len(df[columnName])
-            percentLow = round((numLow / numEntries) * 100,2)
+            percentLow = round((lows.sum() / numEntries) * 100,2)
             # too high:
-            numHigh = np.sum(df[columnName] >= inputMax)
-            numEntries = len(df[columnName])
-            percentHigh = round((numHigh / numEntries) * 100,2)
+            percentHigh = round((highs.sum() / numEntries) * 100,2)
             # out of bounds in general:
             percentOutOfBounds = round(percentLow + percentHigh,2)
             # value to return to text output:
@@ -385,33 +502,23 @@ def update_graph_and_analysis(n_clicks, filename, df_storage, parameter, analysi
             Overall, {} was out of the desired bounds {}% of the time.
             '''.format(columnName, maxValueB,minValueB, columnName, percentLow, columnName, percentHigh, columnName,
                        percentOutOfBounds)
-
-            # Add bound lines to time series graph
-            df['Lower Bound'] = inputMin
-            df['Upper Bound'] = inputMax
-
-            # wrap title text
-            title1 = columnName + ' Time Series for ' + filename
-            split_text = textwrap.wrap(title1,width=100)
-            title2 = '<br>'.join(split_text)
-            # time series graph to return
-            figure = {'data': [{'x': df['Date and Time in GMT'], 'y': df[columnName], 'name': filename},
-                               {'x': df['Date and Time in GMT'], 'y': df['Lower Bound'],'name': 'Lower Bound'},
-                               {'x': df['Date and Time in GMT'], 'y': df['Upper Bound'], 'name': 'Upper Bound'}
-                              ],
-                      'layout': {'title': title2,'xaxis':{'title':'Year'},'yaxis':{'title':columnName}}}
-
-            # contour plots; prepare data
-            for i in range(0, len(monthsArray)):
-                for j in range(0, len(yearsArray)):
-                    # creates boolean array of percentage out of bounds
-                    totalPoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]))
-                    outOfRangePoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]) &
-                                              (df[columnName] <= inputMin))
-                    outOfRangePoints2 = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]) &
-                                              (df[columnName] >= inputMax))
-                    storageMin[i, j] = (outOfRangePoints / totalPoints) * 100
-                    storageMax[i, j] = (outOfRangePoints2 / totalPoints) * 100
+            if setpointMode not in [None, 'fixed']:
+                children += ' Set-points used: {}.'.format(
+                    [option['label'] for option in SETPOINT_OPTIONS if option['value'] == setpointMode][0])
+            # excursions out of bounds, from every sample in the selection
+            excursions = find_excursions(filename, dataset.times.astype(np.int64), values, lower, upper,
+                                         (minDuration or 0) * 60, hysteresis or 0)
+            excursionText = 'There were {} excursions out of bounds lasting at least {} minutes.'.format(
+                len(excursions), minDuration or 0)
+            if len(excursions):
+                excursionText += ' The longest lasted {} hours.'.format(round(excursions['Duration (hours)'].max(), 2))
+            excursionTable = dash_table.DataTable(
+                columns=[{"name": i, "id": i} for i in EXCURSION_COLUMNS[1:]],
+                data=excursion_records(excursions), sort_action='native', page_size=20)
+
+            # contour plots; prepare data from the monthly counts
+            yearsArray, monthsArray, storageMin = contour_grid(lows, totals)
+            yearsArray, monthsArray, storageMax = contour_grid(highs, totals)
 
             # "percent under bounds" contour plot
             figMin = go.Figure(data=
@@ -441,7 +548,7 @@ def update_graph_and_analysis(n_clicks, filename, df_storage, parameter, analysi
                 colorscale='GnBu',
                 contours=dict(
                     start=0,
-                    end=np.max(storageMax),
+                    end=np.nanmax(storageMax),
                     size=2)
             ))
             # control title length
@@ -453,40 +560,51 @@ def update_graph_and_analysis(n_clicks, filename, df_storage, parameter, analysi
                 xaxis_title="Years",
                 yaxis_title="Months"
             )
-            div = html.Div([html.H6(children=children)])
-            return figure, div, figMin, figMax
+            div = html.Div([html.H6(children=children), html.H6(children=excursionText), excursionTable])
+            return div, figMin, figMax, settings
 
 
         elif analysis == 'SwingAnalysis':
-            # perform analysis
-            swingArray, sum, lastValue, df = swing_analysis(df, inputMax, columnName)
-            # max swing
-            maxValueS = round(max(swingArray),2)
-            # determine percent of time out of bounds
-            numSwing = np.sum(swingArray >= inputMax)
-            numEntries = len(swingArray)
-            percentSwing = round(numSwing / numEntries * 100, 2)
-            # text to output:
-            children = u''' The maximum swing value for {} is {} and there were {} times that {} was out of the 
-            permitted swing range of {}. The {} swing was out bounds {}% of the time.
-            '''.format(columnName, maxValueS, sum, columnName, inputMax, columnName, percentSwing)
-
-            # wrap title text
-            title1 = columnName + ' Time Series for ' + filename
-            split_text = textwrap.wrap(title1, width=100)
-            title2 = '<br>'.join(split_text)
-            # graph to return
-            figure = {'data': [{'x': df['Date and Time in GMT'], 'y': df[columnName], 'name': filename}],
-                'layout':{'title': title2,'xaxis':{'title':'Year'},'yaxis':{'title':columnName}}}
-
-            # contour plot; prepare data
-            for i in range(0, len(monthsArray)):
-                for j in range(0, len(yearsArray)):
-                    # creates boolean array of
-                    totalPoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]))
-                    outOfRangePoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]) &
-                                              (df['swing'] >= inputMax))
-                    storageMax[i, j] = (outOfRangePoints / totalPoints) * 100
+            if swingMode in [None, 'rolling']:
+                # swing needs every sample in the selection
+                df = pyramid_frame(pyramid, startDate, endDate, months)
+
+                # 24-hour swing after every reading, from the running maxima and minima
+                swingArray = rolling_swings(df[columnName].to_numpy(dtype=np.float64)[None, :])[0]
+                df['swing'] = swingArray
+                # max swing
+                maxValueS = round(max(swingArray),2)
+                # determine percent of time out of bounds
+                numSwing = np.sum(swingArray >= inputMax)
+                numEntries = len(swingArray)
+                percentSwing = round(numSwing / numEntries * 100, 2)
+                # text to output:
+                children = u''' The maximum swing value for {} is {} and there were {} times that {} was out of the 
+                permitted swing range of {}. The {} swing was out bounds {}% of the time.
+                '''.format(columnName, maxValueS, numSwing, columnName, inputMax, columnName, percentSwing)
+
+                # contour plot; prepare data by grouping on the calendar columns made when the file was read
+                percentOut = ((df['swing'] >= inputMax) * 100).groupby([df['month'], df['year']]).mean().unstack()
+                title7 = "Percentage of points where {} swing is greater than the desired swing value".format(
+                    columnName)
+            else:
+                # swing of every local clock hour, day or week, from grouped reductions over the selected samples
+                dataset = pyramid['dataset'].select(startDate, endDate, months)
+                periodStarts, swings = calendar_swings(dataset, [columnName], swingMode)
+                maxValueS, numSwing, numPeriods = swing_statistics(swings[0], inputMax)
+                percentSwing = round(numSwing / numPeriods * 100, 2) if numPeriods else 0
+                period = SWING_PERIODS[swingMode]
+                label = [option['label'] for option in SWING_OPTIONS if option['value'] == swingMode][0]
+                children = u''' {}: the maximum for {} is {}. It was at least the permitted swing of {} in {} of {} {}
+                ({}%).'''.format(label, columnName, round(maxValueS, 2), inputMax, numSwing, numPeriods, period,
+                                  percentSwing)
+                # contour plot; percentage of the periods in each month
+                percentOut = monthly_percent_over(periodStarts, swings[0], inputMax)
+                title7 = "Percentage of {} where {} swing is at least the desired swing value".format(period,
+                                                                                                      columnName)
+            yearsArray = percentOut.columns.values
+            monthsArray = percentOut.index.values
+            storageMax = percentOut.values # months without data in a year are left empty
 
             # create figure to send to interface
             figMax = go.Figure(data=
@@ -497,11 +615,10 @@ def update_graph_and_analysis(n_clicks, filename, df_storage, parameter, analysi
                 colorscale='GnBu',
                 contours=dict(
                     start=0,
-                    end=np.max(storageMax),
+                    end=np.nanmax(storageMax),
                     size=2)
             ))
             # control title length
-            title7 = "Percentage of points where {} swing is greater than the desired swing value".format(columnName)
             split_text4 = textwrap.wrap(title7, width=50)
             title8 = '<br>'.join(split_text4)
             figMax.update_layout(
@@ -513,44 +630,94 @@ def update_graph_and_analysis(n_clicks, filename, df_storage, parameter, analysi
             figMin = {'data': [{'x': [0], 'y': [0], 'name': 'N/A'}, ],
                       'layout': {'title': 'See graph at right for swing.'}}
             div = html.Div([html.H6(children=children)])
-            return figure, div, figMin, figMax
+            return div, figMin, figMax, settings
+
+
+# time series graph; drawn after each analysis and re-fetched for the visible range when the user zooms
+@callbacks.callback(Output('Mygraph', 'figure'),
+                    [Input('graph-settings', 'children'),
+                     Input('Mygraph', 'relayoutData')],
+                    [State('df-storage', 'children')])
+def update_time_series(settings, relayoutData, df_storage):
+    if settings is None:
+        figure = {'data': [{'x': [0], 'y': [0], 'name': 'N/A'}, ], 'layout':
+            {'title': 'No data uploaded yet'}}
+        return figure
+    xRange = None
+    if dash.callback_context.triggered[0]['prop_id'] == 'Mygraph.relayoutData':
+        if relayoutData is None:
+            raise PreventUpdate
+        elif 'xaxis.range[0]' in relayoutData:
+            xRange = [relayoutData['xaxis.range[0]'], relayoutData['xaxis.range[1]']]
+        elif 'xaxis.range' in relayoutData:
+            xRange = relayoutData['xaxis.range']
+        elif 'xaxis.autorange' not in relayoutData:
+            raise PreventUpdate # e.g. the y axis was zoomed; the points shown do not change
+    settings = json.loads(settings)
+    selection = json.loads(df_storage)
+    startDate, endDate, months = selection_range(selection)
+    if xRange is not None:
+        startDate = max(startDate, pd.Timestamp(xRange[0]))
+        endDate = min(endDate, pd.Timestamp(xRange[1]))
+    pyramid = load_room(selection['room'], startDate, endDate, months)
+    if pyramid is None:
+        raise PreventUpdate
+    columnName = column_name(settings['parameter'])
+    # the finest pyramid level that fits in MAX_GRAPH_ROWS rows; full resolution once zoomed in far enough
+    times, values = pyramid_series(pyramid, columnName, startDate, endDate, months, MAX_GRAPH_ROWS)
+    return time_series_figure(times, values, columnName, settings['filename'], settings['analysis'],
+                              settings['inputMin'], settings['inputMax'], xRange, settings)
+
 
+# list the rooms in the local data store; refreshed after every date range submission
+@callbacks.callback(Output('stored-room-dropdown', 'options'),
+                    [Input('mask-range-output', 'children')])
+def update_stored_rooms(children):
+    return [{'label': room, 'value': room} for room in list_rooms()]
 
 # show/hide bound input boxes based on type of analysis being performed
-@app.callback(Output(component_id='input_min', component_property='style'),
-             [Input(component_id='analysis-dropdown', component_property='value')])
-def show_hide_element(analysis):
-    if analysis == 'SwingAnalysis':
-        return {'display': 'none'}
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'showBoundsInputs'),
+                              [Output(component_id='input_min', component_property='style'),
+                               Output(component_id='input_max', component_property='style'),
+                               Output(component_id='excursion-settings', component_property='style'),
+                               Output(component_id='setpoint-settings', component_property='style'),
+                               Output(component_id='swing-settings', component_property='style')],
+                              [Input(component_id='analysis-dropdown', component_property='value')],
+                              [State('ui-settings', 'children')])
+
+# show the set-point table for monthly and ramped bounds and the band half-width for floating bounds
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'showSetpointInputs'),
+                              [Output('setpoint-table-container', 'style'),
+                               Output('float-band', 'style')],
+                              [Input('setpoint-mode', 'value')])
+
+# fill the set-point table with the bounds above, to be edited month by month
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'updateSetpointTable'),
+                              Output('setpoint-table', 'data'),
+                              [Input('input_min', 'value'),
+                               Input('input_max', 'value')],
+                              [State('setpoint-table', 'data')])
 
 # change suggested bound values depending on parameter and type of analysis
-@app.callback([Output(component_id='input_min', component_property='value'),
-               Output(component_id='input_max', component_property='value')],
-              [Input(component_id='analysis-dropdown', component_property='value'),
-              Input(component_id='parameter-dropdown', component_property= 'value')])
-def change_value2(analysis, parameter):
-    if analysis == 'SwingAnalysis':
-        return 0, 10
-    else:
-        if parameter == 'Temp':
-            return 63, 74
-        elif parameter == 'RH':
-            return 35, 57
-        elif parameter == 'DP':
-            return 37, 56
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'suggestBounds'),
+                              [Output(component_id='input_min', component_property='value'),
+                               Output(component_id='input_max', component_property='value')],
+                              [Input(component_id='analysis-dropdown', component_property='value'),
+                               Input(component_id='parameter-dropdown', component_property= 'value')],
+                              [State('ui-settings', 'children')])
 
 # change the text based on the analysis selected
-@app.callback([Output('bounds-text','style'),
-               Output('swing-text','style')],
-              [Input('analysis-dropdown','value')])
-def change_text(value):
-    styleOn = {'display': 'inline-block'}
-    styleOff = {'display': 'none'}
-    if value == 'SwingAnalysis':
-        return styleOff, styleOn
-    else:
-        return styleOn, styleOff
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'changeText'),
+                              [Output('bounds-text','style'),
+                               Output('swing-text','style')],
+                              [Input('analysis-dropdown','value')],
+                              [State('ui-settings', 'children')])
 
 #_______________________________________________________________________________________________________________________
+# Dash app of this interface, mounted on server (a Flask server, or True for a server of its own) under the URL path
+# prefix; see wsgi.py for serving every interface together
+def create_app(server=True, prefix='/'):
+    return make_app(__name__, layout, callbacks, server, prefix)
+
 if __name__ == '__main__':
-    app.run_server(debug = 'True') # runs app
+    create_app().run_server(debug = 'True') # runs app
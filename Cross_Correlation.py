@@ -6,20 +6,30 @@ from dash.dependencies import Input, Output, State
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.exceptions import PreventUpdate
-import base64
-import io
-import plotly.express as px
+import numpy as np
 import pickle
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from winterthur_data import PARAMETER_OPTIONS, make_df_pm2, imputed_message
+from winterthur_cache import store_value, stored_value
+from winterthur_app import CallbackRegistry, make_app
+from winterthur_jobs import POLL_INTERVAL, submit_job, cancel_job, job_outputs, no_progress
+from winterthur_metrics import stage
 
-# read in colorbar image (for color scale on floorplan)
-encoded_image = base64.b64encode(open('colorbarSpectralhorz.png', 'rb').read())
-image_src = 'data:image/png;base64,{}'.format(encoded_image.decode())
+# colorbar image (for color scale on floorplan), served from the assets folder; the URL is relative to the page so it
+# also works when the interface is mounted under a URL path (see wsgi.py)
+COLORBAR_SRC = 'assets/colorbarSpectralhorz.png'
 
-app = dash.Dash(__name__)
+# scatter matrix settings
+DENSITY_BINS = 50 # default number of bins along each axis of a density panel
+WEBGL_POINT_BUDGET = 200000 # maximum number of points sent to the browser across all panels of the WebGL matrix
+# names of the parameters that can be compared
+PARAMETER_LABELS = {option['value']: option['label'] for option in PARAMETER_OPTIONS}
+
+callbacks = CallbackRegistry() # callbacks of the interface; the app is made by create_app
 
 # APP LAYOUT____________________________________________________________________________________________________________
-app.layout = html.Div([
+layout = html.Div([
     # title
     html.Div([
         html.H1(children='Winterthur Cross-Correlation Interface', style={'textAlign': 'center'})
@@ -27,6 +37,9 @@ app.layout = html.Div([
 
     # upload files
     html.Div([
+        html.H6('Select the parameters to compare. Dew point, absolute humidity, humidity ratio and wood equilibrium '
+                'moisture content are computed from the temperature and relative humidity in each file.'),
+        dcc.Checklist(id='parameter-checklist', options=PARAMETER_OPTIONS, value=['Temp', 'RH']),
         html.H6('Please upload the files you wish to compare.'),
         dcc.Upload(
             html.Button('Upload files'),
@@ -35,8 +48,7 @@ app.layout = html.Div([
             multiple=True
         ),
         html.Div(id='output-many-upload', style={'display': 'inline-block'}),
-        html.H6(id='temp-df-storage', style={'display': 'none'}),
-        html.H6(id='RH-df-storage', style={'display': 'none'})
+        html.H6(id='df-storage', style={'display': 'none'}) # key of the resampled data of each parameter
     ],className='pretty_container twelve columns'),
 
     # run correlation
@@ -44,24 +56,37 @@ app.layout = html.Div([
         html.Button(id='run-cross-corr', children='Run cross-correlation'),
         # see correlation results as a table
         html.Div(id='cross-corr-output', style={'display': 'inline-block'}),
-        html.Div(id='corr-temp-storage', style={'display': 'none'}),
-        html.Div(id='corr-RH-storage', style={'display': 'none'}),
+        html.Div(id='corr-storage', style={'display': 'none'}), # key of the correlation matrix of each parameter
     ],className='pretty_container twelve columns'),
 
     # select temp or rh; make graphs: heatmap and scatter plot matrix
     html.Div([
-        html.H6('Please select whether you want to visualize temperature or relative humidity cross-correlation.'),
+        html.H6('Please select which parameter\'s cross-correlation you want to visualize.'),
         dcc.RadioItems(
-            id='radio-buttons',
-            options=[
-                {'label': 'Visualize temperature correlation.', 'value': 'temp'},
-                {'label': 'Visualize relative humidity correlation.', 'value': 'rh'}
-            ],
-            value='temp'
+            id='radio-buttons', # options are the uploaded parameters
+            value='Temp'
         ),
         html.H6('Click the button corresponding to the graph you would like to make.'),
         html.Button(id='make-heatmap', children='Make heatmap'),
-        html.Button(id='make-scatter', children='Make scatter plot matrix')
+        html.Button(id='make-scatter', children='Make scatter plot matrix'),
+        html.Button(id='scatter-cancel-button', children='Cancel'),
+        html.Div(id='scatter-job-progress'), # progress of a scatter plot matrix being made
+        html.Div(id='scatter-job-id', style={'display': 'none'}),
+        dcc.Interval(id='scatter-job-interval', interval=POLL_INTERVAL, disabled=True),
+        # how the scatter plot matrix is drawn
+        html.H6('Select how the scatter plot matrix is drawn. The density heatmap bins the data on the server and works '
+                'for any amount of data. Individual points are drawn with WebGL and the data is thinned to at most {} '
+                'points in total, so it is only suited to small datasets.'.format(WEBGL_POINT_BUDGET)),
+        dcc.RadioItems(
+            id='scatter-mode',
+            options=[
+                {'label': 'Density heatmap.', 'value': 'density'},
+                {'label': 'Individual points (WebGL).', 'value': 'webgl'}
+            ],
+            value='density'
+        ),
+        html.H6('Number of bins along each axis of a density heatmap:'),
+        dcc.Input(id='scatter-bins', type='number', min=2, value=DENSITY_BINS)
     ],className='pretty_container twelve columns'),
 
     # heatmap
@@ -81,14 +106,10 @@ app.layout = html.Div([
     html.Div([
         html.Div([
             # radio buttons
-            html.H6('Please select whether you want to visualize temperature or relative humidity cross-correlation.'),
+            html.H6('Please select which parameter\'s cross-correlation you want to visualize.'),
             dcc.RadioItems(
-                id='radio-buttons2',
-                options=[
-                    {'label': 'Temperature.', 'value': 'temp'},
-                    {'label': 'Relative Humidity', 'value': 'rh'}
-                ],
-                value='temp'
+                id='radio-buttons2', # options are the uploaded parameters
+                value='Temp'
             ),
             html.H6('Please select which room you want to be the "main" room, the room that you compare all other '
                     'files to.'),
@@ -156,187 +177,234 @@ app.layout = html.Div([
             image=''
         ),
 
-        html.Div([html.Img(id='colorbar', src=image_src, style={'width': 1000, 'height': 100})])
+        html.Div([html.Img(id='colorbar', src=COLORBAR_SRC, style={'width': 1000, 'height': 100})])
     ],className='pretty_container twelve columns'),
 ])
 
 
 # FUNCTIONS_____________________________________________________________________________________________________________
-# make .pm2 file into a df
-def make_df_pm2(filename, contents):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3])
-    df['DATE AND TIME GMT'] = pd.to_datetime(df['DATE AND TIME GMT'])  # set date and time column as datetime type
-    df.columns = ['Date and Time in GMT', 'Temperature (Degrees Fahrenheit)', 'Relative Humidity (%)']  # rename columns
-    df = df.set_index('Date and Time in GMT')
-    # resample data to fill in any gaps and to ensure same time interval
-    upsampledTemp = df['Temperature (Degrees Fahrenheit)'].resample('15min').mean()
-    interpolatedTemp = upsampledTemp.interpolate(method='linear')
-    upsampledRH = df['Relative Humidity (%)'].resample('15min').mean()
-    interpolatedRH = upsampledRH.interpolate(method='linear')
-    frame = {'Temp_{}'.format(filename): interpolatedTemp, 'RH_{}'.format(filename): interpolatedRH}
-    result = pd.DataFrame(frame)
-    return result
+# bin every column of a dataframe once; returns the bin index of every value and the bin centers of every column
+def bin_columns(df, numBins):
+    values = df.to_numpy(dtype=float)
+    low = values.min(axis=0)
+    width = (values.max(axis=0) - low) / numBins
+    width[width == 0] = 1 # constant column; every value falls in the first bin
+    indices = np.floor((values - low) / width).astype(np.int64)
+    np.clip(indices, 0, numBins - 1, out=indices) # maximum value lands on the upper edge of the last bin
+    centers = low + (np.arange(numBins)[:, None] + 0.5) * width # shape (numBins, number of columns)
+    return indices, centers
+
+
+# scatter plot matrix where every panel is a 2-D histogram (density heatmap) computed on the server
+# the figure holds numBins * numBins values per panel no matter how many rows the dataframe has
+@stage('figure')
+def make_density_matrix(df, title, numBins=DENSITY_BINS, progress=no_progress):
+    names = list(df.columns)
+    p = len(names)
+    indices, centers = bin_columns(df, numBins)
+    fig = make_subplots(rows=p, cols=p, shared_xaxes=True, shared_yaxes=True,
+                        horizontal_spacing=0.01, vertical_spacing=0.01)
+    for r in range(p):
+        progress(0.5 + 0.5 * r / p, 'Drawing row {} of {}'.format(r + 1, p))
+        for c in range(r, p):
+            # one bincount per pair; the mirrored panel is the transpose
+            counts = np.bincount(indices[:, r] * numBins + indices[:, c],
+                                 minlength=numBins * numBins).reshape(numBins, numBins)
+            with np.errstate(divide='ignore'):
+                z = np.log10(counts) # empty bins become -inf and are drawn transparent below
+            z[counts == 0] = np.nan
+            fig.add_trace(go.Heatmap(x=centers[:, c], y=centers[:, r], z=z, customdata=counts,
+                                     coloraxis='coloraxis', hovertemplate='%{customdata} points<extra></extra>'),
+                          row=r + 1, col=c + 1)
+            if c != r:
+                fig.add_trace(go.Heatmap(x=centers[:, r], y=centers[:, c], z=z.T, customdata=counts.T,
+                                         coloraxis='coloraxis', hovertemplate='%{customdata} points<extra></extra>'),
+                              row=c + 1, col=r + 1)
+    label_matrix_axes(fig, names)
+    fig.update_layout(title=title, height=1024,
+                      coloraxis={'colorscale': 'Spectral_r', 'colorbar': {'title': 'log10(points)'}})
+    return fig
+
+
+# scatter plot matrix of individual points drawn with WebGL; rows are thinned so the whole figure stays under
+# WEBGL_POINT_BUDGET points
+@stage('figure')
+def make_webgl_matrix(df, title, progress=no_progress):
+    names = list(df.columns)
+    p = len(names)
+    rowsPerPanel = max(1, WEBGL_POINT_BUDGET // (p * p))
+    step = int(np.ceil(len(df) / rowsPerPanel)) if len(df) > rowsPerPanel else 1
+    sample = df.iloc[::step]
+    fig = make_subplots(rows=p, cols=p, shared_xaxes=True, shared_yaxes=True,
+                        horizontal_spacing=0.01, vertical_spacing=0.01)
+    for r in range(p):
+        progress(0.5 + 0.5 * r / p, 'Drawing row {} of {}'.format(r + 1, p))
+        for c in range(p):
+            fig.add_trace(go.Scattergl(x=sample[names[c]], y=sample[names[r]], mode='markers',
+                                       marker={'size': 2}, showlegend=False),
+                          row=r + 1, col=c + 1)
+    label_matrix_axes(fig, names)
+    if step > 1:
+        title = title + ' (every {} points shown)'.format(step)
+    fig.update_layout(title=title, height=1024)
+    return fig
+
+
+# scatter plot matrix of a parameter, drawn as a density heatmap or with WebGL. Run as a job
+@stage('figure')
+def scatter_matrix(value, mode, numBins, df_storage, progress=no_progress):
+    progress(0.1, 'Reading the data')
+    df = stored_value(df_storage)[value]
+    title = 'Correlation Matrix of {}'.format(PARAMETER_LABELS[value])
+    progress(0.5, 'Drawing the scatter plot matrix')
+    if mode == 'webgl':
+        return make_webgl_matrix(df, title, progress)
+    else:
+        if numBins is None or numBins < 2:
+            numBins = DENSITY_BINS
+        return make_density_matrix(df, title, int(numBins), progress)
+
+
+# put column names on the bottom row and left column of a scatter plot matrix
+def label_matrix_axes(fig, names):
+    p = len(names)
+    for i in range(p):
+        fig.update_xaxes(title_text=names[i], row=p, col=i + 1)
+        fig.update_yaxes(title_text=names[i], row=i + 1, col=1)
 
 
 # CALLBACKS_____________________________________________________________________________________________________________
 # upload comparison files and run cross-correlation
-@app.callback([Output('output-many-upload', 'children'),  # output that files were uploaded and corr was run
-               Output('temp-df-storage', 'children'),  # hidden div
-               Output('RH-df-storage', 'children')],  # hidden div
-              [Input('many-files-upload', 'filename')],
-              [State('many-files-upload', 'contents')])
-def read_in_files(list_filenames, list_contents):
-    if list_filenames is not None:
-        df_temp = pd.DataFrame()
-        df_RH = pd.DataFrame()
-        # run cross corr
-        for filename, contents in zip(list_filenames, list_contents):
-            df = make_df_pm2(filename, contents)
-            df_temp['Temp_{}'.format(filename)] = df['Temp_{}'.format(filename)]
-            df_RH['RH_{}'.format(filename)] = df['RH_{}'.format(filename)]
-        # drop rows with NaN in them
-        df_temp.dropna(inplace=True)
-        df_RH.dropna(inplace=True)
-        children = 'Files have been uploaded.'
-        div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
-        return div, df_temp.to_json(date_format='iso', orient='split'), df_RH.to_json(date_format='iso',
-                                                                                           orient='split')
-
-
-# run cross-correlation
-@app.callback([Output('corr-temp-storage', 'children'),  # hidden div
-               Output('corr-RH-storage', 'children'),  # hidden div
-               Output('cross-corr-output', 'children'),  # output that corr was run
-               Output('radio-buttons3', 'options')],
-              [Input('run-cross-corr', 'n_clicks')],
-              [State('temp-df-storage', 'children'),
-               State('RH-df-storage', 'children')])
-def run_cross_corr(n_clicks, temp_df, rh_df):
-    if n_clicks is None:
+# each selected parameter gets its own dataframe with one column per file, named '<parameter>_<filename>'
+@callbacks.callback([Output('output-many-upload', 'children'),  # output that files were uploaded and corr was run
+                     Output('df-storage', 'children'),  # hidden div
+                     Output('radio-buttons', 'options'),
+                     Output('radio-buttons2', 'options')],
+                    [Input('many-files-upload', 'filename')],
+                    [State('many-files-upload', 'contents'),
+                     State('parameter-checklist', 'value')])
+def read_in_files(list_filenames, list_contents, parameters):
+    if list_filenames is None or not parameters:
+        raise PreventUpdate
+    dfs = {parameter: pd.DataFrame() for parameter in parameters}
+    imputeds = {parameter: pd.DataFrame() for parameter in parameters}
+    for filename, contents in zip(list_filenames, list_contents):
+        df, imputed = make_df_pm2(filename, contents, parameters)
+        for parameter in parameters:
+            column = '{}_{}'.format(parameter, filename)
+            dfs[parameter][column] = df[column]
+            imputeds[parameter][column] = imputed[column]
+    # drop rows with NaN in them (including gaps too long to interpolate)
+    for parameter in parameters:
+        dfs[parameter].dropna(inplace=True)
+    children = 'Files have been uploaded. ' + imputed_message([(imputeds[parameter], dfs[parameter].index)
+                                                               for parameter in parameters])
+    div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
+    storage = store_value(dfs) # kept on the server; the hidden div holds its key
+    options = [{'label': PARAMETER_LABELS[parameter], 'value': parameter} for parameter in parameters]
+    return div, storage, options, options
+
+
+# run cross-correlation of every uploaded parameter
+@callbacks.callback([Output('corr-storage', 'children'),  # hidden div
+                     Output('cross-corr-output', 'children'),  # output that corr was run
+                     Output('radio-buttons3', 'options')],
+                    [Input('run-cross-corr', 'n_clicks')],
+                    [State('df-storage', 'children'),
+                     State('many-files-upload', 'filename')])
+def run_cross_corr(n_clicks, df_storage, list_filenames):
+    if n_clicks is None or df_storage is None:
         raise PreventUpdate
     else:
-        # temp
-        df_temp = pd.read_json(temp_df, orient='split')
-        temp_corr = df_temp.corr()
-        # rh
-        df_RH = pd.read_json(rh_df, orient='split')
-        RH_corr = df_RH.corr()
-
-        names = list(temp_corr.columns)
-        options = []
-        for i in range(len(names)):
-            Dict = {}
-            Dict['value'] = names[i]
-            names[i] = names[i].replace('Temp_', '')
-            Dict['label'] = names[i]
-            options.append(Dict)
+        corrs = {parameter: df.corr() for parameter, df in stored_value(df_storage).items()}
+        options = [{'label': filename, 'value': filename} for filename in list_filenames]
         children = 'Cross-correlation was run.'
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
-        return temp_corr.to_json(date_format='iso', orient='split'), \
-               RH_corr.to_json(date_format='iso', orient='split'), div, options
+        return store_value(corrs), div, options
 
 
 # make heatmap
-@app.callback(Output('heatmap', 'figure'),
-              [Input('make-heatmap', 'n_clicks')],
-              [State('corr-temp-storage', 'children'),
-               State('corr-RH-storage', 'children'),
-               State('radio-buttons', 'value')])
-def make_graph(n_clicks, corrT, corrRH, value):
-    if n_clicks is None:
+@callbacks.callback(Output('heatmap', 'figure'),
+                    [Input('make-heatmap', 'n_clicks')],
+                    [State('corr-storage', 'children'),
+                     State('radio-buttons', 'value')])
+def make_graph(n_clicks, corr_storage, value):
+    if n_clicks is None or corr_storage is None:
         raise PreventUpdate
     else:
-        if value == 'temp':
-            corr_temp = pd.read_json(corrT, orient='split')
-            fig1 = go.Figure(data=go.Heatmap(z=corr_temp.values.tolist(), x=corr_temp.columns.tolist(),
-                                             y=corr_temp.columns.tolist(), colorscale='Spectral'))
-            fig1.update_yaxes(autorange="reversed")
-            # fig1.update_xaxes(side='top')
-            fig1.update_layout(title='Temperature Correlation Values')
-            return fig1
-        else:  # value == 'rh'
-            corr_rh = pd.read_json(corrRH, orient='split')
-            fig1 = go.Figure(data=go.Heatmap(z=corr_rh.values.tolist(), x=corr_rh.columns.tolist(),
-                                             y=corr_rh.columns.tolist(), colorscale='Spectral'))
-            fig1.update_yaxes(autorange="reversed")
-            # fig1.update_xaxes(side='top')
-            fig1.update_layout(title='Relative Humidity Correlation Values')
-            return fig1
-
-# make scatter plot matrix
-@app.callback(Output('scatter', 'figure'),
-              [Input('make-scatter', 'n_clicks')],
-              [State('radio-buttons', 'value'),
-               State('temp-df-storage', 'children'),
-               State('RH-df-storage', 'children')])
-def make_graph(n_clicks, value, temp_df, rh_df):
-    if n_clicks is None:
+        corr = stored_value(corr_storage)[value]
+        fig1 = go.Figure(data=go.Heatmap(z=corr.values.tolist(), x=corr.columns.tolist(),
+                                         y=corr.columns.tolist(), colorscale='Spectral'))
+        fig1.update_yaxes(autorange="reversed")
+        # fig1.update_xaxes(side='top')
+        fig1.update_layout(title='{} Correlation Values'.format(PARAMETER_LABELS[value]))
+        return fig1
+
+# make scatter plot matrix as a background job; the interval polls its progress and shows the figure once it is done
+@callbacks.callback([Output('scatter', 'figure'),
+                     Output('scatter-job-id', 'children'),
+                     Output('scatter-job-interval', 'disabled'),
+                     Output('scatter-job-progress', 'children')],
+                    [Input('make-scatter', 'n_clicks'),
+                     Input('scatter-job-interval', 'n_intervals'),
+                     Input('scatter-cancel-button', 'n_clicks')],
+                    [State('radio-buttons', 'value'),
+                     State('scatter-mode', 'value'),
+                     State('scatter-bins', 'value'),
+                     State('df-storage', 'children'),
+                     State('scatter-job-id', 'children')])
+def make_graph(n_clicks, n_intervals, cancelClicks, value, mode, numBins, df_storage, jobId):
+    trigger = dash.callback_context.triggered[0]['prop_id']
+    if n_clicks is None or df_storage is None:
         raise PreventUpdate
-    else:
-        if value == 'temp':
-            temp_df = pd.read_json(temp_df, orient='split')
-            fig2 = px.scatter_matrix(temp_df, title='Correlation Matrix of Temperature')
-            fig2.update_layout(height=1024)  # width=1000
-            # fig2.update_layout(xaxis_tickangle=45, yaxis_tickangle=-45)
-            return fig2
-        else:  # value == 'rh'
-            rh_df = pd.read_json(rh_df, orient='split')
-            fig2 = px.scatter_matrix(rh_df, title='Correlation Matrix of Relative Humidity')
-            return fig2
-            # fig2.update_layout(height=1024)#width=1000,
+    elif trigger == 'scatter-job-interval.n_intervals':
+        outputs = job_outputs(jobId, 1)
+        return outputs[:1] + [dash.no_update] + outputs[1:]
+    elif trigger == 'scatter-cancel-button.n_clicks':
+        if jobId is None:
+            raise PreventUpdate
+        cancel_job(jobId)
+        return [dash.no_update] * 2 + job_outputs(jobId, 0)
+    jobId = submit_job(scatter_matrix, value, mode, numBins, df_storage)
+    # polled until the job is done, even if it is done already
+    return [dash.no_update, jobId, False, job_outputs(jobId, 0)[1]]
 
 
 # update floorplan to have room names of data files uploaded
-# filters data based on the radio button picked, either temp or rh correlation comparison
+# filters data based on the radio button picked, i.e. which parameter's correlation is compared
 # colors are based on the number given as a value of the key in the data dictionary
 # i.e. 'room 2': 0.8 --> 0.8 is helps determine the color
-@app.callback([Output('dash-floorplan', 'data'),
-               Output('room-name-result', 'children')],
-              [Input('room-names-button', 'n_clicks')],
-              [State('corr-temp-storage', 'children'),
-               State('corr-RH-storage', 'children'),
-               State('radio-buttons2', 'value'),  # temp or rh
-               State('radio-buttons3', 'value')])  # "main" room
-def send_data_to_floorplan(n_clicks, corr_temp, corr_rh, value, room):
-    if n_clicks is None:
+@callbacks.callback([Output('dash-floorplan', 'data'),
+                     Output('room-name-result', 'children')],
+                    [Input('room-names-button', 'n_clicks')],
+                    [State('corr-storage', 'children'),
+                     State('radio-buttons2', 'value'),  # parameter
+                     State('radio-buttons3', 'value')])  # "main" room file
+def send_data_to_floorplan(n_clicks, corr_storage, value, room):
+    if n_clicks is None or corr_storage is None:
         raise PreventUpdate
     else:
         Dict = {}
-        if value == 'temp':
-            corr_temp = pd.read_json(corr_temp, orient='split')
-            names = list(corr_temp.columns)
-            selection = corr_temp[room]  # for RH replace 'Temp_' with 'RH_'
-            for i in range(selection.shape[0]):
-                Dict[names[i]] = selection[i]
-            children = 'You selected to visualize the floorplan with Temperature correlation and with {} as your "main"' \
-                       ' room file.'.format(room)
-            div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
-            return Dict, div
-        else:
-            corr_RH = pd.read_json(corr_rh, orient='split')
-            names = list(corr_RH.columns)
-            room = room.replace('Temp_', 'RH_')  # for RH replace 'Temp_' with 'RH_'
-            selection = corr_RH[room]
-            for i in range(selection.shape[0]):
-                Dict[names[i]] = selection[i]
-            print(Dict)
-            children = 'You selected to visualize the floorplan with Relative Humidity correlation and with {} as your' \
-                       ' "main" room file.'.format(room)
-            div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
-            return Dict, div
+        corr = stored_value(corr_storage)[value]
+        names = list(corr.columns)
+        selection = corr['{}_{}'.format(value, room)]
+        for i in range(selection.shape[0]):
+            Dict[names[i]] = selection.iloc[i]
+        children = 'You selected to visualize the floorplan with {} correlation and with {} as your "main" ' \
+                   'room file.'.format(PARAMETER_LABELS[value], room)
+        div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
+        return Dict, div
 
 
 # upload polygons from prior session; upload image for floorplan
-@app.callback([Output('upload-shapes-output', 'children'),
-               Output('dash-floorplan', 'shapes'),
-               Output('dash-floorplan', 'image'),
-               Output('dash-floorplan', 'update')],
-              [Input('shapes-upload', 'n_clicks'),
-               Input('floorplan-upload-button', 'n_clicks')],
-              [State('shapes-path', 'value'),
-               State('floorplan-image-input', 'value')])
+@callbacks.callback([Output('upload-shapes-output', 'children'),
+                     Output('dash-floorplan', 'shapes'),
+                     Output('dash-floorplan', 'image'),
+                     Output('dash-floorplan', 'update')],
+                    [Input('shapes-upload', 'n_clicks'),
+                     Input('floorplan-upload-button', 'n_clicks')],
+                    [State('shapes-path', 'value'),
+                     State('floorplan-image-input', 'value')])
 def save_shapes(n_clicks, n_clicks2, path, value):  # filename, contents):
     # figure out which button was clicked
     ctx = dash.callback_context
@@ -364,10 +432,10 @@ def save_shapes(n_clicks, n_clicks2, path, value):  # filename, contents):
 
 
 # save polygons to use again later
-@app.callback(Output('save-points-output', 'children'),
-              [Input('save-points', 'n_clicks')],
-              [State('save-points-input', 'value'),
-               State('dash-floorplan', 'shapes')])
+@callbacks.callback(Output('save-points-output', 'children'),
+                    [Input('save-points', 'n_clicks')],
+                    [State('save-points-input', 'value'),
+                     State('dash-floorplan', 'shapes')])
 def save_points(n_clicks, value, shapes):
     if n_clicks is None:
         raise PreventUpdate
@@ -380,5 +448,10 @@ def save_points(n_clicks, value, shapes):
 
 
 # ______________________________________________________________________________________________________________________
+# Dash app of this interface, mounted on server (a Flask server, or True for a server of its own) under the URL path
+# prefix; see wsgi.py for serving every interface together
+def create_app(server=True, prefix='/'):
+    return make_app(__name__, layout, callbacks, server, prefix)
+
 if __name__ == '__main__':
-    app.run_server(debug = 'True') # runs app
+    create_app().run_server(debug = 'True') # runs app
@@ -1,28 +1,30 @@
 # import needed packages
 import dash
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_floorplan
 from dash.exceptions import PreventUpdate
 import pandas as pd
 import numpy as np
-from factor_analyzer import FactorAnalyzer
-from factor_analyzer.factor_analyzer import calculate_bartlett_sphericity
-from factor_analyzer.factor_analyzer import calculate_kmo
 import plotly.graph_objects as go
 import pickle
 import base64
 import io
+from winterthur_data import PARAMETER_OPTIONS, make_df_pm2, imputed_message
+from winterthur_cache import store_value, stored_value
+from winterthur_app import CallbackRegistry, make_app
+from winterthur_jobs import POLL_INTERVAL, submit_job, cancel_job, job_outputs, no_progress
+from winterthur_metrics import stage
 
-app = dash.Dash(__name__) # make app
+callbacks = CallbackRegistry() # callbacks of the interface; the app is made by create_app
 
-# read in colorbar image (for color scale on floorplan)
-encoded_image = base64.b64encode(open('colorbarSpectralhorz.png', 'rb').read())
-image_src = 'data:image/png;base64,{}'.format(encoded_image.decode())
+# colorbar image (for color scale on floorplan), served from the assets folder; the URL is relative to the page so it
+# also works when the interface is mounted under a URL path (see wsgi.py)
+COLORBAR_SRC = 'assets/colorbarSpectralhorz.png'
 
 # APP LAYOUT____________________________________________________________________________________________________________
-app.layout = html.Div([
+layout = html.Div([
     # title
     html.Div([
         html.H1(children='Winterthur Factor Analysis Interface', style={'textAlign': 'center'})
@@ -46,7 +48,10 @@ app.layout = html.Div([
 
         # upload pm2s
         html.H6(id='pm2-label',
-                children='Upload all .pm2 files you wish to use during factor analysis.'),
+                children='Select the parameters to use and upload all .pm2 files you wish to use during factor analysis. '
+                         'Dew point, absolute humidity, humidity ratio and wood equilibrium moisture content are '
+                         'computed from the temperature and relative humidity in each file.'),
+        dcc.Checklist(id='parameter-checklist', options=PARAMETER_OPTIONS, value=['Temp', 'RH']),
         dcc.Upload(
             html.Button('Upload .pm2 files'),
             id='many-pm2-upload', style={'display': 'inline-block'}, multiple=True
@@ -74,7 +79,7 @@ app.layout = html.Div([
 
         # output selected data file filename
         html.Div(id='output-pickle-data-upload', style={'display': 'inline-block'}),
-        # Hidden div inside the app that stores the created dataframe
+        # Hidden div inside the app that stores the key of the created dataframe (the dataframe is kept on the server)
         html.Div(id='df-storage', style={'display': 'none'}),
 
         # save .pickle as .csv or vice versa
@@ -136,6 +141,10 @@ app.layout = html.Div([
         dcc.RadioItems(id='numFactors'),
         # button to run factor analysis once you have run all of the above and confirmed ok to run FA
         html.Button(id='FA-button', children='Run Factor Analysis using number of factors entered above.'),
+        html.Button(id='FA-cancel-button', children='Cancel'),
+        html.Div(id='FA-job-progress'), # progress of a running factor analysis
+        html.Div(id='FA-job-id', style={'display': 'none'}),
+        dcc.Interval(id='FA-job-interval', interval=POLL_INTERVAL, disabled=True),
 
         # display text results of FA upon clicking above button
         html.H6('Factors and Parameters:'),
@@ -224,36 +233,15 @@ app.layout = html.Div([
             data={},
             image=''
         ),
-        html.Div([html.Img(id='colorbar', src=image_src, style={'width': 1000, 'height': 100})])
+        html.Div([html.Img(id='colorbar', src=COLORBAR_SRC, style={'width': 1000, 'height': 100})])
     ],className='pretty_container twelve columns'),
 
 ])
 
 
 # FUNCTIONS_____________________________________________________________________________________________________________
-# make .pm2 file into a dataframe (specific to Winterthur)
-def make_df_pm2(filename, contents):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3])
-    # set date and time column as datetime type
-    df['DATE AND TIME GMT'] = pd.to_datetime(df['DATE AND TIME GMT'])
-    # rename columns
-    df.columns = ['Date and Time in GMT', 'Temperature (Degrees Fahrenheit)', 'Relative Humidity (%)']
-    df = df.set_index('Date and Time in GMT')
-    # resample data to fill in any gaps and to ensure same time interval
-    upsampledTemp = df['Temperature (Degrees Fahrenheit)'].resample('15min').mean()
-    interpolatedTemp = upsampledTemp.interpolate(method='linear')
-    upsampledRH = df['Relative Humidity (%)'].resample('15min').mean()
-    interpolatedRH = upsampledRH.interpolate(method='linear')
-    # create new dataframe with the resampled values
-    frame = {'Temp_{}'.format(filename): interpolatedTemp,
-             'RH_{}'.format(filename): interpolatedRH}
-    result = pd.DataFrame(frame)
-    return result
-
-
 # create dataframe from .pickle or .csv file
+@stage('parse')
 def parse_contents(contents, filename):
     content_type, content_string = contents.split(',')
     decoded = base64.b64decode(content_string)
@@ -276,83 +264,79 @@ def parse_contents(contents, filename):
 
 # CALLBACKS_____________________________________________________________________________________________________________
 # pickle or no pickle radio; hides upload .pm2 files if have .pickle file from prior session
-@app.callback([Output('upload-pickle-data', 'style'),
-               Output('output-pickle-data-upload', 'style'),
-               Output('pickle-label', 'style'),
-               Output('many-pm2-upload', 'style'),
-               Output('output-pm2-data-upload', 'style'),
-               Output('pm2-label', 'style'),
-               Output('csv-output','style'),
-               Output('save-csv-file','style'),
-               Output('pickle-output', 'style'),
-               Output('save-pickle-file', 'style'),
-               Output('save-file-text','style'),
-               Output('save-file-input','style'),
-               Output('csv-output2', 'style'),
-               Output('save-csv-file2', 'style'),
-               Output('pickle-output2', 'style'),
-               Output('save-pickle-file2', 'style'),
-               Output('save-file-text2','style'),
-               Output('save-file-input2','style')],
-              [Input('radio-buttons', 'value')])
-def hide_components(value):
-    styleOn = {'display': 'inline-block'}
-    styleOff = {'display': 'none'}
-    if value == 'yes-pickle':
-        return styleOn, styleOn, styleOn, styleOff, styleOff, styleOff, styleOff, styleOff, styleOff, styleOff, \
-               styleOff, styleOff, styleOn, styleOn, styleOn, styleOn, styleOn, styleOn
-    elif value == 'no-pickle':
-        return styleOff, styleOff, styleOff, styleOn, styleOn, styleOn, styleOn, styleOn, styleOn, styleOn, styleOn,\
-               styleOn, styleOff, styleOff, styleOff, styleOff, styleOff, styleOff
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'hidePickleComponents'),
+                              [Output('upload-pickle-data', 'style'),
+                               Output('output-pickle-data-upload', 'style'),
+                               Output('pickle-label', 'style'),
+                               Output('many-pm2-upload', 'style'),
+                               Output('output-pm2-data-upload', 'style'),
+                               Output('pm2-label', 'style'),
+                               Output('parameter-checklist', 'style'),
+                               Output('csv-output','style'),
+                               Output('save-csv-file','style'),
+                               Output('pickle-output', 'style'),
+                               Output('save-pickle-file', 'style'),
+                               Output('save-file-text','style'),
+                               Output('save-file-input','style'),
+                               Output('csv-output2', 'style'),
+                               Output('save-csv-file2', 'style'),
+                               Output('pickle-output2', 'style'),
+                               Output('save-pickle-file2', 'style'),
+                               Output('save-file-text2','style'),
+                               Output('save-file-input2','style')],
+                              [Input('radio-buttons', 'value')])
 
 
 # uploads .pm2 files and makes dataframe out of them
-@app.callback([Output('output-pm2-data-upload', 'children'),
-               Output('df-pm2-storage', 'children')],
-              [Input('many-pm2-upload', 'filename')],
-              [State('many-pm2-upload', 'contents')])
-def update_output(list_filenames, list_contents):
-    if list_filenames is not None:
+@callbacks.callback([Output('output-pm2-data-upload', 'children'),
+                     Output('df-pm2-storage', 'children')],
+                    [Input('many-pm2-upload', 'filename')],
+                    [State('many-pm2-upload', 'contents'),
+                     State('parameter-checklist', 'value')])
+def update_output(list_filenames, list_contents, parameters):
+    if list_filenames is not None and parameters:
         result_df = pd.DataFrame()  # empty
+        imputed_df = pd.DataFrame()  # which values were interpolated
         # loop through each file
         for filename, contents in zip(list_filenames, list_contents):
-            df = make_df_pm2(filename, contents)
+            df, imputed = make_df_pm2(filename, contents, parameters)
             # store values in overall storage dataframe, result_df
-            result_df['Temp_{}'.format(filename)] = df['Temp_{}'.format(filename)]
-            result_df['RH_{}'.format(filename)] = df['RH_{}'.format(filename)]
-        # drop NaN values (will drop any row with NaN values
+            for column in df.columns:
+                result_df[column] = df[column]
+                imputed_df[column] = imputed[column]
+        # drop NaN values (will drop any row with NaN values, including gaps too long to interpolate)
         result_df.dropna(inplace=True)
-        ret = 'Files have been uploaded.'
+        ret = 'Files have been uploaded. ' + imputed_message([(imputed_df, result_df.index)])
         div = html.Div([html.H6(children=ret,style= {'color': '#4dbfff'})])
-        return div, result_df.to_json(date_format='iso', orient='split')
+        return div, store_value(result_df)
 
 
 # uploads .pickle or .csv file of already made dataframe
-@app.callback([Output('output-pickle-data-upload', 'children'),
-               Output('df-storage', 'children')],
-              [Input('upload-pickle-data', 'filename')],
-              [State('upload-pickle-data', 'contents')])
+@callbacks.callback([Output('output-pickle-data-upload', 'children'),
+                     Output('df-storage', 'children')],
+                    [Input('upload-pickle-data', 'filename')],
+                    [State('upload-pickle-data', 'contents')])
 def update_output(filename, contents):
     if contents is not None:
         # print out name of file selected on interface
         children = 'You selected the following file: ', filename
-        # build dataframe to store in a hidden div in json form so that all callbacks can reference it
+        # build dataframe to store on the server; the hidden div holds its key so that all callbacks can reference it
         new_df = parse_contents(contents, filename)
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
-        return div, new_df.to_json(date_format='iso', orient='split')
+        return div, store_value(new_df)
 
 
 # save pickle as csv
-@app.callback(Output('csv-output2', 'children'),
-              [Input('save-csv-file2', 'n_clicks')],
-              [State('save-file-input', 'value'),
-               State('df-storage', 'children')])
+@callbacks.callback(Output('csv-output2', 'children'),
+                    [Input('save-csv-file2', 'n_clicks')],
+                    [State('save-file-input', 'value'),
+                     State('df-storage', 'children')])
 def save_files(n_clicks, value, df):
     if n_clicks is None:
         raise PreventUpdate
     else:
         path = value + '.csv'  # add .pickle to name
-        dff = pd.read_json(df, orient='split')
+        dff = stored_value(df)
         dff.to_csv(path)  # make into pickle file
         children = 'File has been saved at the following location: ' + path
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
@@ -360,16 +344,16 @@ def save_files(n_clicks, value, df):
 
 
 # save csv as pickle
-@app.callback(Output('pickle-output2', 'children'),
-              [Input('save-pickle-file2', 'n_clicks')],
-              [State('save-file-input', 'value'),
-               State('df-storage', 'children')])
+@callbacks.callback(Output('pickle-output2', 'children'),
+                    [Input('save-pickle-file2', 'n_clicks')],
+                    [State('save-file-input', 'value'),
+                     State('df-storage', 'children')])
 def save_files(n_clicks, value, df):
     if n_clicks is None:
         raise PreventUpdate
     else:
         path = value + '.pickle'  # add .pickle to name
-        dff = pd.read_json(df, orient='split')
+        dff = stored_value(df)
         dff.to_pickle(path)  # make into pickle file
         children = 'File has been saved at the following location: ' + path
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
@@ -377,16 +361,16 @@ def save_files(n_clicks, value, df):
 
 
 # save .pm2 dataframe as csv
-@app.callback(Output('csv-output', 'children'),
-              [Input('save-csv-file', 'n_clicks')],
-              [State('save-file-input', 'value'),
-               State('df-pm2-storage', 'children')])
+@callbacks.callback(Output('csv-output', 'children'),
+                    [Input('save-csv-file', 'n_clicks')],
+                    [State('save-file-input', 'value'),
+                     State('df-pm2-storage', 'children')])
 def save_files(n_clicks, value, df):
     if n_clicks is None:
         raise PreventUpdate
     else:
         path = value + '.csv'  # add .pickle to name
-        dff = pd.read_json(df, orient='split')
+        dff = stored_value(df)
         dff.to_csv(path)  # make into pickle file
         children = 'File has been saved at the following location: ' + path
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
@@ -394,16 +378,16 @@ def save_files(n_clicks, value, df):
 
 
 # save .pm2 dataframe as pickle
-@app.callback(Output('pickle-output', 'children'),
-              [Input('save-pickle-file', 'n_clicks')],
-              [State('save-file-input', 'value'),
-               State('df-pm2-storage', 'children')])
+@callbacks.callback(Output('pickle-output', 'children'),
+                    [Input('save-pickle-file', 'n_clicks')],
+                    [State('save-file-input', 'value'),
+                     State('df-pm2-storage', 'children')])
 def save_files(n_clicks, value, df):
     if n_clicks is None:
         raise PreventUpdate
     else:
         path = value + '.pickle'  # add .pickle to name
-        dff = pd.read_json(df, orient='split')
+        dff = stored_value(df)
         dff.to_pickle(path)  # make into pickle file
         children = 'File has been saved at the following location: ' + path
         div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
@@ -411,18 +395,21 @@ def save_files(n_clicks, value, df):
 
 
 # bartlett test
-@app.callback([Output('Bartlett-output-p', 'children'),
-               Output('Bartlett-descrip','children')],
-              [Input('bartlett-button', 'n_clicks')],
-              [State('df-storage', 'children'),
-               State('df-pm2-storage', 'children'),
-               State('radio-buttons', 'value')])
+@callbacks.callback([Output('Bartlett-output-p', 'children'),
+                     Output('Bartlett-descrip','children')],
+                    [Input('bartlett-button', 'n_clicks')],
+                    [State('df-storage', 'children'),
+                     State('df-pm2-storage', 'children'),
+                     State('radio-buttons', 'value')])
 def barlett_analysis(n_clicks, df1, df2, value):  # ,filename):
     if n_clicks is None:
         raise PreventUpdate
     else:
+        # factor_analyzer imports scikit-learn and scipy, which takes about a second, so it is imported by the callbacks
+        # that use it rather than when the interface starts
+        from factor_analyzer.factor_analyzer import calculate_bartlett_sphericity
         if value == 'yes-pickle':
-            dff = pd.read_json(df1, orient='split')
+            dff = stored_value(df1)
             chi_square_value, p_value = calculate_bartlett_sphericity(
                 dff)  # so this needs to be a df created from the input files
             if p_value <= 0.05:
@@ -435,7 +422,7 @@ def barlett_analysis(n_clicks, df1, df2, value):  # ,filename):
                 div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
                 return p_value, div
         elif value == 'no-pickle':
-            dff = pd.read_json(df2, orient='split')
+            dff = stored_value(df2)
             chi_square_value, p_value = calculate_bartlett_sphericity(
                 dff)  # so this needs to be a df created from the input files
             if p_value <= 0.05:
@@ -450,18 +437,19 @@ def barlett_analysis(n_clicks, df1, df2, value):  # ,filename):
 
 
 # kmo test
-@app.callback([Output('kmo-output', 'children'),
-               Output('kmo-descrip','children')],
-              [Input('kmo-button', 'n_clicks')],
-              [State('df-storage', 'children'),
-               State('df-pm2-storage', 'children'),
-               State('radio-buttons', 'value')])
+@callbacks.callback([Output('kmo-output', 'children'),
+                     Output('kmo-descrip','children')],
+                    [Input('kmo-button', 'n_clicks')],
+                    [State('df-storage', 'children'),
+                     State('df-pm2-storage', 'children'),
+                     State('radio-buttons', 'value')])
 def kmo_anlaysis(n_clicks, df1, df2, value):
     if n_clicks is None:
         raise PreventUpdate
     else:
+        from factor_analyzer.factor_analyzer import calculate_kmo
         if value == 'yes-pickle':
-            dff = pd.read_json(df1, orient='split')
+            dff = stored_value(df1)
             kmo_per_item, kmo_total = calculate_kmo(dff)
             if kmo_total >= 0.6:
                 children = 'KMO-value is greater than 0.6. Factor analysis may proceed.'
@@ -473,7 +461,7 @@ def kmo_anlaysis(n_clicks, df1, df2, value):
                 div = html.Div([html.H6(children=children, style={'color': '#4dbfff'})])
                 return kmo_total, div
         elif value == 'no-pickle':
-            dff = pd.read_json(df2, orient='split')
+            dff = stored_value(df2)
             kmo_per_item, kmo_total = calculate_kmo(dff)
             if kmo_total >= 0.6:
                 children = 'KMO-value is greater than 0.6. Factor analysis may proceed.'
@@ -487,20 +475,21 @@ def kmo_anlaysis(n_clicks, df1, df2, value):
 
 
 # eigenvalues & scree plot
-@app.callback([#Output('eigen-output', 'value'),
-               Output('eigen-output2', 'children'),
-               Output('scree-plot', 'figure'),
-               Output('numFactors', 'options')],
-              [Input('eigen-button', 'n_clicks')],
-              [State('df-storage', 'children'),
-               State('df-pm2-storage', 'children'),
-               State('radio-buttons', 'value')])
+@callbacks.callback([#Output('eigen-output', 'value'),
+                     Output('eigen-output2', 'children'),
+                     Output('scree-plot', 'figure'),
+                     Output('numFactors', 'options')],
+                    [Input('eigen-button', 'n_clicks')],
+                    [State('df-storage', 'children'),
+                     State('df-pm2-storage', 'children'),
+                     State('radio-buttons', 'value')])
 def eigens(n_clicks, df1, df2, value):
     if n_clicks is None:
         raise PreventUpdate
     else:
+        from factor_analyzer import FactorAnalyzer
         if value == 'yes-pickle':
-            dff = pd.read_json(df1, orient='split')
+            dff = stored_value(df1)
             # get eigenvalues
             fa = FactorAnalyzer()
             fa.fit(dff)
@@ -525,7 +514,7 @@ def eigens(n_clicks, df1, df2, value):
             return count, fig, options
 
         elif value == 'no-pickle':
-            dff = pd.read_json(df2, orient='split')
+            dff = stored_value(df2)
             # get eigenvalues
             fa = FactorAnalyzer()
             fa.fit(dff)
@@ -549,32 +538,31 @@ def eigens(n_clicks, df1, df2, value):
             return count, fig, options
 
 
-@app.callback([Output('FA-results', 'value'),
-               Output('FA-results-storage', 'children'),
-               Output('var-results','value'),
-               Output('total-var','value')],
-              [Input('FA-button', 'n_clicks')],
-              [State('numFactors', 'value'),
-               State('df-storage', 'children'),
-               State('df-pm2-storage', 'children'),
-               State('radio-buttons', 'value')])
-def run_factorAnalysis(n_clicks, numFactors, df1, df2, value):
-    if n_clicks is None:
-        raise PreventUpdate
+# factor analysis results: the factors and their parameters, the loadings for the bar graph and floorplan, the
+# proportional variance of each factor and the total variance explained. Run as a job
+@stage('analyse')
+def factor_analysis(numFactors, df1, df2, value, progress=no_progress):
+    from factor_analyzer import FactorAnalyzer
     if numFactors == 0:
-        return "Number of factors is zero. Enter a number greater than 0 to perform factor analysis."
+        return ("Number of factors is zero. Enter a number greater than 0 to perform factor analysis.", dash.no_update,
+                dash.no_update, dash.no_update)
     else:
         if value == 'yes-pickle':
-            dff = pd.read_json(df1, orient='split')
+            progress(0.1, 'Reading the data')
+            dff = stored_value(df1)
             if numFactors >= dff.shape[1]:
-                return "Number of factors entered is greater than or equal to number of variables used. "
+                return ("Number of factors entered is greater than or equal to number of variables used. ",
+                        dash.no_update, dash.no_update, dash.no_update)
             else:
+                progress(0.3, 'Fitting the factor model')
                 fa = FactorAnalyzer(numFactors, rotation="varimax")
                 fa.fit(dff)
+                progress(0.8, 'Reading the loadings')
                 L = np.array(fa.loadings_)
                 headings = list(dff.columns)
                 factor_threshold = 0.25
                 textual = tuple('')
+                variance = ''
                 Dict = {}
                 # variance, proportional variance, cumulative variance
                 var, propVar, totalVar = fa.get_factor_variance()  # var not used
@@ -591,12 +579,16 @@ def run_factorAnalysis(n_clicks, numFactors, df1, df2, value):
                 return textual, Dict, variance[2:], tVar
 
         elif value == 'no-pickle':
-            dff = pd.read_json(df2, orient='split')
+            progress(0.1, 'Reading the data')
+            dff = stored_value(df2)
             if numFactors >= dff.shape[1]:
-                return "Number of factors entered is greater than or equal to number of variables used. "
+                return ("Number of factors entered is greater than or equal to number of variables used. ",
+                        dash.no_update, dash.no_update, dash.no_update)
             else:
+                progress(0.3, 'Fitting the factor model')
                 fa = FactorAnalyzer(numFactors, rotation="varimax")
                 fa.fit(dff)
+                progress(0.8, 'Reading the loadings')
                 L = np.array(fa.loadings_)
                 headings = list(dff.columns)
                 factor_threshold = 0.25
@@ -617,29 +609,51 @@ def run_factorAnalysis(n_clicks, numFactors, df1, df2, value):
                     tVar = totalVar[i]
                 return textual, Dict, variance[2:], tVar
 
-# floorplan and bar graph options; let user choose which factor to visualize
-@app.callback([Output('bar-radios', 'options'),
-               Output('floorplan-radios','options')],
-              [Input('FA-button', 'n_clicks')],
-              [State('numFactors', 'value')])
-def update_radios(n_clicks, value):
+# run factor analysis as a background job; the interval polls its progress and shows the results once it is done
+@callbacks.callback([Output('FA-results', 'value'),
+                     Output('FA-results-storage', 'children'),
+                     Output('var-results','value'),
+                     Output('total-var','value'),
+                     Output('FA-job-id', 'children'),
+                     Output('FA-job-interval', 'disabled'),
+                     Output('FA-job-progress', 'children')],
+                    [Input('FA-button', 'n_clicks'),
+                     Input('FA-job-interval', 'n_intervals'),
+                     Input('FA-cancel-button', 'n_clicks')],
+                    [State('numFactors', 'value'),
+                     State('df-storage', 'children'),
+                     State('df-pm2-storage', 'children'),
+                     State('radio-buttons', 'value'),
+                     State('FA-job-id', 'children')])
+def run_factorAnalysis(n_clicks, n_intervals, cancelClicks, numFactors, df1, df2, value, jobId):
+    trigger = dash.callback_context.triggered[0]['prop_id']
     if n_clicks is None:
         raise PreventUpdate
-    else:
-        options = []
-        for i in range(value):
-            Dict = {}
-            Dict['value'] = i + 1
-            Dict['label'] = 'Factor ' + str(i + 1)
-            options.append(Dict)
-        return options, options
+    elif trigger == 'FA-job-interval.n_intervals':
+        outputs = job_outputs(jobId, 4)
+        return outputs[:4] + [dash.no_update] + outputs[4:]
+    elif trigger == 'FA-cancel-button.n_clicks':
+        if jobId is None:
+            raise PreventUpdate
+        cancel_job(jobId)
+        return [dash.no_update] * 5 + job_outputs(jobId, 0)
+    jobId = submit_job(factor_analysis, numFactors, df1, df2, value)
+    # polled until the job is done, even if it is done already
+    return [dash.no_update] * 4 + [jobId, False, job_outputs(jobId, 0)[1]]
+
+# floorplan and bar graph options; let user choose which factor to visualize
+callbacks.clientside_callback(ClientsideFunction('winterthur', 'factorOptions'),
+                              [Output('bar-radios', 'options'),
+                               Output('floorplan-radios','options')],
+                              [Input('FA-button', 'n_clicks')],
+                              [State('numFactors', 'value')])
 
 
 # bar graph
-@app.callback(Output('bar-graph', 'figure'),
-              [Input('bar-graph-button', 'n_clicks')],
-              [State('FA-results-storage', 'children'),
-               State('bar-radios', 'value')])
+@callbacks.callback(Output('bar-graph', 'figure'),
+                    [Input('bar-graph-button', 'n_clicks')],
+                    [State('FA-results-storage', 'children'),
+                     State('bar-radios', 'value')])
 def bar_graph(n_clicks, results, value):
     if n_clicks is None:
         raise PreventUpdate
@@ -672,11 +686,11 @@ def bar_graph(n_clicks, results, value):
 # filters data based on the radio button picked, either temp or rh correlation comparison
 # colors are based on the number given as a value of the key in the data dictionary
 # i.e. 'room 2': 0.8 --> 0.8 is helps determine the color
-@app.callback([Output('dash-floorplan','data'),
-               Output('room-name-result','children')],
-              [Input('room-names-button','n_clicks')],
-              [State('FA-results-storage', 'children'),
-               State('floorplan-radios', 'value')]) #factors
+@callbacks.callback([Output('dash-floorplan','data'),
+                     Output('room-name-result','children')],
+                    [Input('room-names-button','n_clicks')],
+                    [State('FA-results-storage', 'children'),
+                     State('floorplan-radios', 'value')]) #factors
 def send_data_to_floorplan(n_clicks, results, value):
     if n_clicks is None:
         raise PreventUpdate
@@ -693,14 +707,14 @@ def send_data_to_floorplan(n_clicks, results, value):
 
 
 # upload polygons from prior session; upload floorplan image
-@app.callback([Output('upload-shapes-output', 'children'),
-                   Output('dash-floorplan', 'shapes'),
-                   Output('dash-floorplan', 'image'),
-                   Output('dash-floorplan', 'update')],
-                  [Input('shapes-upload', 'n_clicks'),
-                   Input('floorplan-upload-button', 'n_clicks')],
-                  [State('shapes-path', 'value'),
-                   State('floorplan-image-input', 'value')])
+@callbacks.callback([Output('upload-shapes-output', 'children'),
+                         Output('dash-floorplan', 'shapes'),
+                         Output('dash-floorplan', 'image'),
+                         Output('dash-floorplan', 'update')],
+                        [Input('shapes-upload', 'n_clicks'),
+                         Input('floorplan-upload-button', 'n_clicks')],
+                        [State('shapes-path', 'value'),
+                         State('floorplan-image-input', 'value')])
 def save_shapes(n_clicks, n_clicks2, path, value):  # filename, contents):
     # figure out which button was clicked
     ctx = dash.callback_context
@@ -729,10 +743,10 @@ def save_shapes(n_clicks, n_clicks2, path, value):  # filename, contents):
 
 
 # save polygons to use again later
-@app.callback(Output('save-points-output','children'),
-              [Input('save-points','n_clicks')],
-              [State('save-points-input','value'),
-               State('dash-floorplan','shapes')])
+@callbacks.callback(Output('save-points-output','children'),
+                    [Input('save-points','n_clicks')],
+                    [State('save-points-input','value'),
+                     State('dash-floorplan','shapes')])
 def save_points(n_clicks, value, shapes):
     if n_clicks is None:
         raise PreventUpdate
@@ -744,5 +758,10 @@ def save_points(n_clicks, value, shapes):
 
 
 # ______________________________________________________________________________________________________________________
+# Dash app of this interface, mounted on server (a Flask server, or True for a server of its own) under the URL path
+# prefix; see wsgi.py for serving every interface together
+def create_app(server=True, prefix='/'):
+    return make_app(__name__, layout, callbacks, server, prefix)
+
 if __name__ == '__main__':
-    app.run_server(debug = 'True') # runs app
+    create_app().run_server(debug = 'True') # runs app
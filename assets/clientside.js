@@ -0,0 +1,102 @@
+// clientside callbacks of the interfaces: callbacks that only show or hide components or fill in suggested values run
+// in the browser, so they answer at once and do not queue on the server behind the analyses
+// they are registered with callbacks.clientside_callback(ClientsideFunction('winterthur', <name>), ...) in the
+// interfaces; settings is the JSON of the hidden 'ui-settings' div (suggested bounds and swing and the risk analyses)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    winterthur: {
+        // show/hide bound input boxes based on type of analysis being performed (input_min, input_max,
+        // excursion-settings, setpoint-settings and swing-settings)
+        showBoundsInputs: function(analysis, settings) {
+            var styleOff = {'display': 'none'};
+            if (analysis === 'SwingAnalysis') {
+                return [styleOff, null, styleOff, styleOff, null];
+            } else if (JSON.parse(settings).riskAnalyses.indexOf(analysis) >= 0) { // no bounds
+                return [styleOff, styleOff, styleOff, styleOff, styleOff];
+            }
+            return [null, null, null, null, styleOff];
+        },
+
+        // show the set-point table for monthly and ramped bounds and the band half-width for floating bounds
+        showSetpointInputs: function(mode) {
+            var styleOn = {'display': 'block'};
+            var styleOff = {'display': 'none'};
+            if (mode === 'monthly' || mode === 'ramped') {
+                return [styleOn, styleOff];
+            } else if (mode === 'floating') {
+                return [styleOff, styleOn];
+            }
+            return [styleOff, styleOff];
+        },
+
+        // fill the set-point table with the bounds above, to be edited month by month
+        updateSetpointTable: function(inputMin, inputMax, table) {
+            return table.map(function(row) {
+                return {'Month': row.Month, 'Minimum': inputMin, 'Maximum': inputMax};
+            });
+        },
+
+        // change suggested bound values depending on parameter and type of analysis
+        suggestBounds: function(analysis, parameter, settings) {
+            settings = JSON.parse(settings);
+            if (analysis === 'SwingAnalysis') {
+                return [0, settings.swing];
+            } else if (settings.riskAnalyses.indexOf(analysis) >= 0) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            return settings.bounds[parameter];
+        },
+
+        // suggested bound values and the explanation of the analysis (bounds, swing or risk explanation)
+        suggestBoundsAndExplanation: function(analysis, parameter, settings) {
+            var style1 = {'display': 'none'};
+            var style2 = {'display': 'block'};
+            var values = window.dash_clientside.winterthur.suggestBounds(analysis, parameter, settings);
+            if (analysis === 'SwingAnalysis') {
+                return values.concat([style1, style2, style1]);
+            } else if (JSON.parse(settings).riskAnalyses.indexOf(analysis) >= 0) {
+                return values.concat([style1, style1, style2]);
+            }
+            return values.concat([style2, style1, style1]);
+        },
+
+        // change the text based on the analysis selected (bounds-text and swing-text)
+        changeText: function(analysis, settings) {
+            var styleOn = {'display': 'inline-block'};
+            var styleOff = {'display': 'none'};
+            if (analysis === 'SwingAnalysis') {
+                return [styleOff, styleOn];
+            } else if (JSON.parse(settings).riskAnalyses.indexOf(analysis) >= 0) {
+                return [styleOff, styleOff];
+            }
+            return [styleOn, styleOff];
+        },
+
+        // pickle or no pickle radio; hides upload .pm2 files if have .pickle file from prior session. The first three
+        // outputs are the pickle upload, the next ten the .pm2 upload and save options and the last six the save
+        // options of a .pickle file
+        hidePickleComponents: function(value) {
+            var styleOn = {'display': 'inline-block'};
+            var styleOff = {'display': 'none'};
+            var pickle = value === 'yes-pickle';
+            var pm2 = value === 'no-pickle';
+            if (!pickle && !pm2) {
+                return Array(19).fill(window.dash_clientside.no_update);
+            }
+            return Array(3).fill(pickle ? styleOn : styleOff)
+                .concat(Array(10).fill(pm2 ? styleOn : styleOff))
+                .concat(Array(6).fill(pickle ? styleOn : styleOff));
+        },
+
+        // floorplan and bar graph options; let user choose which factor to visualize
+        factorOptions: function(n_clicks, numFactors) {
+            if (n_clicks === null || n_clicks === undefined) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var options = [];
+            for (var i = 1; i <= numFactors; i++) {
+                options.push({'value': i, 'label': 'Factor ' + i});
+            }
+            return [options, options];
+        }
+    }
+});
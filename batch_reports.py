@@ -0,0 +1,215 @@
+# bounds and swing reports of every .pm2 file in a folder (and its subfolders), without the interfaces
+# every parameter of every file is analyzed the same way as the batch mode of the multi-file interface, in parallel
+# processes, and three tables are written to the output folder (in each format asked for):
+#   results      one row per room and parameter: bounds, extremes, percentages out of bounds, excursion summary and
+#                the largest swings
+#   contours     one row per room, parameter, year and month: the data of the contour plots of the one-file interface
+#   excursions   every excursion out of bounds
+# the results of each file are cached in the output folder under a hash of its contents and the settings, so a rerun
+# only analyzes the files that are new or have changed
+# example:
+#   python batch_reports.py "E:\pm2 exports" reports --bounds RH=35,57 --format csv html
+# import needed packages
+import os
+import json
+import pickle
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from winterthur_data import PARAMETER_COLUMNS, read_pm2_bytes
+from winterthur_dataset import SensorDataset
+from winterthur_swing import SWING_OPTIONS, rolling_swings, calendar_swings, monthly_percent_over
+from winterthur_excursions import EXCURSION_COLUMNS, MIN_EXCURSION_MINUTES, EXCURSION_HYSTERESIS
+from winterthur_batch import SUGGESTED_BOUNDS, SUGGESTED_SWING, batch_results
+
+# pyarrow is only needed to write Parquet files
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# date range used when none is given
+FIRST_DATE = '1900-01-01'
+LAST_DATE = '2100-01-01'
+# output tables and the folder of cached results in the output folder
+OUTPUT_TABLES = ['results', 'contours', 'excursions']
+CACHE_FOLDER = '.cache'
+CONTOUR_COLUMNS = ['Room Name', 'Parameter', 'Year', 'Month', 'Percent Under Lower Bound (%)',
+                   'Percent Over Upper Bound (%)', 'Percent with Swing Greater than Desired Swing (%)']
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# .pm2 files in a folder and its subfolders, as (room name, path); the room name is the path relative to the folder
+def find_pm2_files(folder):
+    files = []
+    for directory, subdirectories, names in os.walk(folder):
+        subdirectories.sort()
+        for name in sorted(names):
+            if name.lower().endswith('.pm2'):
+                path = os.path.join(directory, name)
+                files.append((os.path.relpath(path, folder).replace(os.sep, '/'), path))
+    return files
+
+# key of the cached results of a file: a hash of its contents and of the settings
+def file_cache_key(path, settings):
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# results, contour grids and excursions of one file (run in a worker process)
+def analyze_file(room, path, settings):
+    with open(path, 'rb') as f:
+        dataset = SensorDataset.from_frame(read_pm2_bytes(f.read()))
+    dataset = dataset.select(settings['start'], settings['end'], settings['months'])
+    bounds = {parameter: tuple(value) for parameter, value in settings['bounds'].items()}
+    table, excursions = batch_results(room, dataset, bounds, settings['swings'], settings['minDuration'] * 60,
+                                      settings['hysteresis'])
+    table = table.reset_index()
+    table.insert(0, 'Room Name', room)
+    excursions = excursions.round({'Duration (hours)': 2, 'Peak Deviation': 2, 'Degree-Hours': 2})
+    return table, contour_grids(room, dataset, table, settings['swingMode']), excursions
+
+# percentage of readings under and over the bounds, and of readings (or periods) with too much swing, in each month
+# of each year for every parameter of a room; table is the results table of the room
+def contour_grids(room, dataset, table, swingMode):
+    parameters = list(table['Parameter'])
+    columns = [PARAMETER_COLUMNS[parameter] for parameter in parameters]
+    values = np.vstack([dataset[column] for column in columns] + [np.zeros((0, len(dataset)), dtype=np.float32)])
+    monthKey = dataset.calendar('year').astype(np.int64) * 12 + dataset.calendar('month') - 1
+    keys, owner = np.unique(monthKey, return_inverse=True)
+    totals = np.bincount(owner, minlength=len(keys))
+    if swingMode in [None, 'rolling']:
+        swings = rolling_swings(values)
+    else:
+        periodStarts, swings = calendar_swings(dataset, columns, swingMode)
+    grids = []
+    for row, parameter in enumerate(parameters):
+        lower, upper, permitted = table.loc[row, ['Lower Bound', 'Upper Bound', 'Permitted Swing']]
+        with np.errstate(invalid='ignore'):
+            grid = pd.DataFrame({'Year': keys // 12, 'Month': keys % 12 + 1,
+                                 'Percent Under Lower Bound (%)':
+                                     np.bincount(owner, values[row] <= lower, minlength=len(keys)) / totals * 100,
+                                 'Percent Over Upper Bound (%)':
+                                     np.bincount(owner, values[row] >= upper, minlength=len(keys)) / totals * 100})
+            if swingMode in [None, 'rolling']:
+                grid['Percent with Swing Greater than Desired Swing (%)'] = \
+                    np.bincount(owner, swings[row] >= permitted, minlength=len(keys)) / totals * 100
+            else:
+                # percentage of the local hours, days or weeks starting in each month
+                percentOver = monthly_percent_over(periodStarts, swings[row], permitted).stack()
+                percentOver = percentOver.rename('Percent with Swing Greater than Desired Swing (%)')
+                percentOver.index.names = ['Month', 'Year']
+                grid = grid.merge(percentOver.reset_index(), on=['Year', 'Month'], how='left')
+        grid.insert(0, 'Parameter', parameter)
+        grid.insert(0, 'Room Name', room)
+        grids.append(grid)
+    return pd.concat(grids, ignore_index=True)[CONTOUR_COLUMNS].round(2)
+
+# results of every file, from the cache or computed in a pool of worker processes
+# returns the results of each file (in the order of files) and the number of files analyzed
+def run_reports(files, settings, cacheFolder, workers=None, force=False):
+    os.makedirs(cacheFolder, exist_ok=True)
+    results = {}
+    pending = []
+    for room, path in files:
+        cachePath = os.path.join(cacheFolder, file_cache_key(path, settings) + '.pickle')
+        if not force and os.path.exists(cachePath):
+            with open(cachePath, 'rb') as f:
+                results[room] = pickle.load(f)
+        else:
+            pending.append((room, path, cachePath))
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(room, cachePath, pool.submit(analyze_file, room, path, settings))
+                       for room, path, cachePath in pending]
+            for room, cachePath, future in futures:
+                results[room] = future.result()
+                with open(cachePath + '.writing', 'wb') as f:
+                    pickle.dump(results[room], f)
+                os.replace(cachePath + '.writing', cachePath)
+    return [results[room] for room, path in files], len(pending)
+
+# write the results, contours and excursions tables of the results of every file (from run_reports) to the output
+# folder in each format
+def write_reports(results, output, formats):
+    tables = [pd.concat([result[k] for result in results], ignore_index=True) for k in range(3)]
+    tables[2] = tables[2][['Parameter'] + EXCURSION_COLUMNS]
+    for name, frame in zip(OUTPUT_TABLES, tables):
+        write_table(frame, os.path.join(output, name), formats)
+
+# write a table in each format; Parquet needs pyarrow
+def write_table(frame, path, formats):
+    for fileFormat in formats:
+        if fileFormat == 'csv':
+            frame.to_csv(path + '.csv', index=False)
+        elif fileFormat == 'parquet':
+            frame.to_parquet(path + '.parquet', index=False)
+        else:
+            frame.to_html(path + '.html', index=False, na_rep='')
+
+# bounds (PARAMETER=MIN,MAX) or swings (PARAMETER=VALUE) given on the command line, over the suggested values
+def parse_settings(parser, items, defaults, numValues):
+    values = dict(defaults)
+    for item in items or []:
+        parameter, _, numbers = item.partition('=')
+        try:
+            numbers = [float(number) for number in numbers.split(',')]
+        except ValueError:
+            numbers = []
+        if parameter not in PARAMETER_COLUMNS or len(numbers) != numValues:
+            parser.error('cannot read "{}"; parameters are {}'.format(item, ', '.join(PARAMETER_COLUMNS)))
+        values[parameter] = numbers if numValues > 1 else numbers[0]
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description='Write bounds and swing reports of every .pm2 file in a folder and '
+                                                 'its subfolders.')
+    parser.add_argument('input', help='folder of .pm2 files')
+    parser.add_argument('output', help='folder to write the reports to')
+    parser.add_argument('--start', default=FIRST_DATE, help='analyze readings after this date (default: all)')
+    parser.add_argument('--end', default=LAST_DATE, help='analyze readings up to this date (default: all)')
+    parser.add_argument('--months', type=int, nargs='+', default=[], help='months to analyze, 1 to 12 '
+                                                                          '(default: all)')
+    parser.add_argument('--bounds', action='append', metavar='PARAMETER=MIN,MAX',
+                        help='bounds of a parameter, e.g. RH=35,57; can be repeated (default: the suggested bounds '
+                             'of the interfaces)')
+    parser.add_argument('--swing', action='append', metavar='PARAMETER=VALUE',
+                        help='maximum permitted swing of a parameter, e.g. RH=10; can be repeated (default: '
+                             '{})'.format(SUGGESTED_SWING))
+    parser.add_argument('--swing-mode', default='rolling', choices=[option['value'] for option in SWING_OPTIONS],
+                        help='swing of the contour grids (default: %(default)s)')
+    parser.add_argument('--min-duration', type=float, default=MIN_EXCURSION_MINUTES,
+                        help='shortest excursion out of bounds counted, in minutes (default: %(default)s)')
+    parser.add_argument('--hysteresis', type=float, default=EXCURSION_HYSTERESIS,
+                        help='how far back inside the bounds a parameter must be to end an excursion '
+                             '(default: %(default)s)')
+    parser.add_argument('--format', nargs='+', default=['csv'], choices=['csv', 'parquet', 'html'],
+                        help='output formats (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='analyze every file again, even if unchanged')
+    args = parser.parse_args()
+
+    if 'parquet' in args.format and pyarrow is None:
+        parser.error('writing Parquet files needs pyarrow (pip install pyarrow)')
+    settings = {'start': args.start, 'end': args.end, 'months': sorted(args.months),
+                'bounds': parse_settings(parser, args.bounds, SUGGESTED_BOUNDS, 2),
+                'swings': parse_settings(parser, args.swing, [(parameter, SUGGESTED_SWING)
+                                                              for parameter in PARAMETER_COLUMNS], 1),
+                'swingMode': args.swing_mode, 'minDuration': args.min_duration, 'hysteresis': args.hysteresis}
+    files = find_pm2_files(args.input)
+    if not files:
+        parser.error('no .pm2 files found in {}'.format(args.input))
+
+    results, numAnalyzed = run_reports(files, settings, os.path.join(args.output, CACHE_FOLDER), args.workers,
+                                       args.force)
+    write_reports(results, args.output, args.format)
+    print('Analyzed {} of {} files ({} unchanged); reports written to {}'.format(
+        numAnalyzed, len(files), len(files) - numAnalyzed, args.output))
+
+
+if __name__ == '__main__':
+    main()
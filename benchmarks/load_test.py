@@ -0,0 +1,143 @@
+# load test of a running server: simulated users upload a synthetic .pm2 file to the one-file interface and then
+# repeatedly pick an analysis, run it and draw its time series, as the browser does. Picking the analysis and parameter
+# only shows and hides inputs and fills in suggested bounds; those callbacks run in the browser (assets/clientside.js)
+# and are timed only if the server still answers them. Prints the throughput and the response times, e.g. to compare
+# gunicorn settings (see gunicorn.conf.py):
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#   python benchmarks/load_test.py --url http://127.0.0.1:8050/one-file/ --users 8 --duration 60
+# only the standard library and numpy are needed, so it can run on any machine that can reach the server
+# import needed packages
+import json
+import time
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from synthetic_pm2 import synthetic_pm2
+
+# parameters and analyses the simulated users cycle through
+PARAMETERS = ['Temp', 'RH', 'DP', 'AH', 'HR', 'EMC']
+ANALYSES = ['BoundsAnalysis', 'SwingAnalysis']
+# inputs the user changes when picking an analysis, and the suggested bounds filled in from them
+UI_INPUTS = ['analysis-dropdown.value', 'parameter-dropdown.value', 'setpoint-mode.value', 'input_min.value',
+             'input_max.value']
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# callbacks of an interface (from its _dash-dependencies), by output
+def read_callbacks(url):
+    with urllib.request.urlopen(url + '_dash-dependencies') as response:
+        return {callback['output']: callback for callback in json.load(response)}
+
+# send a callback request as the browser does; values maps 'id.property' to the value of every input and state
+# returns the response and the time it took in seconds
+def call(url, callback, values, changed):
+    def props(items):
+        return [{'id': item['id'], 'property': item['property'],
+                 'value': values.get('{}.{}'.format(item['id'], item['property']))} for item in items]
+    outputs = [{'id': part.split('.')[0], 'property': part.split('.')[1]}
+               for part in callback['output'].strip('.').split('...')]
+    body = {'output': callback['output'], 'outputs': outputs if len(outputs) > 1 else outputs[0],
+            'inputs': props(callback['inputs']), 'state': props(callback['state']), 'changedPropIds': [changed]}
+    request = urllib.request.Request(url + '_dash-update-component', data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        result = json.load(response)
+    return result['response'], time.perf_counter() - start
+
+def find_callback(callbacks, output):
+    return [callback for name, callback in callbacks.items() if output in name][0]
+
+# upload a file as a room of the data store; returns the selection kept in the hidden div
+def upload(url, callbacks, room, contents):
+    values = {'upload-data.contents': contents, 'upload-data.filename': room, 'submit-data.n_clicks': 1,
+              'startDateYear.value': 2000, 'startDateMonth.value': 1, 'start-day-dropdown.value': 1,
+              'start-hour-dropdown.value': 0, 'start-minute-dropdown.value': 0, 'endDateYear.value': 2030,
+              'endDateMonth.value': 1, 'end-day-dropdown.value': 1, 'end-hour-dropdown.value': 0,
+              'end-minute-dropdown.value': 0, 'monthsToAnalyze.value': []}
+    response, seconds = call(url, find_callback(callbacks, 'df-storage.children'), values, 'submit-data.n_clicks')
+    return response['df-storage']['children'], seconds
+
+# callbacks of the UI inputs that are answered by the server rather than in the browser
+def ui_callbacks(callbacks):
+    return [callback for callback in callbacks.values() if not callback.get('clientside_function') and
+            any('{}.{}'.format(item['id'], item['property']) in UI_INPUTS for item in callback['inputs'])]
+
+# the requests the browser sends when the user picks an analysis; returns the time of each
+def ui_toggles(url, callbacks, values):
+    changed = {'{}.{}'.format(item['id'], item['property']) for callback in callbacks for item in callback['inputs']}
+    return [call(url, callback, values, [name for name in UI_INPUTS if name in changed][0])[1]
+            for callback in callbacks]
+
+# one analysis of a user: picking it, the analysis callback, then the time series callback it triggers; returns the
+# analysis, both times and the times of the UI requests
+def analysis(url, callbacks, selection, k, analyses=ANALYSES, uiCallbacks=()):
+    parameter = PARAMETERS[k % len(PARAMETERS)]
+    analysisName = analyses[k // len(PARAMETERS) % len(analyses)]
+    values = {'submit-button.n_clicks': k + 1, 'df-storage.children': selection,
+              'parameter-dropdown.value': parameter, 'analysis-dropdown.value': analysisName,
+              'input_min.value': 40 + k % 7, 'input_max.value': 60 + k % 5, 'min-duration.value': 60,
+              'hysteresis.value': 0, 'setpoint-mode.value': 'fixed', 'setpoint-table.data': None,
+              'float-band.value': None, 'swing-mode.value': 'rolling'}
+    toggleTimes = ui_toggles(url, uiCallbacks, values)
+    response, analysisSeconds = call(url, find_callback(callbacks, 'contour-min.figure'), values,
+                                     'submit-button.n_clicks')
+    values['graph-settings.children'] = response['graph-settings']['children']
+    response, graphSeconds = call(url, find_callback(callbacks, 'Mygraph.figure'), values,
+                                  'graph-settings.children')
+    return analysisName, analysisSeconds, graphSeconds, toggleTimes
+
+def percentiles(times):
+    return ', '.join('p{} {:.0f} ms'.format(p, 1000 * np.percentile(times, p)) for p in [50, 90, 99])
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the one-file interface of a running server.')
+    parser.add_argument('--url', default='http://127.0.0.1:8050/one-file/', help='URL of the one-file interface '
+                                                                                  '(default: %(default)s)')
+    parser.add_argument('--users', type=int, default=8, help='simulated users sending requests at the same time '
+                                                             '(default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run (default: %(default)s)')
+    parser.add_argument('--analyses', nargs='+', default=ANALYSES, choices=ANALYSES,
+                        help='analyses the users run (default: both)')
+    parser.add_argument('--years', type=float, default=1, help='years of 15-minute readings in the uploaded file '
+                                                               '(default: %(default)s)')
+    args = parser.parse_args()
+
+    callbacks = read_callbacks(args.url)
+    selection, seconds = upload(args.url, callbacks, 'load-test.pm2', synthetic_pm2(years=args.years))
+    print('Uploaded {} years of readings in {:.2f} s'.format(args.years, seconds))
+    uiCallbacks = ui_callbacks(callbacks)
+
+    # each user runs analyses one after the other until the time is up
+    def user(u):
+        times = []
+        k = u
+        end = time.perf_counter() + args.duration
+        while time.perf_counter() < end:
+            times.append(analysis(args.url, callbacks, selection, k, args.analyses, uiCallbacks))
+            k += args.users
+        return times
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        results = list(pool.map(user, range(args.users)))
+    elapsed = time.perf_counter() - start
+    times = [result for times in results for result in times]
+    toggleTimes = [t for name, a, g, toggles in times for t in toggles]
+    print('{} users, {} analyses in {:.1f} s: {:.2f} analyses/s ({:.2f} requests/s)'.format(
+        args.users, len(times), elapsed, len(times) / elapsed, (2 * len(times) + len(toggleTimes)) / elapsed))
+    for analysisName in ANALYSES:
+        analysisTimes = [a for name, a, g, toggles in times if name == analysisName]
+        if analysisTimes:
+            print('{:<15} {}'.format(analysisName, percentiles(analysisTimes)))
+    print('{:<15} {}'.format('time series', percentiles([g for name, a, g, toggles in times])))
+    if toggleTimes:
+        print('{:<15} {} ({} requests per analysis)'.format('UI toggles', percentiles(toggleTimes),
+                                                             len(uiCallbacks)))
+    else:
+        print('{:<15} run in the browser, no requests'.format('UI toggles'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+# parity of the analysis code with the thesis tools: the functions below the THESIS FUNCTIONS header are copied from
+# the original interfaces (the first commit of this repository), with the bounds and swing parts of the analysis
+# callback taken out into functions but otherwise unchanged, and are the reference results. Every
+# check runs them and each engine that replaces them (the current code, or a new faster one added to CHECKS) on the
+# same files, and fails if an engine's numbers differ by more than the tolerance. It also prints the time of each
+# engine relative to the thesis function:
+#   python benchmarks/parity.py                         # synthetic files (see synthetic_pm2.py)
+#   python benchmarks/parity.py --files path/to/pm2s    # and real files or folders of them
+# exits with an error if any check fails, so it can be run before merging a new engine
+# import needed packages
+import os
+import io
+import sys
+import time
+import base64
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIRECTORY)
+# uploads, cached results and jobs of the interfaces are kept out of the package folder
+for variable in ['WINTERTHUR_STORE', 'WINTERTHUR_CACHE', 'WINTERTHUR_JOBS']:
+    os.environ.setdefault(variable, tempfile.mkdtemp(prefix='winterthur-parity-'))
+from synthetic_pm2 import synthetic_pm2
+from winterthur_data import (TIME_COLUMN, TEMP_COLUMN, RH_COLUMN, DP_COLUMN, read_pm2, add_DP_column, dew_point,
+                             resampled_channels, build_pyramid, pyramid_count, pyramid_extremes, pyramid_frame)
+from winterthur_dataset import SensorDataset
+from winterthur_store import AGGREGATE_COLUMNS
+from winterthur_swing import rolling_swings
+from winterthur_batch import SUGGESTED_BOUNDS, SUGGESTED_SWING
+from batch_reports import find_pm2_files
+from Bounds_and_Swing_Analysis_For_One_File import contour_grid
+
+FIRST_DATE = pd.Timestamp('1900-01-01')
+LAST_DATE = pd.Timestamp('2100-01-01')
+ALL_MONTHS = list(range(1, 13)) # the thesis interfaces add the month column only when months are selected
+# parameters and bounds of the checks
+COLUMNS = [('Temp', TEMP_COLUMN), ('RH', RH_COLUMN)]
+SYNTHETIC_ROOMS = 3
+SYNTHETIC_YEARS = 1
+# largest differences allowed: float64 engines must agree to rounding error; engines reading the data store, which
+# keeps readings as float32, to float32 rounding of values that are given to one decimal
+FLOAT64_TOLERANCE = 1e-9
+FLOAT32_TOLERANCE = 1e-4
+# percentages of readings over a threshold may differ by a reading or two where a float32 value lands on the other
+# side of it: 0.01 is the last digit the interfaces show for a whole selection, 0.1 a reading in a month of readings
+PERCENT_TOLERANCE = 0.01
+MONTHLY_PERCENT_TOLERANCE = 0.1
+
+
+# THESIS FUNCTIONS______________________________________________________________________________________________________
+# parse_data of Bounds_and_Swing_Analysis_For_One_File.py
+def thesis_parse_data(contents, startDate, endDate, monthsArray):
+    content_type, content_string = contents.split(',')
+    decoded = base64.b64decode(content_string)
+    df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3]) # skiprows is based on Winterthur file format
+    df['DATE AND TIME GMT'] = pd.to_datetime(df['DATE AND TIME GMT']) # set date and time column as datetime type
+    # rename columns
+    df.columns = ['Date and Time in GMT', 'Temperature (Degrees Fahrenheit)', 'Relative Humidity (%)']
+
+    # select the entered date range, from startDate to endDate
+    maskRange = (df['Date and Time in GMT'] > startDate) & (df['Date and Time in GMT'] <= endDate)
+    df = df.loc[maskRange]
+
+    # if any specific months are selected, get rid of other months
+    if monthsArray != []:
+        df['month'] = df['Date and Time in GMT'].map(lambda x: x.strftime('%m'))  # pulls out month from data column
+        df['month'] = pd.to_numeric(df['month'])  # recast month column as ints, not objects
+        df = df[df['month'].isin(monthsArray)]
+
+    return df
+
+# add_DP_column of Bounds_and_Swing_Analysis_For_One_File.py
+def thesis_add_DP_column(df):
+    # convert F to C:
+    temp = ((df['Temperature (Degrees Fahrenheit)'] - 32) * (5 / 9))
+    RH = df['Relative Humidity (%)']
+    # because converted to C, convert back to F at end of eq
+    df['Dew Point'] =  ((((RH/100)**(1/8))*(112 + 0.9*temp)+0.1*temp - 112) * (9 / 5)) + 32
+    return df
+
+# swing_analysis of Bounds_and_Swing_Analysis_For_One_File.py
+def thesis_swing_analysis(df, swingInt,columnName): # columnName is a 'string'
+    numEntries = len(df[columnName]) # length of data frame for rh
+    pointsInDay = 24 * 60 / 15  # constant; number data points separated in 15 minute increments = 96 points
+    lastValue = int(numEntries - pointsInDay - 1)     # calculate last "day", last possible complete 24 hour period
+
+    # initialize blank rhSwing storage array
+    swingArray = np.zeros(numEntries)  # could also be a new column in dataframe
+
+    # for the number of possible 24-hour-long periods in the data set, loop; will be zero for end values
+    for k in range(0, lastValue):
+        jEnd = int(k + pointsInDay)
+        # find maximum and minimum value over a one day (24 hour) period
+        maxRH = max(df[columnName][k:jEnd])
+        minRH = min(df[columnName][k:jEnd])
+        # determine swing over 24 hour period and store in array
+        swingArray[k] = maxRH - minRH
+    df['swing'] = swingArray
+
+    # if swing is greater than permitted, note how many times it is
+    sum = 0
+    for i in range(0, numEntries):
+        if swingArray[i] >= swingInt:
+            sum = sum + 1
+    # sum = number of times RH Swing is out of bounds
+    return swingArray, sum, lastValue, df
+
+# bounds analysis and contour loops of update_graph_and_analysis in Bounds_and_Swing_Analysis_For_One_File.py;
+# returns the maximum and minimum, the percentages under and over the bounds and the contour plot grids
+def thesis_bounds_analysis(df, columnName, inputMin, inputMax):
+    # pull out year and month
+    df['year'] = pd.DatetimeIndex(df['Date and Time in GMT']).year
+    # make arrays of years and months (just unique values)
+    yearsArray = np.unique(df['year'])
+    monthsArray = np.unique(df['month'])
+    # create storage arrays
+    storageMin = np.zeros([len(monthsArray), len(yearsArray)])
+    storageMax = np.zeros([len(monthsArray), len(yearsArray)])
+    # determine max and min
+    maxValueB = round(max(df[columnName]),2)
+    minValueB = round(min(df[columnName]),2)
+    # determine how often the data goes out of bounds
+    # too low:
+    numLow = np.sum(df[columnName] <= inputMin)
+    numEntries = len(df[columnName])
+    percentLow = round((numLow / numEntries) * 100,2)
+    # too high:
+    numHigh = np.sum(df[columnName] >= inputMax)
+    numEntries = len(df[columnName])
+    percentHigh = round((numHigh / numEntries) * 100,2)
+    # contour plots; prepare data
+    for i in range(0, len(monthsArray)):
+        for j in range(0, len(yearsArray)):
+            # creates boolean array of percentage out of bounds
+            totalPoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]))
+            outOfRangePoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]) &
+                                      (df[columnName] <= inputMin))
+            outOfRangePoints2 = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]) &
+                                      (df[columnName] >= inputMax))
+            storageMin[i, j] = (outOfRangePoints / totalPoints) * 100
+            storageMax[i, j] = (outOfRangePoints2 / totalPoints) * 100
+    return [maxValueB, minValueB, percentLow, percentHigh], storageMin, storageMax
+
+# swing analysis and contour loop of update_graph_and_analysis in Bounds_and_Swing_Analysis_For_One_File.py;
+# returns the swing of every reading, the maximum swing and percentage over the permitted swing, and the contour grid
+def thesis_swing_contours(df, columnName, inputMax):
+    df['year'] = pd.DatetimeIndex(df['Date and Time in GMT']).year
+    yearsArray = np.unique(df['year'])
+    monthsArray = np.unique(df['month'])
+    storageMax = np.zeros([len(monthsArray), len(yearsArray)])
+    # perform analysis
+    swingArray, sum, lastValue, df = thesis_swing_analysis(df, inputMax, columnName)
+    # max swing
+    maxValueS = round(max(swingArray),2)
+    # determine percent of time out of bounds
+    numSwing = np.sum(swingArray >= inputMax)
+    numEntries = len(swingArray)
+    percentSwing = round(numSwing / numEntries * 100, 2)
+    # contour plot; prepare data
+    for i in range(0, len(monthsArray)):
+        for j in range(0, len(yearsArray)):
+            # creates boolean array of
+            totalPoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]))
+            outOfRangePoints = np.sum((df['year'] == yearsArray[j]) & (df['month'] == monthsArray[i]) &
+                                      (df['swing'] >= inputMax))
+            storageMax[i, j] = (outOfRangePoints / totalPoints) * 100
+    return swingArray, [maxValueS, percentSwing], storageMax
+
+# make_df_pm2 of Cross_Correlation.py
+def thesis_make_df_pm2(filename, contents):
+    content_type, content_string = contents.split(',')
+    decoded = base64.b64decode(content_string)
+    df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3])
+    df['DATE AND TIME GMT'] = pd.to_datetime(df['DATE AND TIME GMT'])  # set date and time column as datetime type
+    df.columns = ['Date and Time in GMT', 'Temperature (Degrees Fahrenheit)', 'Relative Humidity (%)']  # rename columns
+    df = df.set_index('Date and Time in GMT')
+    # resample data to fill in any gaps and to ensure same time interval
+    upsampledTemp = df['Temperature (Degrees Fahrenheit)'].resample('15min').mean()
+    interpolatedTemp = upsampledTemp.interpolate(method='linear')
+    upsampledRH = df['Relative Humidity (%)'].resample('15min').mean()
+    interpolatedRH = upsampledRH.interpolate(method='linear')
+    frame = {'Temp_{}'.format(filename): interpolatedTemp, 'RH_{}'.format(filename): interpolatedRH}
+    result = pd.DataFrame(frame)
+    return result
+
+# read_in_files and run_cross_corr of Cross_Correlation.py; returns the temperature and RH correlation matrices
+def thesis_cross_correlation(list_filenames, list_contents):
+    df_temp = pd.DataFrame()
+    df_RH = pd.DataFrame()
+    for filename, contents in zip(list_filenames, list_contents):
+        df = thesis_make_df_pm2(filename, contents)
+        df_temp['Temp_{}'.format(filename)] = df['Temp_{}'.format(filename)]
+        df_RH['RH_{}'.format(filename)] = df['RH_{}'.format(filename)]
+    # drop rows with NaN in them
+    df_temp.dropna(inplace=True)
+    df_RH.dropna(inplace=True)
+    return df_temp.corr(), df_RH.corr()
+
+
+# ENGINES_______________________________________________________________________________________________________________
+# the current code of the interfaces, on the same inputs and returning the same numbers as the thesis functions
+# dew point of the one-file interface, and of the float32 readings of the data store (as SensorDataset computes it)
+def dew_point_frame(room):
+    return add_DP_column(room['frame'].copy())[DP_COLUMN].to_numpy()
+
+def dew_point_dataset(room):
+    dataset = room['pyramid']['dataset']
+    return dew_point(dataset[TEMP_COLUMN], dataset[RH_COLUMN])
+
+# bounds analysis of the one-file interface, from the aggregate pyramid
+def bounds_pyramid(room, columnName, inputMin, inputMax):
+    pyramid = room['pyramid']
+    minValue, maxValue = pyramid_extremes(pyramid, columnName, FIRST_DATE, LAST_DATE, ALL_MONTHS)
+    totals = pyramid_count(pyramid, FIRST_DATE, LAST_DATE, ALL_MONTHS)
+    lows = pyramid_count(pyramid, FIRST_DATE, LAST_DATE, ALL_MONTHS, columnName, below=inputMin)
+    highs = pyramid_count(pyramid, FIRST_DATE, LAST_DATE, ALL_MONTHS, columnName, above=inputMax)
+    numEntries = totals.sum()
+    summary = [round(maxValue, 2), round(minValue, 2), round(lows.sum() / numEntries * 100, 2),
+               round(highs.sum() / numEntries * 100, 2)]
+    return summary, contour_grid(lows, totals)[2], contour_grid(highs, totals)[2]
+
+# rolling swing of the interfaces and batch reports (rolling_swings) on the readings of the data store
+def swing_rolling(room, columnName, inputMax):
+    df = pyramid_frame(room['pyramid'], FIRST_DATE, LAST_DATE, ALL_MONTHS)
+    swingArray = rolling_swings(df[columnName].to_numpy()[None, :])[0]
+    return swing_summary(df, swingArray, inputMax)
+
+# maximum swing, percentage over the permitted swing and contour grid of the swing of every reading
+def swing_summary(df, swingArray, inputMax):
+    percentOut = ((pd.Series(swingArray, index=df.index) >= inputMax) * 100).groupby(
+        [df['month'], df['year']]).mean().unstack()
+    summary = [round(max(swingArray), 2), round(np.sum(swingArray >= inputMax) / len(swingArray) * 100, 2)]
+    return swingArray, summary, percentOut.values
+
+# cross-correlation interface, with every gap interpolated as the thesis tool did (the interfaces now leave out gaps
+# longer than MAX_INTERPOLATION_GAP)
+def cross_correlation(list_filenames, list_contents):
+    frames = [resampled_channels(filename, contents, ['Temp', 'RH'], None)[0]
+              for filename, contents in zip(list_filenames, list_contents)]
+    return [pd.concat([frame['{}_{}'.format(parameter, filename)] for frame, filename in zip(frames, list_filenames)],
+                      axis=1).dropna().corr() for parameter in ['Temp', 'RH']]
+
+
+# CHECKS________________________________________________________________________________________________________________
+# each check has a name, the thesis function and the engines that must give its numbers, each with its tolerance;
+# functions take the inputs of a room (see prepare), or of all the files for checks across rooms, and return an
+# array or a list of arrays. Add a new engine next to the one it replaces
+def thesis_dew_point(room):
+    return thesis_add_DP_column(room['thesis'].copy())['Dew Point'].to_numpy()
+
+ROOM_CHECKS = [('dew point', thesis_dew_point,
+                [('add_DP_column', dew_point_frame, [FLOAT64_TOLERANCE]),
+                 ('dew_point float32', dew_point_dataset, [FLOAT32_TOLERANCE])])]
+for parameter, columnName in COLUMNS:
+    inputMin, inputMax = SUGGESTED_BOUNDS[parameter]
+    ROOM_CHECKS.append(('{} bounds'.format(parameter),
+                        lambda room, c=columnName, a=inputMin, b=inputMax: thesis_bounds_analysis(
+                            room['thesis'].copy(), c, a, b),
+                        [('pyramid', lambda room, c=columnName, a=inputMin, b=inputMax: bounds_pyramid(room, c, a, b),
+                          [PERCENT_TOLERANCE, MONTHLY_PERCENT_TOLERANCE, MONTHLY_PERCENT_TOLERANCE])]))
+    ROOM_CHECKS.append(('{} swing'.format(parameter),
+                        lambda room, c=columnName: thesis_swing_contours(room['thesis'].copy(), c, SUGGESTED_SWING),
+                        [('rolling_swings', lambda room, c=columnName: swing_rolling(room, c, SUGGESTED_SWING),
+                          [FLOAT32_TOLERANCE, PERCENT_TOLERANCE, MONTHLY_PERCENT_TOLERANCE])]))
+FILE_CHECKS = [('correlation', thesis_cross_correlation,
+                [('resampled_channels', cross_correlation, [FLOAT64_TOLERANCE, FLOAT64_TOLERANCE])])]
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# inputs of the checks of a file: the dataframe of the thesis parse_data (in time order, as the interfaces now read
+# files), the dataframe of read_pm2 and the aggregate pyramid of the data store
+def prepare(contents):
+    thesis = thesis_parse_data(contents, FIRST_DATE, LAST_DATE, ALL_MONTHS)
+    thesis = thesis.sort_values(TIME_COLUMN, kind='mergesort').reset_index(drop=True)
+    frame = read_pm2(contents)
+    return {'thesis': thesis, 'frame': frame,
+            'pyramid': build_pyramid(SensorDataset.from_frame(frame), AGGREGATE_COLUMNS)}
+
+# largest difference between two results (arrays, or lists of them); NaN must be in the same places
+def differences(expected, result):
+    if not isinstance(expected, (list, tuple)):
+        expected, result = [expected], [result]
+    found = []
+    for a, b in zip(expected, result):
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        if a.shape != b.shape or not np.array_equal(np.isnan(a), np.isnan(b)):
+            found.append(np.inf)
+        else:
+            found.append(float(np.nanmax(np.abs(a - b))) if a.size and not np.isnan(a).all() else 0.0)
+    return found
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+# run a check on its inputs; returns a row of the report for every engine
+def run_check(dataset, check, inputs):
+    name, thesis, engines = check
+    expected, thesisSeconds = timed(thesis, *inputs)
+    rows = []
+    for engineName, engine, tolerances in engines:
+        result, seconds = timed(engine, *inputs)
+        found = differences(expected, result)
+        passed = all(difference <= tolerance for difference, tolerance in zip(found, tolerances))
+        rows.append({'dataset': dataset, 'check': name, 'engine': engineName, 'difference': max(found),
+                     'passed': passed, 'thesis': thesisSeconds, 'seconds': seconds})
+    return rows
+
+def print_row(row):
+    print('{:<22} {:<12} {:<19} {:>10.2g} {:>9.3f} s {:>9.3f} s {:>8.1f}x  {}'.format(
+        row['dataset'][:22], row['check'], row['engine'], row['difference'], row['thesis'], row['seconds'],
+        row['thesis'] / row['seconds'] if row['seconds'] else np.inf, 'ok' if row['passed'] else 'FAILED'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the analyses give the numbers of the thesis tools.')
+    parser.add_argument('--files', nargs='*', default=[], help='.pm2 files, or folders of them, to check as well')
+    parser.add_argument('--rooms', type=int, default=SYNTHETIC_ROOMS, help='synthetic rooms (default: %(default)s)')
+    parser.add_argument('--years', type=float, default=SYNTHETIC_YEARS, help='years of readings of each synthetic '
+                                                                             'room (default: %(default)s)')
+    args = parser.parse_args()
+
+    files = [('synthetic room_{}'.format(room + 1), synthetic_pm2(room, args.years)) for room in range(args.rooms)]
+    for path in args.files:
+        found = find_pm2_files(path) if os.path.isdir(path) else [(os.path.basename(path), path)]
+        for name, filePath in found:
+            with open(filePath, 'rb') as f:
+                files.append((name, 'data:application/octet-stream;base64,' + base64.b64encode(f.read()).decode()))
+
+    print('{:<22} {:<12} {:<19} {:>10} {:>11} {:>11} {:>9}'.format('dataset', 'check', 'engine', 'difference',
+                                                                    'thesis', 'engine', 'speedup'))
+    rows = []
+    for name, contents in files:
+        room = prepare(contents)
+        for check in ROOM_CHECKS:
+            for row in run_check(name, check, [room]):
+                print_row(row)
+                rows.append(row)
+    if len(files) > 1:
+        for check in FILE_CHECKS:
+            for row in run_check('all files', check, [[name for name, contents in files],
+                                                      [contents for name, contents in files]]):
+                print_row(row)
+                rows.append(row)
+    failed = [row for row in rows if not row['passed']]
+    print('\n{} of {} checks passed'.format(len(rows) - len(failed), len(rows)))
+    if failed:
+        sys.exit('{} checks differ from the thesis tools'.format(len(failed)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# benchmark suite of the analyses, from parsing uploaded .pm2 files to the factor analysis, on synthetic files (see
+# synthetic_pm2.py) at several scales. Each stage is timed on its own and the times are appended to a results file
+# together with the commit they were measured at, so a change can be compared with the runs before it:
+#   python benchmarks/run_benchmarks.py --scales small medium
+# prints the time of every stage and, for stages timed before at another commit on this machine, how it compares
+# with the last such run; with --fail-on-regression it exits with an error if a stage got slower than --tolerance
+# import needed packages
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIRECTORY)
+# uploads, cached results and jobs of the interfaces used by the stages are kept out of the package folder
+for variable in ['WINTERTHUR_STORE', 'WINTERTHUR_CACHE', 'WINTERTHUR_JOBS']:
+    os.environ.setdefault(variable, tempfile.mkdtemp(prefix='winterthur-benchmark-'))
+from synthetic_pm2 import synthetic_pm2
+from winterthur_data import (PARAMETER_COLUMNS, TEMP_COLUMN, RH_COLUMN, MAX_INTERPOLATION_GAP, parse_data,
+                             resampled_channels, build_pyramid, pyramid_count, pyramid_extremes)
+from winterthur_dataset import SensorDataset
+from winterthur_store import AGGREGATE_COLUMNS
+from winterthur_swing import rolling_swings
+from winterthur_batch import SUGGESTED_BOUNDS, SUGGESTED_SWING, batch_results
+
+# rooms and years of readings of each scale
+SCALES = {'small': (2, 1), 'medium': (8, 3), 'large': (32, 10)}
+RESULTS_PATH = os.path.join(PACKAGE_DIRECTORY, 'benchmarks', 'results.jsonl')
+REPEATS = 3 # runs of each stage; the median is kept
+MAX_STAGE_SECONDS = 10 # a stage is not run again once its runs took this long
+TOLERANCE = 0.2 # a stage is reported as slower when it takes this fraction longer than at the last commit
+# date range covering every synthetic file, and the parameters of the analyses
+FIRST_DATE = pd.Timestamp('1900-01-01')
+LAST_DATE = pd.Timestamp('2100-01-01')
+PARAMETERS = ['Temp', 'RH', 'DP']
+NUM_FACTORS = 2
+
+
+# STAGES________________________________________________________________________________________________________________
+# every stage takes the data of a scale (the synthetic files and the results of the stages before it) and returns its
+# result, which is added to the data under the name of the stage, and the number of readings it processed
+# parse_data: read each file and select the date range
+def parse(data):
+    frames = [parse_data(contents, FIRST_DATE, LAST_DATE, []) for contents in data['contents']]
+    return frames, sum(len(df) for df in frames)
+
+# make_df_pm2 without its cache: read each file, compute the derived channels and resample to 15 minutes
+def resample(data):
+    frames = [resampled_channels(room, contents, PARAMETERS, MAX_INTERPOLATION_GAP)
+              for room, contents in zip(data['rooms'], data['contents'])]
+    return frames, sum(len(df) for df, imputed in frames)
+
+# aggregate pyramid of each room, as made when a file is added to the data store
+def pyramid(data):
+    pyramids = [build_pyramid(SensorDataset.from_frame(df), AGGREGATE_COLUMNS) for df in data['parse']]
+    return pyramids, sum(len(df) for df in data['parse'])
+
+# bounds analysis of the one-file interface: extremes and the readings under and over the bounds by month
+def bounds(data):
+    counts = []
+    for room in data['pyramid']:
+        lower, upper = SUGGESTED_BOUNDS['Temp']
+        pyramid_extremes(room, TEMP_COLUMN, FIRST_DATE, LAST_DATE, [])
+        counts.append((pyramid_count(room, FIRST_DATE, LAST_DATE, []),
+                       pyramid_count(room, FIRST_DATE, LAST_DATE, [], TEMP_COLUMN, below=lower),
+                       pyramid_count(room, FIRST_DATE, LAST_DATE, [], TEMP_COLUMN, above=upper)))
+    return counts, sum(len(room['dataset']) for room in data['pyramid'])
+
+# contour plots of the one-file interface: percent of the readings out of bounds by year and month, and percent of
+# readings with a large rolling swing by year and month
+def contours(data):
+    from Bounds_and_Swing_Analysis_For_One_File import contour_grid
+    grids = []
+    for (totals, lows, highs), df in zip(data['bounds'], data['parse']):
+        grids.append((contour_grid(lows, totals), contour_grid(highs, totals)))
+        swing = pd.Series(rolling_swings(df[RH_COLUMN].to_numpy()[None, :])[0], index=df.index)
+        grids.append(((swing >= SUGGESTED_SWING) * 100).groupby([df['month'], df['year']]).mean().unstack())
+    return grids, sum(len(df) for df in data['parse'])
+
+# rolling 24-hour swing of temperature and RH of every room, as used by the interfaces
+def rolling_swing(data):
+    swings = [rolling_swings(np.vstack([room['dataset'][TEMP_COLUMN], room['dataset'][RH_COLUMN]]))
+              for room in data['pyramid']]
+    return swings, sum(len(room['dataset']) for room in data['pyramid'])
+
+# multi-file analysis of every room: bounds, excursions and swings of every parameter
+def multi_file(data):
+    swings = {parameter: SUGGESTED_SWING for parameter in PARAMETER_COLUMNS}
+    results = [batch_results(name, room['dataset'], SUGGESTED_BOUNDS, swings)
+               for name, room in zip(data['rooms'], data['pyramid'])]
+    return results, sum(len(room['dataset']) for room in data['pyramid'])
+
+# cross-correlation interface: one dataframe per parameter with a column per room, and its correlation matrix
+def correlation(data):
+    dfs = {}
+    for parameter in PARAMETERS:
+        dfs[parameter] = pd.DataFrame({'{}_{}'.format(parameter, room): df['{}_{}'.format(parameter, room)]
+                                       for room, (df, imputed) in zip(data['rooms'], data['resample'])}).dropna()
+    corrs = {parameter: df.corr() for parameter, df in dfs.items()}
+    return (dfs, corrs), sum(df.size for df in dfs.values())
+
+# density scatter plot matrix of the cross-correlation interface, for the first parameter
+def scatter_matrix(data):
+    from Cross_Correlation import make_density_matrix
+    df = data['correlation'][0][PARAMETERS[0]]
+    return make_density_matrix(df, 'Correlation Matrix'), df.size
+
+# factor analysis interface: eigenvalues (scree plot) and the factor analysis of the temperature and RH of every room
+def factor_analysis(data):
+    from winterthur_cache import store_value
+    from Factor_Analysis import eigens, factor_analysis
+    df = pd.concat([data['correlation'][0]['Temp'], data['correlation'][0]['RH']], axis=1).dropna()
+    key = store_value(df)
+    eigens(1, None, key, 'no-pickle')
+    return factor_analysis(min(NUM_FACTORS, df.shape[1] - 1), None, key, 'no-pickle'), df.size
+
+STAGES = [parse, resample, pyramid, bounds, contours, rolling_swing, multi_file, correlation, scatter_matrix,
+          factor_analysis]
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# median time of a stage over up to repeats runs; returns the result of the last run, the median seconds, the number
+# of runs and the readings processed
+def time_stage(stage, data, repeats):
+    times = []
+    while len(times) < repeats and sum(times) < MAX_STAGE_SECONDS:
+        start = time.perf_counter()
+        result, numRows = stage(data)
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times), len(times), numRows
+
+# commit of the package folder, marked as modified if it has uncommitted changes
+def current_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PACKAGE_DIRECTORY, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PACKAGE_DIRECTORY,
+                                 check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + '-modified' if changes else commit
+
+def read_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# last time of the same stage and scale measured on this machine at another commit
+def previous_result(results, record):
+    for previous in reversed(results):
+        if previous['host'] == record['host'] and previous['commit'] != record['commit'] and \
+                previous['scale'] == record['scale'] and previous['stage'] == record['stage'] and \
+                previous['seconds'] is not None:
+            return previous
+    return None
+
+# run the stages at a scale; returns a record of every stage
+def run_scale(scale, stages, repeats, seed):
+    numRooms, years = SCALES[scale]
+    rooms = ['room_{}'.format(room + 1) for room in range(numRooms)]
+    data = {'rooms': rooms, 'contents': [synthetic_pm2(room, years, seed=seed) for room in range(numRooms)]}
+    records = []
+    for stage in STAGES:
+        name = stage.__name__
+        record = {'scale': scale, 'rooms': numRooms, 'years': years, 'stage': name, 'seconds': None, 'runs': 0,
+                  'rows': None, 'error': None}
+        try:
+            # stages that are not selected still run once if a selected stage needs their result
+            result, seconds, runs, numRows = time_stage(stage, data, repeats if name in stages else 1)
+            data[name] = result
+            if name in stages:
+                record.update(seconds=seconds, runs=runs, rows=int(numRows))
+        except Exception as e:
+            record['error'] = '{}: {}'.format(type(e).__name__, e)
+        if name in stages:
+            records.append(record)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the analyses on synthetic .pm2 files at several scales.')
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES),
+                        help='scales to run, as rooms and years: {} (default: %(default)s)'.format(
+                            ', '.join('{} {}x{}'.format(scale, *SCALES[scale]) for scale in SCALES)))
+    parser.add_argument('--stages', nargs='+', default=[stage.__name__ for stage in STAGES],
+                        choices=[stage.__name__ for stage in STAGES], help='stages to time (default: all)')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='runs of each stage (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic files (default: %(default)s)')
+    parser.add_argument('--results', default=RESULTS_PATH, help='file the results are appended to '
+                                                                '(default: benchmarks/results.jsonl)')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='fraction a stage may get slower before '
+                                                                           'it is reported (default: %(default)s)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with an error if a stage got slower')
+    args = parser.parse_args()
+
+    results = read_results(args.results)
+    run = {'commit': current_commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+           'host': socket.gethostname(), 'python': platform.python_version(), 'numpy': np.__version__,
+           'pandas': pd.__version__}
+    print('Commit {} on {} (python {}, numpy {}, pandas {})'.format(run['commit'], run['host'], run['python'],
+                                                                     run['numpy'], run['pandas']))
+    regressions = []
+    with open(args.results, 'a') as f:
+        for scale in args.scales:
+            print('\n{} ({} rooms, {} years of readings)'.format(scale, *SCALES[scale]))
+            for record in run_scale(scale, args.stages, args.repeats, args.seed):
+                record = dict(run, **record)
+                f.write(json.dumps(record) + '\n')
+                if record['error'] is not None:
+                    print('  {:<16} failed: {}'.format(record['stage'], record['error']))
+                    continue
+                line = '  {:<16} {:>9.3f} s  {:>10} readings'.format(record['stage'], record['seconds'],
+                                                                     record['rows'])
+                previous = previous_result(results, record)
+                if previous is not None:
+                    ratio = record['seconds'] / previous['seconds'] if previous['seconds'] else float('inf')
+                    line += '  {:.2f}x of {}'.format(ratio, previous['commit'])
+                    if ratio > 1 + args.tolerance:
+                        line += '  SLOWER'
+                        regressions.append(record)
+                print(line)
+    print('\nResults appended to {}'.format(args.results))
+    if regressions and args.fail_on_regression:
+        sys.exit('{} stages got slower'.format(len(regressions)))
+
+
+if __name__ == '__main__':
+    main()
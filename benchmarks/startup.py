@@ -0,0 +1,60 @@
+# startup benchmark: for each interface (and for wsgi.py, which mounts all four), a fresh Python process imports it,
+# makes its app and answers the first requests the browser sends (the page, its layout and its callbacks). Prints the
+# median import time and time to the first response over several runs, e.g. to check what a new worker process costs:
+#   python benchmarks/startup.py --runs 5
+# run from the package folder (or with it on PYTHONPATH)
+# import needed packages
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+# module and URL path prefix of each interface; wsgi.py serves the index page at /
+INTERFACES = [('Bounds_and_Swing_Analysis_For_One_File', '/'), ('Bounds_And_Swing_Analysis_For_Multiple_Files', '/'),
+              ('Cross_Correlation', '/'), ('Factor_Analysis', '/'), ('wsgi', '/one-file/')]
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in the fresh process: time the import and the first requests, and print them as JSON
+SCRIPT = '''
+import sys, time, json, importlib
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+server = module.application if sys.argv[1] == 'wsgi' else module.create_app().server
+client = server.test_client()
+for path in ['', '_dash-layout', '_dash-dependencies']:
+    assert client.get(sys.argv[2] + path).status_code == 200, path
+answered = time.perf_counter()
+print(json.dumps({'import': imported - start, 'response': answered - start,
+                  'heavy': sorted(name for name in ['sklearn', 'scipy', 'factor_analyzer'] if name in sys.modules)}))
+'''
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# import and first response times of a module in a fresh process
+def startup(module, prefix):
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([PACKAGE_DIRECTORY, os.environ.get('PYTHONPATH', '')]))
+    output = subprocess.run([sys.executable, '-c', SCRIPT, module, prefix], cwd=PACKAGE_DIRECTORY, env=environment,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Time from a fresh process to the first response of each interface.')
+    parser.add_argument('--runs', type=int, default=3, help='runs of each interface (default: %(default)s)')
+    parser.add_argument('--interfaces', nargs='+', default=[module for module, prefix in INTERFACES],
+                        choices=[module for module, prefix in INTERFACES], help='interfaces to time (default: all)')
+    args = parser.parse_args()
+
+    print('{:<46} {:>10} {:>16}  {}'.format('interface', 'import', 'first response', 'heavy modules loaded'))
+    for module, prefix in INTERFACES:
+        if module in args.interfaces:
+            runs = [startup(module, prefix) for run in range(args.runs)]
+            print('{:<46} {:>8.2f} s {:>14.2f} s  {}'.format(
+                module, statistics.median(run['import'] for run in runs),
+                statistics.median(run['response'] for run in runs), ', '.join(runs[0]['heavy']) or 'none'))
+
+
+if __name__ == '__main__':
+    main()
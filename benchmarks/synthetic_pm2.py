@@ -0,0 +1,99 @@
+# synthetic Winterthur .pm2 files for the benchmarks: temperature and RH every few minutes with seasonal and daily
+# cycles, a different climate in every room, smoothed sensor noise, logger outages and single missed readings. The
+# files have the same layout as the loggers' (see read_pm2 in winterthur_data.py), e.g. to write 10 rooms of 3 years:
+#   python benchmarks/synthetic_pm2.py --rooms 10 --years 3 --folder synthetic
+# only the standard library and numpy are needed
+# import needed packages
+import os
+import base64
+import argparse
+import numpy as np
+
+START = '2014-01-01T00:00' # GMT time of the first reading
+INTERVAL = 15 # minutes between readings
+OUTAGES_PER_YEAR = 4 # logger outages (from an hour to a few days) per room and year
+MISSED_FRACTION = 0.001 # fraction of single readings missing
+UTC_OFFSET = -5 # hours from GMT of the rooms' local time, for the time of day of the daily cycle
+# header lines as written by the loggers; the thesis tools look up the time column by its name
+HEADER = ['LOGGER', 'SERIAL NUMBER', 'DATE AND TIME GMT\tTEMP\tRH', '\tF\t%']
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# readings of a room: GMT times (datetime64[m]) and temperature (F) and RH (%) at those times. Every room (and seed)
+# has its own set-points, cycle sizes and outages, and the same room and seed always give the same readings
+def room_readings(room=0, years=1.0, interval=INTERVAL, start=START, seed=0, outagesPerYear=OUTAGES_PER_YEAR,
+                  missedFraction=MISSED_FRACTION):
+    rng = np.random.default_rng([seed, room])
+    numRows = int(years * 365 * 24 * 60 / interval)
+    times = np.datetime64(start, 'm') + np.arange(numRows) * np.timedelta64(interval, 'm')
+    days = np.arange(numRows) * interval / (24 * 60)
+    localHours = (np.arange(numRows) * interval / 60 + UTC_OFFSET) % 24
+    seasonal = -np.cos(2 * np.pi * (days - 15) / 365) # lowest in mid-January, highest in mid-July
+    daily = np.sin(2 * np.pi * (localHours - 9) / 24) # highest in the middle of the afternoon
+
+    # climate of the room: well-controlled rooms have small cycles, open ones large cycles
+    control = rng.uniform(0.3, 1)
+    temp = rng.uniform(64, 72) + rng.uniform(3, 8) * control * seasonal + rng.uniform(0.5, 2) * control * daily
+    rh = rng.uniform(38, 52) + rng.uniform(6, 14) * control * seasonal
+    rh = rh - 1.5 * (temp - temp.mean()) * control # RH falls when the air warms up during the day
+    # sensor noise, smoothed over about two hours so neighbouring readings are alike
+    smooth = np.ones(max(1, 120 // interval)) / max(1, 120 // interval)
+    temp = temp + np.convolve(rng.normal(0, 0.6, numRows), smooth, mode='same') + rng.normal(0, 0.1, numRows)
+    rh = rh + np.convolve(rng.normal(0, 2.5, numRows), smooth, mode='same') + rng.normal(0, 0.3, numRows)
+    rh = np.clip(rh, 5, 95)
+
+    # outages and single missed readings
+    keep = rng.random(numRows) >= missedFraction
+    for k in range(rng.poisson(outagesPerYear * years)):
+        first = rng.integers(0, numRows)
+        length = int(np.exp(rng.uniform(np.log(60), np.log(4 * 24 * 60))) / interval) # an hour to four days
+        keep[first:first + length] = False
+    return times[keep], np.round(temp[keep], 1), np.round(rh[keep], 1)
+
+# text of a .pm2 file of the readings
+def pm2_text(times, temp, rh):
+    stamps = times.astype('datetime64[m]').astype(str)
+    lines = ['{}/{}/{} {}\t{:.1f}\t{:.1f}'.format(s[5:7], s[8:10], s[:4], s[11:16], t, r)
+             for s, t, r in zip(stamps, temp, rh)]
+    return '\n'.join(HEADER + lines) + '\n'
+
+# contents of a .pm2 file as sent by dcc.Upload
+def pm2_contents(text):
+    return 'data:application/octet-stream;base64,' + base64.b64encode(text.encode()).decode()
+
+# contents (as sent by dcc.Upload) of a synthetic .pm2 file of a room; see room_readings for the settings
+def synthetic_pm2(room=0, years=1.0, **settings):
+    return pm2_contents(pm2_text(*room_readings(room, years, **settings)))
+
+# write synthetic .pm2 files of numRooms rooms (room_1.pm2, room_2.pm2, ...) to a folder; returns their paths
+def write_rooms(folder, numRooms, years=1.0, **settings):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for room in range(numRooms):
+        path = os.path.join(folder, 'room_{}.pm2'.format(room + 1))
+        with open(path, 'w') as f:
+            f.write(pm2_text(*room_readings(room, years, **settings)))
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic Winterthur .pm2 files.')
+    parser.add_argument('--folder', default='synthetic', help='folder to write to (default: %(default)s)')
+    parser.add_argument('--rooms', type=int, default=4, help='number of rooms (default: %(default)s)')
+    parser.add_argument('--years', type=float, default=1, help='years of readings (default: %(default)s)')
+    parser.add_argument('--interval', type=int, default=INTERVAL, help='minutes between readings '
+                                                                       '(default: %(default)s)')
+    parser.add_argument('--start', default=START, help='GMT time of the first reading (default: %(default)s)')
+    parser.add_argument('--outages', type=float, default=OUTAGES_PER_YEAR, help='logger outages per room and year '
+                                                                               '(default: %(default)s)')
+    parser.add_argument('--missed', type=float, default=MISSED_FRACTION, help='fraction of single readings missing '
+                                                                             '(default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: %(default)s)')
+    args = parser.parse_args()
+    paths = write_rooms(args.folder, args.rooms, args.years, interval=args.interval, start=args.start,
+                        seed=args.seed, outagesPerYear=args.outages, missedFraction=args.missed)
+    print('Wrote {} files to {}'.format(len(paths), args.folder))
+
+
+if __name__ == '__main__':
+    main()
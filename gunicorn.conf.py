@@ -0,0 +1,25 @@
+# gunicorn settings for serving all four interfaces (wsgi.py) in production:
+#   gunicorn -c gunicorn.conf.py wsgi:application
+# the address and the number of workers and threads can be changed with the environment variables below (or on the
+# command line); see the README for the load test these settings were chosen with
+# import needed packages
+import os
+import multiprocessing
+
+# address and port to listen on
+bind = os.environ.get('WINTERTHUR_BIND', '0.0.0.0:8050')
+# one worker process per core: the analyses are numpy and pandas code, so it is processes, not threads, that make use
+# of more cores
+workers = int(os.environ.get('WINTERTHUR_WORKERS', multiprocessing.cpu_count()))
+# a few threads per worker, so a worker keeps answering (e.g. the job status polls) while a callback reads files
+worker_class = 'gthread'
+threads = int(os.environ.get('WINTERTHUR_THREADS', 4))
+# uploaded .pm2 files are parsed and added to the data store within the request, which takes a while for large files
+timeout = 300
+graceful_timeout = 60
+# file paths entered in the interfaces (e.g. to save polygons or .csv files) are relative to the package folder
+chdir = os.path.dirname(os.path.abspath(__file__))
+# the interfaces are imported by each worker rather than before forking, so the thread pools of the job runner and
+# of numpy are started in the worker that uses them
+preload_app = False
+accesslog = '-'
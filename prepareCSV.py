@@ -1,46 +1,121 @@
+import argparse
 import pandas as pd
+import numpy as np
+from winterthur_data import resample_chunks
 
-# user lists their file path HERE:
-file = "exterior weather 2011-1-1-to-2020-3-1.csv"
-# user inputs dates to examine HERE:
-startDate = '2015-07-02 13:30'
-endDate = '2020-02-06 17:30'
-# user inputs location to save csv to HERE:
-saveFileHere = 'E:\interpolated_data.csv'
-
-df = pd.read_csv(file)  # replace specific file with variable from upload
-
-# user selects parameter to extract HERE:
-# user can change these based on their weather data file, but a 'date' column must be included
-# the names of columns must correspond to the column names in the csv file exactly
-df = df[['DATE', # this column must be present; if name is different, make sure to change here and in later lines of code
-         'HourlyDewPointTemperature',
-         'HourlyDryBulbTemperature',
-         'HourlyPrecipitation',
-         'HourlyRelativeHumidity',
-         'HourlyStationPressure',
-         'HourlyVisibility',
-         'HourlyWetBulbTemperature',
-         'HourlyWindSpeed']]
-
-df['DATE'] = df['DATE'].astype('datetime64[ns]') # date column
-
-# loop through numerical data
-for i in range(len(df.columns) - 1):
-    df[df.columns[i+1]] = df[df.columns[i+1]].astype('float64')
-
-df = df.set_index('DATE') # set date column as the index
-
-# resample
-frame = {}
-for i in range(len(df.columns) - 1):
-    upsampled = df[df.columns[i+1]].resample('15min').mean() # user can change sampling rate
-    interpolated = upsampled.interpolate(method='linear')
-    frame[df.columns[i+1]] = interpolated
-
-result = pd.DataFrame(frame) # make dataframe from interpolated data
-# select only the dates desired
-result = result.loc[startDate : endDate]
-
-# save to csv
-result.to_csv(saveFileHere)
+# pyarrow is only needed to write Parquet files
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# resample a weather data export (e.g. from NOAA) to a regular time step, filling short gaps by interpolation
+# the file is read in chunks and only the needed columns are read, so memory stays bounded for very large files
+# example:
+#   python prepareCSV.py "exterior weather 2011-1-1-to-2020-3-1.csv" interpolated_data.csv \
+#       --start "2015-07-02 13:30" --end "2020-02-06 17:30"
+
+# the date column must be included; the names of columns must correspond to the column names in the file exactly
+DATE_COLUMN = 'DATE'
+# parameters to extract by default; can be changed with --columns
+COLUMNS = ['HourlyDewPointTemperature',
+           'HourlyDryBulbTemperature',
+           'HourlyPrecipitation',
+           'HourlyRelativeHumidity',
+           'HourlyStationPressure',
+           'HourlyVisibility',
+           'HourlyWetBulbTemperature',
+           'HourlyWindSpeed']
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# NOAA values are text: a letter after a number flags it (e.g. '12s' is a suspect value, which is kept), 'T' is a
+# trace amount of precipitation (read as 0), and anything else that is not a number (e.g. 'M' for missing) is missing
+def noaa_to_float(values):
+    values = values.str.strip()
+    values = values.where(values != 'T', '0')
+    return pd.to_numeric(values.str.replace(r'[A-Za-z*]+$', '', regex=True), errors='coerce')
+
+# read the file in chunks of rows as dataframes indexed by date, with every column as float
+def read_chunks(file, dateColumn, columns, chunksize):
+    # everything is read as text, so no column has to be inferred and mixed columns are not converted twice
+    reader = pd.read_csv(file, usecols=[dateColumn] + columns, dtype=str, chunksize=chunksize)
+    for chunk in reader:
+        frame = pd.DataFrame({column: noaa_to_float(chunk[column]) for column in columns})
+        frame.index = pd.DatetimeIndex(pd.to_datetime(chunk[dateColumn]), name=dateColumn)
+        yield frame[columns]
+
+# write the resampled pieces in the date range as they come; returns the number of rows written
+def write_pieces(pieces, output, fileFormat, startDate, endDate, maskOutput=None):
+    writers = {}
+    numRows = 0
+    try:
+        for result, imputed in pieces:
+            if startDate is not None:
+                result = result.loc[startDate:]
+                imputed = imputed.loc[startDate:]
+            if endDate is not None:
+                result = result.loc[:endDate]
+                imputed = imputed.loc[:endDate]
+            for frame, path in [(result, output), (imputed, maskOutput)]:
+                if path is not None and len(frame):
+                    write_piece(writers, frame, path, fileFormat)
+            numRows += len(result)
+            if endDate is not None and len(result) and result.index[-1] >= pd.Timestamp(endDate):
+                break # the rest of the file is after the end date
+    finally:
+        for writer in writers.values():
+            if fileFormat == 'parquet':
+                writer.close()
+    return numRows
+
+def write_piece(writers, frame, path, fileFormat):
+    if fileFormat == 'parquet':
+        table = pyarrow.Table.from_pandas(frame)
+        if path not in writers:
+            writers[path] = pyarrow.parquet.ParquetWriter(path, table.schema)
+        writers[path].write_table(table)
+    else:
+        # header only for the first piece
+        frame.to_csv(path, mode='a' if path in writers else 'w', header=path not in writers)
+        writers[path] = path
+
+def main():
+    parser = argparse.ArgumentParser(description='Resample a weather data export to a regular time step, '
+                                                 'interpolating short gaps.')
+    parser.add_argument('file', help='csv file to read')
+    parser.add_argument('output', help='file to write; .parquet (needs pyarrow) or .csv')
+    parser.add_argument('--start', help='first date to keep, e.g. "2015-07-02 13:30"')
+    parser.add_argument('--end', help='last date to keep, e.g. "2020-02-06 17:30"')
+    parser.add_argument('--date-column', default=DATE_COLUMN, help='name of the date column (default: %(default)s)')
+    parser.add_argument('--columns', nargs='+', default=COLUMNS, help='names of the columns to extract')
+    parser.add_argument('--step', type=int, default=15, help='time step in minutes (default: %(default)s)')
+    parser.add_argument('--max-gap', type=int, default=120,
+                        help='longest gap in minutes that is filled by interpolation; 0 fills every gap, but '
+                             'memory is then only bounded if no column has long gaps (default: %(default)s)')
+    parser.add_argument('--chunksize', type=int, default=200000, help='rows read at a time (default: %(default)s)')
+    parser.add_argument('--format', choices=['csv', 'parquet'],
+                        help='output format (default: from the output file extension)')
+    parser.add_argument('--mask', help='also write a file, in the same format, marking which values were '
+                                       'interpolated')
+    args = parser.parse_args()
+
+    fileFormat = args.format or ('parquet' if args.output.lower().endswith('.parquet') else 'csv')
+    if fileFormat == 'parquet' and pyarrow is None:
+        parser.error('writing Parquet files needs pyarrow (pip install pyarrow)')
+    step = np.timedelta64(args.step, 'm')
+    maxGap = np.timedelta64(args.max_gap, 'm') if args.max_gap > 0 else None
+
+    chunks = read_chunks(args.file, args.date_column, args.columns, args.chunksize)
+    if args.start is not None and maxGap is not None:
+        # chunks that end more than maxGap before the start date cannot change the output, so they are not resampled
+        margin = pd.Timestamp(args.start) - pd.Timedelta(maxGap) - pd.Timedelta(step)
+        chunks = (chunk for chunk in chunks if len(chunk) == 0 or chunk.index[-1] >= margin)
+    pieces = resample_chunks(chunks, step, maxGap)
+    numRows = write_pieces(pieces, args.output, fileFormat, args.start, args.end, args.mask)
+    print('Wrote {} rows to {}'.format(numRows, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+# the store, cache, jobs and metrics of the tests are kept in a temporary folder, set before the modules are imported
+import os
+import shutil
+import tempfile
+import atexit
+
+TEST_DIRECTORY = tempfile.mkdtemp(prefix='winterthur-tests-')
+atexit.register(shutil.rmtree, TEST_DIRECTORY, True)
+for name, folder in [('WINTERTHUR_STORE', 'store'), ('WINTERTHUR_CACHE', 'cache'), ('WINTERTHUR_JOBS', 'jobs'),
+                     ('WINTERTHUR_METRICS', 'metrics')]:
+    os.environ[name] = os.path.join(TEST_DIRECTORY, folder)
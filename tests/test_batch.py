@@ -0,0 +1,104 @@
+import os
+import sys
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import winterthur_cache
+import winterthur_store
+from winterthur_data import PARAMETER_COLUMNS, TEMP_COLUMN, RH_COLUMN
+from winterthur_dataset import SensorDataset
+from winterthur_store import ingest_pm2
+from winterthur_swing import SWING_UNITS, calendar_swings, rolling_swings, swing_statistics
+from winterthur_excursions import SUMMARY_COLUMNS
+from winterthur_batch import (BOUNDS_COLUMNS, SWING_COLUMNS, SUGGESTED_BOUNDS, SUGGESTED_SWING, batch_analysis,
+                              batch_cached, batch_results, batch_view)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from synthetic_pm2 import room_readings, pm2_text, pm2_contents
+
+BOUNDS = OrderedDict(SUGGESTED_BOUNDS)
+SWINGS = OrderedDict((parameter, SUGGESTED_SWING) for parameter in PARAMETER_COLUMNS)
+
+
+# two days of readings every 15 minutes at 70 °F and 45 %, with the temperature at peak for the two hours from 10:00
+# of the first day
+def flat_room(peak=None):
+    times = pd.date_range('2019-03-04', periods=192, freq='15min').values
+    temp = np.full(len(times), 70.0)
+    if peak is not None:
+        temp[40:48] = peak
+    return SensorDataset.from_times(times, {TEMP_COLUMN: temp, RH_COLUMN: np.full(len(times), 45.0)})
+
+
+def test_batch_results_of_a_peak():
+    table, excursions = batch_results('Room A', flat_room(82), BOUNDS, SWINGS)
+    assert list(table.index) == list(PARAMETER_COLUMNS)
+    temp = table.loc['Temp']
+    assert (temp['Minimum Value'], temp['Maximum Value']) == (70, 82)
+    assert temp['Percent Over Upper Bound (%)'] == 4 # 8 of 192 readings, rounded to whole percents
+    assert temp['Percent Under Lower Bound (%)'] == 0
+    assert temp['Number of Excursions'] == 1
+    assert temp['Hours in Excursions'] == 2
+    assert temp['rolling Maximum Swing'] == 12
+    assert temp['daily Maximum Swing'] == 12
+    assert table.loc['RH', 'Number of Excursions'] == 0
+    assert table.loc['RH', 'rolling Maximum Swing'] == 0
+    assert set(excursions['Parameter']) <= set(PARAMETER_COLUMNS)
+    assert list(excursions.loc[excursions['Parameter'] == 'Temp', 'Direction']) == ['Over']
+
+
+def test_batch_results_match_the_analysis_of_each_parameter():
+    times, temp, rh = room_readings(0, 0.1)
+    dataset = SensorDataset.from_times(times, {TEMP_COLUMN: temp, RH_COLUMN: rh})
+    table, excursions = batch_results('Room A', dataset, BOUNDS, SWINGS)
+    for parameter, column in PARAMETER_COLUMNS.items():
+        values = dataset[column]
+        assert table.loc[parameter, 'Minimum Value'] == np.round(float(np.nanmin(values)), 2)
+        assert table.loc[parameter, 'Maximum Value'] == np.round(float(np.nanmax(values)), 2)
+        rolling = rolling_swings(values[None, :])[0]
+        assert table.loc[parameter, 'rolling Maximum Swing'] == np.round(rolling.max(), 2)
+        for mode in SWING_UNITS:
+            maxSwing = swing_statistics(calendar_swings(dataset, [column], mode)[1][0], SWINGS[parameter])[0]
+            assert table.loc[parameter, mode + ' Maximum Swing'] == np.round(maxSwing, 2)
+
+
+def test_batch_view_of_bounds_and_swings():
+    results = OrderedDict([('Room A', batch_results('Room A', flat_room(82), BOUNDS, SWINGS)),
+                           ('Room B', batch_results('Room B', flat_room(), BOUNDS, SWINGS))])
+    view, colors = batch_view(results, 'Temp', 'BoundsAnalysis')
+    assert list(view.columns) == BOUNDS_COLUMNS + SUMMARY_COLUMNS
+    assert list(view['Room Name']) == ['Room A', 'Room B']
+    assert list(view['Number of Excursions']) == [1, 0]
+    assert colors == {'Room A': 0.2, 'Room B': 0.7} # over the upper bound, within the bounds
+    view, colors = batch_view(results, 'Temp', 'SwingAnalysis', 'daily')
+    assert list(view.columns) == SWING_COLUMNS
+    assert list(view['Maximum Swing']) == list(view['Maximum Daily Swing']) == [12, 0]
+    assert colors == {'Room A': 0.2, 'Room B': 0.7}
+    view, colors = batch_view(results, 'RH', 'SwingAnalysis')
+    assert list(view['Maximum Swing']) == [0, 0]
+    assert colors == {'Room A': 0.7, 'Room B': 0.7}
+
+
+def test_batch_view_without_rooms():
+    view, colors = batch_view(OrderedDict(), 'Temp', 'SwingAnalysis')
+    assert view.empty and list(view.columns) == SWING_COLUMNS and colors == {}
+
+
+def test_batch_cached_after_batch_analysis(monkeypatch, tmp_path):
+    monkeypatch.setattr(winterthur_store, 'STORE_DIRECTORY', str(tmp_path / 'store'))
+    monkeypatch.setitem(winterthur_cache.RESULTS, 'memory', OrderedDict())
+    monkeypatch.setitem(winterthur_cache.RESULTS, 'memoryBytes', 0)
+    monkeypatch.setitem(winterthur_cache.RESULTS, 'directory', str(tmp_path / 'cache'))
+    times, temp, rh = room_readings(0, 0.1)
+    room = ingest_pm2('Room A.pm2', pm2_contents(pm2_text(times, temp, rh)))
+    selection = [room, pd.Timestamp('2014-01-01').to_pydatetime(), pd.Timestamp('2014-02-01').to_pydatetime(), [],
+                 BOUNDS, SWINGS, 3600, 0]
+    assert not batch_cached(*selection)
+    table, excursions = batch_analysis(*selection)
+    assert batch_cached(*selection)
+    # also after a restart, from the cache folder
+    monkeypatch.setitem(winterthur_cache.RESULTS, 'memory', OrderedDict())
+    assert batch_cached(*selection)
+    otherBounds = OrderedDict(BOUNDS, Temp=(60, 70))
+    assert not batch_cached(*selection[:4] + [otherBounds] + selection[5:])
+    assert batch_cached('Room B.pm2', *selection[1:]) # not in the store, nothing to analyze
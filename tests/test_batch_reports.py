@@ -0,0 +1,40 @@
+import os
+import sys
+from winterthur_data import PARAMETER_COLUMNS
+from winterthur_batch import SUGGESTED_BOUNDS, SUGGESTED_SWING
+from batch_reports import OUTPUT_TABLES, FIRST_DATE, LAST_DATE, find_pm2_files, run_reports, write_reports
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from synthetic_pm2 import write_rooms
+
+SETTINGS = {'start': FIRST_DATE, 'end': LAST_DATE, 'months': [], 'bounds': dict(SUGGESTED_BOUNDS),
+            'swings': {parameter: SUGGESTED_SWING for parameter in PARAMETER_COLUMNS}, 'swingMode': 'daily',
+            'minDuration': 60, 'hysteresis': 0}
+
+
+# contents of the tables written to a folder
+def written_tables(folder):
+    tables = {}
+    for name in OUTPUT_TABLES:
+        with open(os.path.join(folder, name + '.csv')) as f:
+            tables[name] = f.read()
+    return tables
+
+
+def test_rerun_skips_unchanged_files(tmp_path):
+    write_rooms(str(tmp_path / 'input' / 'wing'), 2, 0.1)
+    files = find_pm2_files(str(tmp_path / 'input'))
+    assert [room for room, path in files] == ['wing/room_1.pm2', 'wing/room_2.pm2']
+    cacheFolder = str(tmp_path / 'cache')
+    written = []
+    for run in ['first', 'second']:
+        results, numAnalyzed = run_reports(files, SETTINGS, cacheFolder, workers=2)
+        assert numAnalyzed == (2 if run == 'first' else 0)
+        os.makedirs(str(tmp_path / run))
+        write_reports(results, str(tmp_path / run), ['csv'])
+        written.append(written_tables(str(tmp_path / run)))
+    assert written[0] == written[1]
+    assert all(len(table.splitlines()) > 1 for table in written[0].values())
+    # and analyzed again with other settings
+    results, numAnalyzed = run_reports(files, dict(SETTINGS, hysteresis=1), cacheFolder, workers=2)
+    assert numAnalyzed == 2
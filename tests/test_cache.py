@@ -0,0 +1,79 @@
+import os
+import pickle
+import time
+import threading
+from collections import OrderedDict
+import pytest
+import winterthur_cache
+from winterthur_cache import cached, lookup, save, store_value, stored_value, single_flight, cache_path
+
+
+# save a value with its pickled data, as the cache does
+def save_value(key, value):
+    save(key, value, pickle.dumps(value))
+
+
+@pytest.fixture
+def small_tiers(monkeypatch, tmp_path):
+    # tiers of 400 bytes, with nothing cached yet
+    for name, tier in [('results', winterthur_cache.RESULTS), ('uploads', winterthur_cache.UPLOADS)]:
+        monkeypatch.setitem(tier, 'memory', OrderedDict())
+        monkeypatch.setitem(tier, 'memoryBytes', 0)
+        monkeypatch.setitem(tier, 'maxMemory', 400)
+        monkeypatch.setitem(tier, 'maxDisk', 400)
+        monkeypatch.setitem(tier, 'directory', str(tmp_path / name))
+
+
+def test_single_flight_computes_once():
+    calls = []
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 42
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(single_flight('flight-test', compute)))
+               for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [42] * 5
+    assert len(calls) == 1
+
+
+def test_cached_is_read_back():
+    calls = []
+    def square(x):
+        calls.append(x)
+        return x * x
+    assert cached('fingerprint', [3], square, 3) == 9
+    assert cached('fingerprint', [3], square, 3) == 9
+    assert calls == [3]
+
+
+def test_least_recently_used_is_dropped(small_tiers):
+    for key in ['a', 'b', 'c']:
+        save_value(key, key * 100)
+        time.sleep(0.01)
+    lookup('a') # most recently used
+    time.sleep(0.01)
+    save_value('d', 'd' * 100)
+    assert list(winterthur_cache.RESULTS['memory']) == ['c', 'a', 'd']
+    # reads from memory do not touch the files, so the folder drops the oldest file
+    assert not os.path.exists(cache_path('a'))
+    assert os.path.exists(cache_path('b'))
+    assert lookup('b') == (True, 'b' * 100)
+
+
+def test_results_do_not_drop_stored_values(small_tiers):
+    key = store_value('uploaded data')
+    for i in range(10):
+        save_value('result{}'.format(i), str(i) * 100)
+    assert stored_value(key) == 'uploaded data'
+    winterthur_cache.UPLOADS['memory'].clear()
+    assert stored_value(key) == 'uploaded data' # read back from the uploads folder
+
+
+def test_missing_stored_value():
+    with pytest.raises(LookupError):
+        stored_value('0' * 40)
@@ -0,0 +1,96 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from winterthur_data import TEMP_COLUMN, RH_COLUMN, DP_COLUMN, read_pm2, filter_data, dew_point
+from winterthur_dataset import SensorDataset
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from synthetic_pm2 import synthetic_pm2
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return read_pm2(synthetic_pm2(0, 0.5))
+
+
+@pytest.mark.parametrize('startDate, endDate, monthsArray', [
+    ('2014-01-01', '2015-01-01', []),
+    ('2014-02-10 12:00', '2014-05-03 06:15', []),
+    ('2014-01-01', '2015-01-01', [2, 4]),
+    ('2014-03-01', '2014-03-01 00:15', list(range(1, 13))), # a single reading
+    ('2014-03-01', '2014-03-01 00:10', []), # no readings
+    ('2016-01-01', '2017-01-01', []), # after the data
+])
+def test_select_matches_filter_data(frame, startDate, endDate, monthsArray):
+    expected = filter_data(frame, startDate, endDate, monthsArray)
+    subset = SensorDataset.from_frame(frame).select(startDate, endDate, monthsArray)
+    assert len(subset) == len(expected)
+    assert np.array_equal(subset.times, expected.index.values.astype('datetime64[ns]'))
+    assert np.array_equal(subset[TEMP_COLUMN], expected[TEMP_COLUMN].to_numpy(dtype=np.float32))
+    assert np.array_equal(subset.month, expected['month'].to_numpy())
+
+
+def test_calendar_fields_and_derived_channels(frame):
+    dataset = SensorDataset.from_frame(frame)
+    for field in ['year', 'month', 'dayofyear', 'hour']:
+        assert np.array_equal(dataset.calendar(field), frame[field].to_numpy())
+    dewPoint = dataset[DP_COLUMN]
+    assert dewPoint.dtype == np.float32
+    assert np.allclose(dewPoint, dew_point(frame[TEMP_COLUMN], frame[RH_COLUMN]), atol=1e-3)
+
+
+def test_times_are_stored_exactly():
+    times = pd.DatetimeIndex(['2020-01-01 00:00', '2020-01-01 00:15', '2020-01-01 00:20', '2020-03-01 10:05'])
+    dataset = SensorDataset.from_times(times.values, {TEMP_COLUMN: [1, 2, 3, 4], RH_COLUMN: [5, 6, 7, 8]})
+    assert np.array_equal(dataset.times, times.values.astype('datetime64[ns]'))
+    assert dataset.step == 5 * 60 * 10 ** 9
+
+
+def test_empty_and_single_reading():
+    empty = SensorDataset.from_times(np.zeros(0, dtype='datetime64[ns]'), {TEMP_COLUMN: [], RH_COLUMN: []})
+    assert len(empty) == 0
+    assert len(empty.select('2020-01-01', '2021-01-01', [1])) == 0
+    single = SensorDataset.from_times(np.array(['2020-06-01T12:00'], dtype='datetime64[ns]'),
+                                      {TEMP_COLUMN: [70], RH_COLUMN: [50]})
+    assert single.month.tolist() == [6]
+    assert len(single.select('2020-06-01', '2020-06-02', [6])) == 1
+    assert len(single.select('2020-06-01', '2020-06-02', [7])) == 0
+
+
+# readings every 15 minutes from a time in GMT, with the temperature counting up from 0
+def gmt_readings(start, numReadings):
+    times = pd.date_range(start, periods=numReadings, freq='15min').values
+    return SensorDataset.from_times(times, {TEMP_COLUMN: np.arange(numReadings), RH_COLUMN: np.full(numReadings, 50)})
+
+
+def test_local_bucket_when_daylight_saving_time_ends():
+    # 2019-11-03 04:00 to 08:00 GMT is 00:00 EDT to 03:00 EST; the hour from 01:00 comes twice
+    dataset = gmt_readings('2019-11-03 04:00', 17)
+    hours = dataset.local_bucket('h')
+    assert np.all(np.diff(hours) >= 0)
+    assert np.all(hours[4:12] == hours[4]) # 01:00 EDT to 01:45 EST
+    assert np.array_equal(np.unique(hours) - hours[0], [0, 1, 2, 3])
+    assert len(np.unique(dataset.local_bucket('D'))) == 1
+
+
+def test_local_bucket_when_daylight_saving_time_starts():
+    # 2019-03-10 06:00 to 08:00 GMT is 01:00 EST to 04:00 EDT; there is no hour from 02:00
+    dataset = gmt_readings('2019-03-10 06:00', 9)
+    hours = dataset.local_bucket('h') - dataset.local_bucket('h')[0]
+    assert hours.tolist() == [0, 0, 0, 0, 2, 2, 2, 2, 3]
+    assert len(np.unique(dataset.local_bucket('D'))) == 1
+
+
+def test_local_bucket_days_and_weeks_start_at_local_midnight():
+    # 2019-03-04 04:45 GMT is 23:45 EST on Sunday 3 March; 05:00 GMT is midnight on Monday
+    dataset = gmt_readings('2019-03-04 04:45', 2)
+    days = dataset.local_bucket('D')
+    weeks = dataset.local_bucket('W')
+    assert days[1] == days[0] + 1
+    assert weeks[1] == weeks[0] + 1
+    # the Sunday is in the week that started on Monday 25 February
+    monday = gmt_readings('2019-02-25 05:00', 1)
+    assert monday.local_bucket('W')[0] == weeks[0]
+    assert gmt_readings('2019-02-25 04:45', 1).local_bucket('W')[0] == weeks[0] - 1
@@ -0,0 +1,75 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from winterthur_data import sample_durations
+from winterthur_excursions import find_excursions, excursion_summary, EXCURSION_COLUMNS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from synthetic_pm2 import room_readings
+
+
+def quarter_hours(n):
+    return pd.date_range('2020-01-01', periods=n, freq='15min').values.astype('datetime64[ns]').astype(np.int64)
+
+
+def test_reading_at_the_bound_is_out():
+    values = [60, 60, 70, 70, 60]
+    excursions = find_excursions('Room', quarter_hours(5), values, None, 70)
+    assert len(excursions) == 1
+    assert excursions['Duration (hours)'][0] == 0.5
+    assert excursions['Peak Deviation'][0] == 0
+
+
+def test_hysteresis_joins_readings_hovering_at_the_bound():
+    values = [60, 71, 69.5, 71, 69.5, 71, 60, 60]
+    assert len(find_excursions('Room', quarter_hours(8), values, None, 70)) == 3
+    excursions = find_excursions('Room', quarter_hours(8), values, None, 70, hysteresis=1)
+    assert len(excursions) == 1
+    # the readings back inside the bounds are not counted
+    assert excursions['Duration (hours)'][0] == 0.75
+    assert excursions['End'][0] == pd.Timestamp('2020-01-01 01:30')
+    assert excursions['Peak Deviation'][0] == 1
+
+
+def test_hysteresis_does_not_lengthen_a_blip():
+    values = [60, 71] + [69.5] * 20 + [60]
+    excursions = find_excursions('Room', quarter_hours(23), values, None, 70, minDuration=60 * 60, hysteresis=1)
+    assert len(excursions) == 0
+
+
+@pytest.mark.parametrize('hysteresis', [0, 0.5, 2])
+def test_excursion_hours_are_time_out_of_bounds(hysteresis):
+    times, temp, rh = room_readings(0, 1)
+    times = times.astype('datetime64[ns]').astype(np.int64)
+    excursions = find_excursions('Room', times, temp, 63, 74, 0, hysteresis)
+    durations = sample_durations(times, np.zeros(1, dtype=np.int64), np.array([len(times)]))
+    hoursOut = durations[(temp <= 63) | (temp >= 74)].sum() / 3600
+    assert excursions['Duration (hours)'].sum() == pytest.approx(hoursOut)
+
+
+def test_minimum_duration_and_directions():
+    values = [50, 35, 35, 35, 50, 75, 50]
+    excursions = find_excursions('Room', quarter_hours(7), values, 40, 70, minDuration=30 * 60)
+    assert excursions['Direction'].tolist() == ['Under']
+    assert excursions['Degree-Hours'][0] == 5 * 0.75
+
+
+def test_gap_ends_an_excursion():
+    times = np.append(quarter_hours(3), quarter_hours(3)[-1] + np.int64(6 * 3600 * 10 ** 9))
+    excursions = find_excursions('Room', times, [80, 80, 80, 80], None, 70)
+    assert len(excursions) == 2
+
+
+def test_empty_selection():
+    excursions = find_excursions('Room', np.zeros(0, dtype=np.int64), np.zeros(0), 40, 70)
+    assert list(excursions.columns) == EXCURSION_COLUMNS
+    assert len(excursions) == 0
+    summary = excursion_summary(excursions, ['Room'])
+    assert summary.loc['Room', 'Number of Excursions'] == 0
+
+
+def test_single_reading():
+    excursions = find_excursions('Room', quarter_hours(1), [80], None, 70)
+    assert len(excursions) == 1
@@ -0,0 +1,131 @@
+import time
+import threading
+import multiprocessing
+import pytest
+import winterthur_jobs
+from winterthur_data import dataset_key
+from winterthur_jobs import submit_job, cancel_job, job_status, job_result, job_outputs, job_table, JobCancelled
+
+
+@pytest.fixture(autouse=True)
+def jobs_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(winterthur_jobs, 'JOBS_DIRECTORY', str(tmp_path))
+
+
+RELEASE = threading.Event()
+
+
+# a job that runs until RELEASE is set, reporting progress (and so stopping once cancelled) as it waits
+def waiting_job(value, progress):
+    while not RELEASE.wait(0.02):
+        progress(0.5, 'Waiting')
+    return value * 2
+
+
+def wait_for(jobId, statuses, timeout=5):
+    deadline = time.time() + timeout
+    while job_status(jobId)['status'] not in statuses:
+        assert time.time() < deadline, job_status(jobId)
+        time.sleep(0.02)
+    return job_status(jobId)
+
+
+def test_result():
+    RELEASE.set()
+    jobId = submit_job(waiting_job, 21)
+    assert wait_for(jobId, ['done'])['progress'] == 1
+    assert job_result(jobId) == 42
+    assert job_outputs(jobId, 1) == [42, True, None]
+
+
+def test_same_arguments_share_a_job():
+    RELEASE.clear()
+    try:
+        jobId = submit_job(waiting_job, 1)
+        assert submit_job(waiting_job, 1) == jobId
+        assert submit_job(waiting_job, 2) != jobId
+    finally:
+        RELEASE.set()
+    wait_for(jobId, ['done'])
+    assert submit_job(waiting_job, 1) != jobId # a finished job is not reused
+
+
+def test_cancel():
+    RELEASE.clear()
+    try:
+        jobId = submit_job(waiting_job, 3)
+        wait_for(jobId, ['running'])
+        future = winterthur_jobs.FUTURES[jobId]
+        cancel_job(jobId)
+        future.result(timeout=5) # the job stops at its next progress report, before it is released
+        assert job_status(jobId)['status'] == 'cancelled'
+        assert submit_job(waiting_job, 3) != jobId
+    finally:
+        RELEASE.set()
+
+
+def test_orphaned_job_is_failed():
+    # a running job of a process that stopped: nothing updates it any more
+    with job_table() as db, db:
+        db.execute('INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   ('orphan', 'key', 'running', 0.5, '', time.time() - 3600, time.time() - 3600))
+    status = job_status('orphan')
+    assert status['status'] == 'failed'
+    assert status['message'] == winterthur_jobs.ORPHANED
+    assert 'failed' in str(job_outputs('orphan', 1)[2])
+
+
+def test_orphaned_job_is_not_reused():
+    RELEASE.set()
+    jobId = submit_job(waiting_job, 4)
+    wait_for(jobId, ['done'])
+    with job_table() as db, db:
+        db.execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ?", (time.time() - 3600, jobId))
+    newId = submit_job(waiting_job, 4)
+    assert newId != jobId
+    assert job_status(jobId)['status'] == 'failed'
+    wait_for(newId, ['done'])
+
+
+def test_cancelled_progress_raises():
+    with job_table() as db, db:
+        db.execute('INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   ('cancelled', 'key', 'cancelled', 0, '', time.time(), time.time()))
+    with pytest.raises(JobCancelled):
+        winterthur_jobs.report_progress('cancelled', 0.5)
+
+
+
+def sleeping_job(seconds, round, progress):
+    time.sleep(seconds)
+    return round
+
+
+# submit the job of every round as soon as all the processes are ready for it
+def submit_in_process(directory, rounds, barrier, ids):
+    winterthur_jobs.JOBS_DIRECTORY = directory
+    for round in range(rounds):
+        barrier.wait()
+        ids.put((round, submit_job(sleeping_job, 0.2, round)))
+
+
+def test_processes_submitting_at_once_share_a_job(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    numProcesses, rounds = 6, 10
+    barrier = context.Barrier(numProcesses)
+    ids = context.Queue()
+    processes = [context.Process(target=submit_in_process, args=(str(tmp_path), rounds, barrier, ids))
+                 for i in range(numProcesses)]
+    for process in processes:
+        process.start()
+    found = [ids.get(timeout=120) for i in range(numProcesses * rounds)]
+    for process in processes:
+        process.join()
+    for round in range(rounds):
+        assert len({jobId for jobRound, jobId in found if jobRound == round}) == 1
+
+
+def test_uploads_are_compared_by_content_key():
+    upload = 'data:application/octet-stream;base64,' + 'QUJD' * 1000
+    arguments = winterthur_jobs.job_arguments(([upload, upload], 'room.pm2', 3))
+    assert arguments == [[('upload', dataset_key(upload))] * 2, 'room.pm2', 3]
@@ -0,0 +1,50 @@
+import os
+import json
+import time
+import pytest
+import winterthur_metrics
+from winterthur_metrics import measure, read_snapshots, write_snapshot, RETIRED_NAME
+
+
+@pytest.fixture
+def metrics_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(winterthur_metrics, 'METRICS_DIRECTORY', str(tmp_path))
+    monkeypatch.setattr(winterthur_metrics, 'TOTALS', {})
+    return tmp_path
+
+
+def write_process(directory, name, pid, calls, age=0):
+    totals = dict(winterthur_metrics.new_totals(), calls=calls, seconds=calls * 0.1)
+    path = os.path.join(str(directory), name)
+    with open(path, 'w') as f:
+        json.dump({'pid': pid, 'maxResidentBytes': 1000, 'totals': [['stage', {'stage': 'parse'}, totals]]}, f)
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def parse_calls(snapshots):
+    totals, processes = snapshots
+    return totals[('stage', (('stage', 'parse'),))]['calls']
+
+
+def test_calls_are_added_up(metrics_directory):
+    with measure('stage', {'stage': 'parse'}):
+        pass
+    write_snapshot()
+    write_process(metrics_directory, '1-a.json', 1, 3)
+    totals, processes = read_snapshots()
+    assert parse_calls((totals, processes)) == 4
+    assert sorted(process['pid'] for process in processes) == sorted([1, os.getpid()])
+
+
+def test_stopped_processes_are_retired(metrics_directory):
+    write_process(metrics_directory, '1-a.json', 1, 3, age=3600)
+    write_process(metrics_directory, '2-b.json', 2, 5, age=3600)
+    write_process(metrics_directory, '3-c.json', 3, 7)
+    snapshots = read_snapshots()
+    assert parse_calls(snapshots) == 15
+    assert [process['pid'] for process in snapshots[1]] == [3]
+    assert sorted(os.listdir(str(metrics_directory))) == ['3-c.json', RETIRED_NAME]
+    # the retired totals keep counting, and are only added once
+    write_process(metrics_directory, '4-d.json', 4, 1, age=3600)
+    assert parse_calls(read_snapshots()) == 16
+    assert parse_calls(read_snapshots()) == 16
@@ -0,0 +1,29 @@
+# the checks of benchmarks/parity.py as tests, on a few months of synthetic readings
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import parity
+from synthetic_pm2 import synthetic_pm2
+
+YEARS = 0.25
+
+
+@pytest.fixture(scope='module')
+def room():
+    return parity.prepare(synthetic_pm2(0, YEARS))
+
+
+@pytest.mark.parametrize('check', parity.ROOM_CHECKS, ids=[check[0] for check in parity.ROOM_CHECKS])
+def test_room_check(room, check):
+    for row in parity.run_check('synthetic', check, [room]):
+        assert row['passed'], row
+
+
+@pytest.mark.parametrize('check', parity.FILE_CHECKS, ids=[check[0] for check in parity.FILE_CHECKS])
+def test_file_check(check):
+    names = ['room_1', 'room_2']
+    contents = [synthetic_pm2(room, YEARS) for room in range(len(names))]
+    for row in parity.run_check('synthetic', check, [names, contents]):
+        assert row['passed'], row
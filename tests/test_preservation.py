@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from winterthur_data import TEMP_COLUMN, RH_COLUMN
+from winterthur_dataset import SensorDataset
+from winterthur_preservation import (PI_REFERENCE_TEMP, PI_REFERENCE_RH, PI_REFERENCE_YEARS, critical_rh,
+                                     mould_growth_rate, moving_average, preservation_indices)
+
+
+# readings every 15 minutes from start, at the temperature (F) and RH given (one value for all readings, or one for
+# each)
+def room(start, numReadings, tempF, RH):
+    times = pd.date_range(start, periods=numReadings, freq='15min').values
+    return SensorDataset.from_times(times, {TEMP_COLUMN: np.broadcast_to(tempF, numReadings).astype(float),
+                                            RH_COLUMN: np.broadcast_to(RH, numReadings).astype(float)})
+
+
+def fahrenheit(celsius):
+    return np.asarray(celsius) * 9 / 5 + 32
+
+
+def test_twpi_at_the_reference_conditions():
+    indices = preservation_indices([room('2019-01-01', 2000, fahrenheit(PI_REFERENCE_TEMP), PI_REFERENCE_RH)])
+    assert indices['twpi'][0] == pytest.approx(PI_REFERENCE_YEARS, rel=1e-5)
+    assert indices['hours'][0] == pytest.approx(2000 * 0.25)
+
+
+def test_twpi_is_lower_when_warmer_or_damper():
+    reference = room('2019-01-01', 100, fahrenheit(PI_REFERENCE_TEMP), PI_REFERENCE_RH)
+    warmer = room('2019-01-01', 100, fahrenheit(PI_REFERENCE_TEMP + 5), PI_REFERENCE_RH)
+    damper = room('2019-01-01', 100, fahrenheit(PI_REFERENCE_TEMP), 2 * PI_REFERENCE_RH)
+    twpi = preservation_indices([reference, warmer, damper])['twpi']
+    assert twpi[1] < twpi[0] and twpi[2] == pytest.approx(twpi[0] / 2, rel=1e-5)
+
+
+@pytest.mark.parametrize('temp', [5, 12, 20, 25, 40])
+def test_no_mould_progress_below_the_critical_rh(temp):
+    critical = float(critical_rh(np.array(temp)))
+    below = np.linspace(critical - 30, critical - 0.01, 50)
+    assert np.all(mould_growth_rate(np.full(len(below), float(temp)), below) == 0)
+    assert mould_growth_rate(np.array([float(temp)]), np.array([min(critical + 5, 100)]))[0] > 0
+    indices = preservation_indices([room('2019-01-01', 2000, fahrenheit(temp), critical - 1)])
+    assert indices['mould'][0] == 0
+
+
+def test_mould_progress_of_a_damp_period():
+    # two days at 25 C and 95 %, time to mould growth exp(-0.68 ln(25) - 13.9 ln(95) + 66.02) weeks
+    weeks = np.exp(-0.68 * np.log(25) - 13.9 * np.log(95) + 66.02)
+    RH = np.full(400, 60.0)
+    RH[100:292] = 95
+    indices = preservation_indices([room('2019-01-01', 400, fahrenheit(25), RH)])
+    assert indices['mould'][0] == pytest.approx(2 / (weeks * 7), rel=1e-4)
+
+
+def test_no_mechanical_risk_at_a_constant_rh():
+    indices = preservation_indices([room('2019-01-01', 10000, 68, 45)])
+    assert indices['mechanical'][0] == 0
+
+
+def test_mechanical_risk_of_a_step():
+    # a step of 30 % halfway through 60 days: within d days of the step the 30-day moving average is 15 - d % away,
+    # so more than 10 % for 5 days either side
+    RH = np.where(np.arange(60 * 96) < 30 * 96, 40.0, 70.0)
+    indices = preservation_indices([room('2019-01-01', 60 * 96, 68, RH)])
+    assert indices['mechanical'][0] == pytest.approx(100 * 10 / 60, abs=0.5)
+
+
+@pytest.mark.parametrize('secondStart', ['2019-01-01', '2019-01-11', '2019-01-21 00:15'])
+def test_moving_averages_of_rooms_are_separate(secondStart):
+    # the rooms are at the same time, overlap, or follow each other
+    dry = room('2019-01-01', 20 * 96, 68, 30)
+    damp = room(secondStart, 20 * 96, 68, 70)
+    indices = preservation_indices([dry, damp, room('2019-01-01', 0, 68, 50)])
+    assert list(indices['mechanical'][:2]) == [0, 0]
+    assert np.isnan(indices['twpi'][2])
+    times = np.concatenate([dry.times, damp.times]).astype(np.int64)
+    values = np.concatenate([dry[RH_COLUMN], damp[RH_COLUMN]]).astype(float)
+    roomIds = np.repeat([0, 1], [len(dry), len(damp)])
+    average = moving_average(times, values, np.full(len(times), 900.0), roomIds)
+    assert np.allclose(average, values)
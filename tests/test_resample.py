@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from winterthur_data import resample_frame, resample_chunks
+
+
+# one-minute readings with a gap shorter and a gap longer than MAX_INTERPOLATION_GAP
+def minute_readings():
+    times = pd.date_range('2020-01-01', periods=600, freq='min')
+    df = pd.DataFrame({'Temp': np.sin(np.arange(600) / 50.0) * 5 + 20, 'RH': np.arange(600) % 40 + 30.0},
+                      index=pd.DatetimeIndex(times, name='Date/Time'))
+    keep = np.ones(600, dtype=bool)
+    keep[100:190] = False
+    keep[300:480] = False
+    df = df[keep]
+    df.loc[df.index[20:60], 'RH'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('size', [1, 3, 10, 14, 97])
+def test_chunks_match_single_pass(size):
+    df = minute_readings()
+    expected, expectedImputed = resample_frame(df)
+    pieces = list(resample_chunks(df.iloc[i:i + size] for i in range(0, len(df), size)))
+    result = pd.concat([result for result, imputed in pieces])
+    imputed = pd.concat([imputed for result, imputed in pieces])
+    pd.testing.assert_frame_equal(result, expected)
+    pd.testing.assert_frame_equal(imputed, expectedImputed)
+
+
+def test_single_reading():
+    df = minute_readings().iloc[:1]
+    pieces = list(resample_chunks([df]))
+    result = pd.concat([result for result, imputed in pieces])
+    pd.testing.assert_frame_equal(result, resample_frame(df)[0])
+
+
+def test_unsorted_chunks():
+    df = minute_readings()
+    with pytest.raises(ValueError):
+        list(resample_chunks([df.iloc[200:], df.iloc[:10]]))
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from winterthur_setpoints import setpoint_bounds, setpoint_table, running_mean
+
+
+def times_of(*dates):
+    return pd.DatetimeIndex(dates).values.astype('datetime64[ns]').astype(np.int64)
+
+
+def monthly_table():
+    table = setpoint_table(60, 70)
+    table[0]['Minimum'], table[0]['Maximum'] = 55, 65 # January
+    table[6]['Minimum'], table[6]['Maximum'] = 65, 75 # July
+    table[3]['Maximum'] = '' # empty cells use the fixed bounds
+    return table
+
+
+def test_fixed():
+    assert setpoint_bounds(times_of('2020-01-01'), [65], 'fixed', 60, 70) == (60, 70)
+    assert setpoint_bounds(times_of('2020-01-01'), [65], None, 60, 70) == (60, 70)
+
+
+def test_monthly():
+    times = times_of('2020-01-31 23:45', '2020-02-01', '2020-04-10', '2020-07-15')
+    lower, upper = setpoint_bounds(times, np.zeros(4), 'monthly', 60, 70, monthly_table())
+    assert lower.tolist() == [55, 60, 60, 65]
+    assert upper.tolist() == [65, 70, 70, 75]
+
+
+def test_ramped():
+    times = times_of('2019-01-16', '2019-02-15', '2019-12-31', '2019-07-16')
+    lower, upper = setpoint_bounds(times, np.zeros(4), 'ramped', 60, 70, monthly_table())
+    # the monthly set-points apply in the middle of each month, and are interpolated across the new year
+    assert lower[0] == 55 and lower[3] == 65
+    assert 55 < lower[1] < 60
+    assert 55 < lower[2] < 60
+    assert upper[0] == 65 and upper[3] == 75
+
+
+def test_floating_band_is_kept_within_the_fixed_bounds():
+    times = pd.date_range('2020-01-01', periods=24 * 60, freq='h').values.astype('datetime64[ns]').astype(np.int64)
+    values = np.linspace(50, 80, len(times))
+    lower, upper = setpoint_bounds(times, values, 'floating', 55, 75, band=3)
+    mean = running_mean(times, values, np.timedelta64(30, 'D'))
+    assert np.allclose(lower, np.maximum(mean - 3, 55))
+    assert np.allclose(upper, np.minimum(mean + 3, 75))
+    assert lower.min() == 55 and upper.max() <= 75
+
+
+def test_running_mean_leaves_out_missing_values():
+    times = times_of('2020-01-01', '2020-01-02', '2020-01-03', '2020-03-01')
+    mean = running_mean(times, [1, np.nan, 3, 10], np.timedelta64(30, 'D'))
+    assert mean.tolist() == [1, 1, 2, 10]
+
+
+def test_empty_selection():
+    lower, upper = setpoint_bounds(np.zeros(0, dtype=np.int64), np.zeros(0), 'ramped', 60, 70, monthly_table())
+    assert len(lower) == len(upper) == 0
+    lower, upper = setpoint_bounds(np.zeros(0, dtype=np.int64), np.zeros(0), 'floating', 60, 70, band=2)
+    assert len(lower) == 0
@@ -0,0 +1,90 @@
+import os
+import sys
+import pandas as pd
+import pytest
+import winterthur_store
+from winterthur_data import read_pm2
+from winterthur_store import ingest_pm2, query_room, load_room, list_rooms, room_directory
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from synthetic_pm2 import room_readings, pm2_text, pm2_contents
+
+FIRST_DATE = pd.Timestamp('1900-01-01')
+LAST_DATE = pd.Timestamp('2100-01-01')
+
+
+@pytest.fixture(autouse=True)
+def store_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(winterthur_store, 'STORE_DIRECTORY', str(tmp_path))
+
+
+# contents of an export of the first numRows readings of a logger
+def export(numRows, room=0):
+    times, temp, rh = room_readings(room, 0.25)
+    return pm2_contents(pm2_text(times[:numRows], temp[:numRows], rh[:numRows]))
+
+
+def stored_rows(room):
+    return len(query_room(room, FIRST_DATE, LAST_DATE, []))
+
+
+def test_grown_export_is_appended():
+    assert ingest_pm2('Room A.pm2', export(3000)) == 'Room A.pm2'
+    directory = room_directory('Room A.pm2')
+    january = [os.path.join(directory, '2014', name) for name in os.listdir(os.path.join(directory, '2014'))
+               if name.startswith('01')]
+    assert january
+    modified = [os.path.getmtime(path) for path in january]
+    assert ingest_pm2('Room A.pm2', export(5000)) == 'Room A.pm2'
+    assert stored_rows('Room A.pm2') == len(read_pm2(export(5000)))
+    # the full months stored before are not written again
+    assert [os.path.getmtime(path) for path in january] == modified
+    assert winterthur_store.read_manifest('Room A.pm2')['rows'] == len(read_pm2(export(5000)))
+    assert list_rooms() == ['Room A.pm2']
+
+
+def test_same_file_is_ingested_once():
+    ingest_pm2('Room A.pm2', export(3000))
+    modified = os.path.getmtime(os.path.join(room_directory('Room A.pm2'), 'manifest.json'))
+    assert ingest_pm2('Room A.pm2', export(3000)) == 'Room A.pm2'
+    assert os.path.getmtime(os.path.join(room_directory('Room A.pm2'), 'manifest.json')) == modified
+
+
+def test_other_file_becomes_a_version():
+    ingest_pm2('Room A.pm2', export(5000))
+    # a shorter export, or a file of another logger, does not replace the stored history
+    assert ingest_pm2('Room A.pm2', export(2000)) == 'Room A.pm2 (version 2)'
+    assert ingest_pm2('Room A.pm2', export(2000, room=1)) == 'Room A.pm2 (version 3)'
+    assert stored_rows('Room A.pm2') == len(read_pm2(export(5000)))
+    assert stored_rows('Room A.pm2 (version 2)') == len(read_pm2(export(2000)))
+    # a grown export of a version is appended to that version
+    assert ingest_pm2('Room A.pm2', export(2500, room=1)) == 'Room A.pm2 (version 3)'
+    assert stored_rows('Room A.pm2 (version 3)') == len(read_pm2(export(2500, room=1)))
+
+
+def test_same_name_rooms_are_kept_apart():
+    ingest_pm2('Room A.pm2', export(2000))
+    ingest_pm2('Room_A.pm2', export(3000, room=1))
+    assert list_rooms() == ['Room A.pm2', 'Room_A.pm2']
+    assert room_directory('Room A.pm2') != room_directory('Room_A.pm2')
+    assert stored_rows('Room A.pm2') == len(read_pm2(export(2000)))
+    assert stored_rows('Room_A.pm2') == len(read_pm2(export(3000, room=1)))
+
+
+def test_selection():
+    ingest_pm2('Room A.pm2', export(5000))
+    frame = read_pm2(export(5000))
+    expected = frame[(frame.index > '2014-01-10') & (frame.index <= '2014-02-20') & frame['month'].isin([2])]
+    assert len(query_room('Room A.pm2', '2014-01-10', '2014-02-20', [2])) == len(expected)
+    assert len(query_room('Room A.pm2', '2016-01-01', '2017-01-01', [])) == 0
+
+
+def test_single_reading():
+    assert ingest_pm2('Room B.pm2', export(1)) == 'Room B.pm2'
+    assert stored_rows('Room B.pm2') == 1
+    assert load_room('Room B.pm2', FIRST_DATE, LAST_DATE, []) is not None
+
+
+def test_missing_room():
+    assert load_room('Room C.pm2', FIRST_DATE, LAST_DATE, []) is None
+    assert query_room('Room C.pm2', FIRST_DATE, LAST_DATE, []) is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from winterthur_data import TEMP_COLUMN, RH_COLUMN
+from winterthur_dataset import SensorDataset
+from winterthur_swing import calendar_swings, swing_statistics
+
+
+# readings at the times (GMT) with the temperature counting up from 0, so the swing of a period is its number of
+# readings less one
+def counting_readings(times):
+    times = pd.DatetimeIndex(times).values
+    return SensorDataset.from_times(times, {TEMP_COLUMN: np.arange(len(times)), RH_COLUMN: np.full(len(times), 50)})
+
+
+def every_15_minutes(start, numReadings):
+    return counting_readings(pd.date_range(start, periods=numReadings, freq='15min'))
+
+
+def local(times):
+    return pd.DatetimeIndex(times).values.astype('datetime64[ns]')
+
+
+def test_days_across_the_end_of_daylight_saving_time():
+    # local days from 2 November 2019 (EDT); 3 November has 25 hours
+    dataset = every_15_minutes('2019-11-02 04:00', 96 + 100 + 96)
+    starts, swings = calendar_swings(dataset, [TEMP_COLUMN], 'daily')
+    assert np.array_equal(starts, local(['2019-11-02', '2019-11-03', '2019-11-04']))
+    assert swings[0].tolist() == [95, 99, 95]
+
+
+def test_days_across_the_start_of_daylight_saving_time():
+    # 10 March 2019 has 23 hours
+    dataset = every_15_minutes('2019-03-09 05:00', 96 + 92 + 96)
+    starts, swings = calendar_swings(dataset, [TEMP_COLUMN], 'daily')
+    assert np.array_equal(starts, local(['2019-03-09', '2019-03-10', '2019-03-11']))
+    assert swings[0].tolist() == [95, 91, 95]
+
+
+def test_the_repeated_hour_is_one_period():
+    # 2019-11-03 04:00 to 07:45 GMT is 00:00 EDT to 02:45 EST; the local hour from 01:00 has 8 readings
+    dataset = every_15_minutes('2019-11-03 04:00', 16)
+    starts, swings = calendar_swings(dataset, [TEMP_COLUMN], 'hourly')
+    assert np.array_equal(starts, local(['2019-11-03 00:00', '2019-11-03 01:00', '2019-11-03 02:00']))
+    assert swings[0].tolist() == [3, 7, 3]
+
+
+def test_weeks_start_on_local_monday():
+    # Sunday 3 March 2019 from 22:00 EST to Monday 02:00 EST
+    dataset = every_15_minutes('2019-03-04 03:00', 17)
+    starts, swings = calendar_swings(dataset, [TEMP_COLUMN, RH_COLUMN], 'weekly')
+    assert np.array_equal(starts, local(['2019-03-03 22:00', '2019-03-04 00:00']))
+    assert swings.tolist() == [[7, 8], [0, 0]]
+
+
+def test_single_reading_periods_have_no_swing():
+    # local hours with one, two and one reading; the last day has a single reading
+    dataset = counting_readings(['2019-06-01 04:10', '2019-06-01 05:00', '2019-06-01 05:30', '2019-06-01 06:45',
+                                 '2019-06-02 04:00'])
+    starts, swings = calendar_swings(dataset, [TEMP_COLUMN], 'hourly')
+    assert len(starts) == 4
+    assert np.isnan(swings[0, [0, 2, 3]]).all() and swings[0, 1] == 1
+    assert swing_statistics(swings[0], 1) == (1, 1, 1)
+    starts, swings = calendar_swings(dataset, [TEMP_COLUMN], 'daily')
+    assert swings[0, 0] == 3 and np.isnan(swings[0, 1])
+
+
+def test_no_readings():
+    starts, swings = calendar_swings(every_15_minutes('2019-06-01', 0), [TEMP_COLUMN, RH_COLUMN], 'daily')
+    assert len(starts) == 0 and swings.shape == (2, 0)
@@ -0,0 +1,47 @@
+# app factory of the interfaces: each interface module defines its layout and registers its callbacks on a
+# CallbackRegistry instead of a module-level app, and make_app builds a Dash app from them. An interface can then
+# run on its own (python <interface>.py, with the Flask development server) or be mounted with the others under one
+# WSGI application served by several worker processes (see wsgi.py and gunicorn.conf.py)
+# every callback is measured and the totals are served at /metrics of the server (see winterthur_metrics.py)
+# import needed packages
+import os
+import dash
+from dash.exceptions import PreventUpdate
+from winterthur_metrics import instrument_server, measured_callback
+
+# stylesheets and scripts shared by every interface
+ASSETS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+
+# callbacks of an interface, collected with the same decorator as app.callback and added to each app made
+# clientside callbacks (JavaScript functions of assets/clientside.js, run in the browser) are collected the same way
+class CallbackRegistry:
+    def __init__(self):
+        self.callbacks = []
+        self.clientsideCallbacks = []
+
+    def callback(self, *args, **kwargs):
+        def register(function):
+            self.callbacks.append((args, kwargs, function))
+            return function
+        return register
+
+    def clientside_callback(self, *args, **kwargs):
+        self.clientsideCallbacks.append((args, kwargs))
+
+    def register(self, app):
+        for args, kwargs, function in self.callbacks:
+            app.callback(*args, **kwargs)(measured_callback(function, args[0], PreventUpdate))
+        for args, kwargs in self.clientsideCallbacks:
+            app.clientside_callback(*args, **kwargs)
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# Dash app of an interface; server is the Flask server to mount it on (True for a server of its own) and prefix the
+# URL path it is served under
+def make_app(name, layout, callbacks, server=True, prefix='/'):
+    app = dash.Dash(name, server=server, url_base_pathname=prefix, assets_folder=ASSETS_FOLDER)
+    app.layout = layout
+    callbacks.register(app)
+    instrument_server(app.server)
+    return app
@@ -0,0 +1,182 @@
+# batched bounds and swing analysis: every parameter (temperature, RH and the derived channels) of a room is analyzed
+# in one pass over its readings stacked as a (parameter x time) array, giving one results table per room with a row
+# for each parameter. The tables are cached, so the interfaces can show another parameter (or switch between bounds
+# and swing) by re-rendering a cached table instead of reading and analyzing the files again (see winterthur_cache).
+# import needed packages
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+from winterthur_data import PARAMETER_COLUMNS
+from winterthur_store import MISSING_ROOM, read_manifest, load_room
+from winterthur_cache import cached, is_cached
+from winterthur_swing import ROLLING_SWING_POINTS, SWING_UNITS, calendar_swings, rolling_swings, swing_statistics
+from winterthur_excursions import EXCURSION_COLUMNS, SUMMARY_COLUMNS, find_excursions, excursion_summary
+from winterthur_metrics import stage
+
+# suggested minimum and maximum of each parameter, and the suggested maximum swing
+SUGGESTED_BOUNDS = OrderedDict([('Temp', (63, 74)), ('RH', (35, 57)), ('DP', (37, 56)), ('AH', (5, 12)),
+                                ('HR', (4, 10)), ('EMC', (7, 11))])
+SUGGESTED_SWING = 10
+# columns of the bounds and swing tables of the interfaces
+BOUNDS_COLUMNS = ['Room Name', 'Minimum Value', 'Maximum Value', 'Percent Out of Bounds Total (%)',
+                  'Percent Over Upper Bound (%)', 'Percent Under Lower Bound (%)']
+SWING_COLUMNS = ['Room Name', 'Maximum Swing', 'Percent of Data with Swing Greater than Desired Swing (%)',
+                 'Maximum Daily Swing', 'Maximum Weekly Swing', 'Maximum Hourly Rate of Change']
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# results table (one row per parameter) and excursions (with a Parameter column) of a room for the selection;
+# bounds maps each parameter to its (minimum, maximum) and swings to its maximum permitted swing. Results are cached
+# under the contents of the room, so they are computed again only after a new file is ingested for it
+# returns None if the room is not in the store
+def batch_analysis(room, startDate, endDate, monthsArray, bounds, swings, minDuration=0, hysteresis=0):
+    manifest = read_manifest(room)
+    if manifest is None:
+        return None
+    parameters = batch_parameters(room, startDate, endDate, monthsArray, bounds, swings, minDuration, hysteresis)
+    return cached(manifest['contentKey'], parameters, room_results, room, startDate, endDate, monthsArray, bounds,
+                  swings, minDuration, hysteresis)
+
+# whether batch_analysis would return without analyzing the room: its results are cached (or it is not in the store)
+def batch_cached(room, startDate, endDate, monthsArray, bounds, swings, minDuration=0, hysteresis=0):
+    manifest = read_manifest(room)
+    if manifest is None:
+        return True
+    parameters = batch_parameters(room, startDate, endDate, monthsArray, bounds, swings, minDuration, hysteresis)
+    return is_cached(manifest['contentKey'], parameters, room_results)
+
+# settings of a batch analysis the results are cached under
+def batch_parameters(room, startDate, endDate, monthsArray, bounds, swings, minDuration, hysteresis):
+    return [room, str(startDate), str(endDate), sorted(monthsArray or []),
+            [(parameter, list(bounds[parameter]), swings[parameter]) for parameter in PARAMETER_COLUMNS],
+            minDuration, hysteresis]
+
+def room_results(room, startDate, endDate, monthsArray, bounds, swings, minDuration, hysteresis):
+    pyramid = load_room(room, startDate, endDate, monthsArray)
+    if pyramid is None: # removed since batch_analysis read its manifest
+        raise LookupError(MISSING_ROOM.format(room))
+    dataset = pyramid['dataset'].select(startDate, endDate, monthsArray)
+    return batch_results(room, dataset, bounds, swings, minDuration, hysteresis)
+
+# bounds, excursion and swing statistics of every parameter of a SensorDataset, from its readings stacked as a
+# (parameter x time) array; percentages are rounded like the per-parameter analyses of the interfaces
+@stage('analyse')
+def batch_results(room, dataset, bounds, swings, minDuration=0, hysteresis=0):
+    parameters = list(PARAMETER_COLUMNS)
+    columns = [PARAMETER_COLUMNS[parameter] for parameter in parameters]
+    values = np.vstack([dataset[column] for column in columns] + [np.zeros((0, len(dataset)), dtype=np.float32)])
+    lower = np.array([bounds[parameter][0] for parameter in parameters], dtype=float)
+    upper = np.array([bounds[parameter][1] for parameter in parameters], dtype=float)
+    permitted = np.array([swings[parameter] for parameter in parameters], dtype=float)
+    numEntries = len(dataset)
+    table = pd.DataFrame({'Lower Bound': lower, 'Upper Bound': upper, 'Permitted Swing': permitted},
+                         index=pd.Index(parameters, name='Parameter'))
+
+    # bounds
+    with np.errstate(invalid='ignore', divide='ignore'):
+        numLow = np.sum(values <= lower[:, None].astype(values.dtype), axis=1)
+        numHigh = np.sum(values >= upper[:, None].astype(values.dtype), axis=1)
+        percentLow = np.round(numLow / numEntries, 2)
+        percentHigh = np.round(numHigh / numEntries, 2)
+    if numEntries:
+        table['Minimum Value'] = np.round(np.fmin.reduce(values, axis=1).astype(float), 2)
+        table['Maximum Value'] = np.round(np.fmax.reduce(values, axis=1).astype(float), 2)
+    else:
+        table['Minimum Value'] = table['Maximum Value'] = np.nan
+    table['Percent Out of Bounds Total (%)'] = np.round(percentLow + percentHigh, 2) * 100
+    table['Percent Over Upper Bound (%)'] = percentHigh * 100
+    table['Percent Under Lower Bound (%)'] = percentLow * 100
+    times = dataset.times.astype(np.int64)
+    excursions = []
+    for row, parameter in enumerate(parameters):
+        found = find_excursions(room, times, values[row], lower[row], upper[row], minDuration, hysteresis)
+        found.insert(0, 'Parameter', parameter)
+        excursions.append(found)
+    excursions = pd.concat(excursions, ignore_index=True)
+    table = table.join(excursion_summary(excursions, parameters, by='Parameter').round(2))
+
+    # swing over the rolling 24 hours and over local calendar hours, days and weeks
+    rolling = rolling_swings(values)
+    table['rolling Maximum Swing'] = np.round(rolling.max(axis=1), 2) if numEntries else np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['rolling Percent Over (%)'] = np.round(np.sum(rolling >= permitted[:, None], axis=1) / numEntries,
+                                                     2) * 100
+    for mode in SWING_UNITS:
+        periodSwings = calendar_swings(dataset, columns, mode)[1]
+        statistics = [swing_statistics(periodSwings[row], permitted[row]) for row in range(len(parameters))]
+        maxSwing, numOver, numPeriods = [np.array(column, dtype=float) for column in zip(*statistics)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentOver = np.where(numPeriods > 0, np.round(numOver / numPeriods, 2), 0)
+        table[mode + ' Maximum Swing'] = np.round(maxSwing, 2)
+        table[mode + ' Percent Over (%)'] = percentOver * 100
+    return table, excursions
+
+# results of one parameter for every room (a dict of room -> results from batch_analysis) as the bounds or swing
+# table of the interfaces, and the floorplan colour of each room
+def batch_view(results, parameter, analysis, swingMode='rolling'):
+    if not results:
+        return pd.DataFrame(columns=SWING_COLUMNS if analysis == 'SwingAnalysis' else
+                            BOUNDS_COLUMNS + SUMMARY_COLUMNS), {}
+    rows = pd.DataFrame([table.loc[parameter] for table, excursions in results.values()])
+    rows.insert(0, 'Room Name', list(results))
+    if analysis == 'SwingAnalysis':
+        swingMode = swingMode or 'rolling'
+        view = pd.DataFrame({'Room Name': rows['Room Name'],
+                             'Maximum Swing': rows[swingMode + ' Maximum Swing'],
+                             'Percent of Data with Swing Greater than Desired Swing (%)':
+                                 rows[swingMode + ' Percent Over (%)'],
+                             'Maximum Daily Swing': rows['daily Maximum Swing'],
+                             'Maximum Weekly Swing': rows['weekly Maximum Swing'],
+                             'Maximum Hourly Rate of Change': rows['hourly Maximum Swing']}, columns=SWING_COLUMNS)
+        colors = swing_colors(view['Maximum Swing'], rows['Permitted Swing'])
+    else:
+        view = rows[BOUNDS_COLUMNS + SUMMARY_COLUMNS].astype({'Number of Excursions': int})
+        colors = bounds_colors(rows['Maximum Value'] > rows['Upper Bound'],
+                               rows['Minimum Value'] < rows['Lower Bound'])
+    return view.reset_index(drop=True), dict(zip(rows['Room Name'], colors.tolist()))
+
+# readings of a column of every dataset (SensorDataset) stacked into one array, with the first row and the number of
+# rows of each dataset
+def stack_rooms(datasets, column):
+    counts = np.array([len(dataset) for dataset in datasets], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    values = np.concatenate([dataset[column] for dataset in datasets] + [np.zeros(0, dtype=np.float32)])
+    return values, starts, counts
+
+# minimum, maximum, number of readings at or below lower and at or above upper of every room of stacked readings;
+# the bounds are numbers or one per reading. Rooms without readings get a NaN minimum and maximum
+def room_bounds(values, starts, counts, lower, upper):
+    roomIds = np.repeat(np.arange(len(counts)), counts)
+    nonEmpty = counts > 0
+    minimum = np.full(len(counts), np.nan)
+    maximum = np.full(len(counts), np.nan)
+    if nonEmpty.any():
+        minimum[nonEmpty] = np.fmin.reduceat(values, starts[nonEmpty]).astype(float)
+        maximum[nonEmpty] = np.fmax.reduceat(values, starts[nonEmpty]).astype(float)
+    with np.errstate(invalid='ignore'):
+        numLow = np.bincount(roomIds, values <= np.asarray(lower).astype(values.dtype), minlength=len(counts))
+        numHigh = np.bincount(roomIds, values >= np.asarray(upper).astype(values.dtype), minlength=len(counts))
+    return minimum, maximum, numLow.astype(np.int64), numHigh.astype(np.int64)
+
+# rolling swing (as rolling_swings) of every room of stacked readings; windows that would reach into the next room
+# get a swing of 0, like the last readings of a single room
+def room_rolling_swings(values, starts, counts, window=ROLLING_SWING_POINTS):
+    swings = rolling_swings(values[None, :], window)[0]
+    position = np.arange(len(values)) - np.repeat(starts, counts) # row within its room
+    swings[position >= np.repeat(counts, counts) - window - 1] = 0
+    return swings
+
+# floorplan colour of each room of a bounds analysis: yellow (0.5) if both over and under the bounds, red (0.2) if
+# only over, blue (0.9) if only under and green (0.7) if within the bounds
+def bounds_colors(over, under):
+    return np.select([over & under, over, under], [0.5, 0.2, 0.9], 0.7)
+
+# floorplan colour of each room of a swing analysis: red (0.2) if the swing was too large, green (0.7) otherwise
+def swing_colors(maxSwing, permitted):
+    return np.where(np.asarray(maxSwing) > np.asarray(permitted), 0.2, 0.7)
+
+# excursions of one parameter in every room, in the form of find_excursions
+def batch_excursions(results, parameter):
+    frames = [excursions[excursions['Parameter'] == parameter].drop(columns='Parameter')
+              for table, excursions in results.values()]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EXCURSION_COLUMNS)
@@ -0,0 +1,199 @@
+# cache of analysis results shared by every user of a server, and by every server process on the machine
+# a result is computed once for each (dataset fingerprint, analysis, parameters) and then read from memory or, after a
+# restart or in another worker process, from the cache folder. The fingerprint identifies the data (e.g. the content
+# key of a file or room), so results never have to be invalidated: new data gets new keys. The analysis is the
+# function computing the result and the parameters are the settings it is computed with
+# concurrent requests for a result that is still being computed wait for that computation instead of repeating it
+# (single flight): within a process on an event per key, across processes on a lock file per key
+# memory and the cache folder are each limited to a number of bytes (results are measured by their pickled size);
+# the least recently used results are dropped first
+# results must be picklable, and are shared between users, so callers must not change them
+# the state of the interfaces that used to be sent to the browser in hidden divs (e.g. uploaded data) is kept the same
+# way: the value is stored on the server and the hidden div holds only its key, so any server process can answer the
+# next callback of a user. Stored values have their own memory and folder limits (the uploads tier), so a burst of
+# analysis results cannot drop the data a user is still working with
+# import needed packages
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from winterthur_metrics import stage
+
+# location of the cached results; can be changed with the WINTERTHUR_CACHE environment variable
+CACHE_DIRECTORY = os.environ.get('WINTERTHUR_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+MAX_MEMORY_BYTES = 512 * 2 ** 20 # results kept in memory by each server process
+MAX_DISK_BYTES = 4 * 2 ** 30 # results kept in the cache folder
+MAX_UPLOAD_MEMORY_BYTES = 256 * 2 ** 20 # stored values kept in memory by each server process
+MAX_UPLOAD_DISK_BYTES = 4 * 2 ** 30 # stored values kept in the uploads folder of the cache folder
+LOCK_TIMEOUT = 30 * 60 # seconds after which a lock file is taken to be left behind by a process that stopped
+LOCK_POLL = 0.1 # seconds between checks of a lock file held by another process
+# tiers of the cache: the folder, limits, and the values kept in memory (key -> (value, size in bytes), least recently
+# used first) of analysis results and of stored values
+RESULTS = {'directory': CACHE_DIRECTORY, 'maxMemory': MAX_MEMORY_BYTES, 'maxDisk': MAX_DISK_BYTES,
+           'memory': OrderedDict(), 'memoryBytes': 0}
+UPLOADS = {'directory': os.path.join(CACHE_DIRECTORY, 'uploads'), 'maxMemory': MAX_UPLOAD_MEMORY_BYTES,
+           'maxDisk': MAX_UPLOAD_DISK_BYTES, 'memory': OrderedDict(), 'memoryBytes': 0}
+FLIGHTS = {} # key -> computation in progress in this process: an event set when it is done, and its result
+LOCK = threading.Lock()
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# key of a result; parameters can be anything JSON can write (other values are written with str)
+def cache_key(fingerprint, analysis, parameters):
+    text = json.dumps([fingerprint, analysis, parameters], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def cache_path(key, tier=RESULTS):
+    return os.path.join(tier['directory'], key + '.pickle')
+
+# key of the result of function for the data and parameters
+def result_key(fingerprint, parameters, function):
+    return cache_key(fingerprint, '{}.{}'.format(function.__module__, function.__qualname__), parameters)
+
+# result of function(*args) for the data and parameters, computed only if it is not cached yet
+def cached(fingerprint, parameters, function, *args):
+    key = result_key(fingerprint, parameters, function)
+    found, result = lookup(key)
+    if found:
+        return result
+    return single_flight(key, lambda: lookup_or_compute(key, lambda: function(*args)))
+
+# cached result from memory or disk, as (found, result)
+def lookup(key, tier=RESULTS):
+    with LOCK:
+        if key in tier['memory']:
+            tier['memory'].move_to_end(key)
+            return True, tier['memory'][key][0]
+    try:
+        with open(cache_path(key, tier), 'rb') as f:
+            data = f.read()
+        os.utime(cache_path(key, tier)) # most recently used
+    except FileNotFoundError:
+        return False, None
+    result = pickle.loads(data)
+    remember(key, result, len(data), tier)
+    return True, result
+
+# whether the result of function for the data and parameters is cached, without reading it
+def is_cached(fingerprint, parameters, function):
+    key = result_key(fingerprint, parameters, function)
+    with LOCK:
+        if key in RESULTS['memory']:
+            return True
+    return os.path.exists(cache_path(key))
+
+def lookup_or_compute(key, compute):
+    found, result = lookup(key) # may have been cached while waiting for the lock
+    if found:
+        return result
+    result = compute()
+    save(key, result, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    return result
+
+# keep a result (and its pickled data) in memory and in the folder of its tier
+def save(key, result, data, tier=RESULTS):
+    remember(key, result, len(data), tier)
+    if len(data) <= tier['maxDisk']:
+        os.makedirs(tier['directory'], exist_ok=True)
+        path = cache_path(key, tier)
+        with open('{}.{}.writing'.format(path, os.getpid()), 'wb') as f:
+            f.write(data)
+        os.replace('{}.{}.writing'.format(path, os.getpid()), path)
+        trim_disk(tier)
+
+# keep a result in memory, dropping the least recently used results of the tier over its memory limit
+def remember(key, result, size, tier=RESULTS):
+    if size > tier['maxMemory']:
+        return
+    with LOCK:
+        memory = tier['memory']
+        if key in memory:
+            tier['memoryBytes'] -= memory.pop(key)[1]
+        memory[key] = (result, size)
+        tier['memoryBytes'] += size
+        while tier['memoryBytes'] > tier['maxMemory']:
+            tier['memoryBytes'] -= memory.popitem(last=False)[1][1]
+
+# drop the least recently used results in the folder of a tier over its disk limit
+def trim_disk(tier=RESULTS):
+    files = []
+    for entry in os.scandir(tier['directory']):
+        if entry.name.endswith('.pickle'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError: # removed by another process
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for modified, size, path in files)
+    for modified, size, path in sorted(files):
+        if total <= tier['maxDisk']:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+# store a value on the server; returns its key, to be kept in a hidden div
+@stage('serialize')
+def store_value(value):
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    key = hashlib.sha1(data).hexdigest()
+    save(key, value, data, UPLOADS)
+    return key
+
+# value stored under a key; raises LookupError if it is no longer stored (the least recently used values are
+# removed once the uploads tier is full), in which case the data has to be uploaded again
+@stage('serialize')
+def stored_value(key):
+    found, value = lookup(key, UPLOADS)
+    if not found:
+        raise LookupError('The uploaded data is no longer stored on the server. Please upload it again.')
+    return value
+
+# run compute() once for concurrent calls with the same key, in this process and in the other server processes; the
+# calls made while it runs wait and get its result. If it fails, the next waiting call runs it again
+def single_flight(key, compute):
+    while True:
+        with LOCK:
+            flight = FLIGHTS.get(key)
+            if flight is None:
+                flight = FLIGHTS[key] = {'done': threading.Event()}
+                break
+        flight['done'].wait()
+        if 'result' in flight:
+            return flight['result']
+    try:
+        flight['result'] = with_lock_file(key, compute)
+        return flight['result']
+    finally:
+        with LOCK:
+            del FLIGHTS[key]
+        flight['done'].set()
+
+# run compute() holding the lock file of a key, waiting while another process holds it
+def with_lock_file(key, compute):
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    lockPath = os.path.join(CACHE_DIRECTORY, key + '.lock')
+    while True:
+        try:
+            os.close(os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lockPath) > LOCK_TIMEOUT:
+                    os.remove(lockPath)
+                    continue
+            except FileNotFoundError: # released in the meantime
+                continue
+            time.sleep(LOCK_POLL)
+    try:
+        return compute()
+    finally:
+        try:
+            os.remove(lockPath)
+        except FileNotFoundError: # taken to be left behind by another process
+            pass
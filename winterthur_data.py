@@ -0,0 +1,570 @@
+# functions shared by the Winterthur interfaces for reading .pm2 files and for the aggregate pyramid of each dataset
+# import needed packages
+from collections import OrderedDict
+import hashlib
+import base64
+import io
+import pandas as pd
+import numpy as np
+from winterthur_cache import cached
+from winterthur_metrics import stage
+
+# names of the columns of a parsed .pm2 file
+TIME_COLUMN = 'Date and Time in GMT'
+TEMP_COLUMN = 'Temperature (Degrees Fahrenheit)'
+RH_COLUMN = 'Relative Humidity (%)'
+DP_COLUMN = 'Dew Point'
+# times in .pm2 files are GMT; daily and weekly reports use the local time of the museum
+LOCAL_TIMEZONE = 'America/New_York'
+# names of the channels derived from temperature and RH (see DERIVED_CHANNELS)
+AH_COLUMN = 'Absolute Humidity (g/m3)'
+HR_COLUMN = 'Humidity Ratio (g/kg)'
+EMC_COLUMN = 'Wood Equilibrium Moisture Content (%)'
+
+# parameter values used by the interfaces (dropdowns, and column name prefixes in cross-correlation and factor
+# analysis) and the channel of each
+PARAMETER_COLUMNS = OrderedDict([('Temp', TEMP_COLUMN), ('RH', RH_COLUMN), ('DP', DP_COLUMN), ('AH', AH_COLUMN),
+                                 ('HR', HR_COLUMN), ('EMC', EMC_COLUMN)])
+PARAMETER_OPTIONS = [{'label': 'Temperature (Degrees Fahrenheit)', 'value': 'Temp'},
+                     {'label': 'Relative Humidity (%)', 'value': 'RH'},
+                     {'label': 'Dew Point (Degrees Fahrenheit)', 'value': 'DP'},
+                     {'label': 'Absolute Humidity (g/m3)', 'value': 'AH'},
+                     {'label': 'Humidity Ratio (g water/kg dry air)', 'value': 'HR'},
+                     {'label': 'Wood Equilibrium Moisture Content (%)', 'value': 'EMC'}]
+
+# grid that the cross-correlation and factor analysis data is resampled onto
+RESAMPLE_STEP = np.timedelta64(15, 'm')
+# longest time between two known values that is filled by interpolation; longer gaps (e.g. a logger outage) are
+# left empty instead of being drawn as a straight line
+MAX_INTERPOLATION_GAP = np.timedelta64(2, 'h')
+
+# levels of the aggregate pyramid, from finest to coarsest
+PYRAMID_LEVELS = ['15min', 'hourly', 'daily', 'monthly']
+MAX_DATASETS = 32 # number of aggregate pyramids kept in memory on the server
+DATASETS = OrderedDict() # dataset key -> aggregate pyramid, least recently used first
+
+
+# READING .pm2 FILES____________________________________________________________________________________________________
+# Note: this function is very specific to Winterthur and their .pm2 files
+# creates dataframe out of the whole .pm2 file, indexed by a sorted DatetimeIndex and with calendar columns
+def read_pm2(contents):
+    return read_pm2_bytes(decode_contents(contents))
+
+# bytes of an uploaded file
+@stage('decode')
+def decode_contents(contents):
+    content_type, content_string = contents.split(',')
+    return base64.b64decode(content_string)
+
+# same as read_pm2 for the decoded bytes of a file; with header=False the bytes are rows only (e.g. the part of a
+# file that was added since it was last read)
+@stage('parse')
+def read_pm2_bytes(decoded, header=True):
+    if header:
+        df = pd.read_table(io.BytesIO(decoded), skiprows=[0, 1, 3]) # skiprows is based on Winterthur file format
+    else:
+        df = pd.read_table(io.BytesIO(decoded), header=None)
+    # rename columns
+    df.columns = [TIME_COLUMN, TEMP_COLUMN, RH_COLUMN]
+    df[TIME_COLUMN] = pd.to_datetime(df[TIME_COLUMN]) # set date and time column as datetime type
+    df = df.set_index(TIME_COLUMN)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='mergesort') # stable, so repeated timestamps keep their order in the file
+    return add_calendar_columns(df)
+
+# add year, month, day of year and hour columns computed from the DatetimeIndex; done once per file so that
+# month selection, contour plots and swing analysis do not have to take dates apart again
+# month and hour fit in int8; year and day of year need int16
+def add_calendar_columns(df):
+    times = df.index.values.astype('datetime64[ns]')
+    months = times.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]')
+    df['year'] = (years.astype(np.int64) + 1970).astype(np.int16)
+    df['month'] = (months.astype(np.int64) % 12 + 1).astype(np.int8)
+    df['dayofyear'] = ((times.astype('datetime64[D]') - years).astype(np.int64) + 1).astype(np.int16)
+    df['hour'] = ((times.astype('datetime64[h]') - times.astype('datetime64[D]')).astype(np.int64)).astype(np.int8)
+    return df
+
+# select the entered date range and months from a parsed .pm2 dataframe
+def filter_data(df, startDate, endDate, monthsArray):
+    # select the entered date range, from startDate to endDate; binary search on the sorted index
+    first = df.index.searchsorted(pd.Timestamp(startDate), side='right')
+    last = df.index.searchsorted(pd.Timestamp(endDate), side='right')
+    df = df.iloc[first:last]
+
+    # if any specific months are selected, get rid of other months
+    if monthsArray and len(set(monthsArray)) < 12:
+        df = df[df['month'].isin(monthsArray)]
+    return df
+
+# creates dataframe out of .pm2 file for the entered date range and months
+def parse_data(contents, startDate, endDate, monthsArray):
+    return filter_data(read_pm2(contents), startDate, endDate, monthsArray)
+
+# if parameter selected is dew point, perform this function on the df to add a DP column
+def add_DP_column(df):
+    df[DP_COLUMN] = dew_point(df[TEMP_COLUMN], df[RH_COLUMN])
+    return df
+
+
+# DERIVED CHANNELS______________________________________________________________________________________________________
+# every function takes temperature (F) and RH (%) as Series or arrays and keeps float32 arrays float32
+# dew point (F)
+def dew_point(tempF, RH):
+    # convert F to C:
+    temp = ((tempF - 32) * (5 / 9))
+    # because converted to C, convert back to F at end of eq
+    return ((((RH/100)**(1/8))*(112 + 0.9*temp)+0.1*temp - 112) * (9 / 5)) + 32
+
+# saturation vapor pressure over water (hPa), Magnus formula with temperature in C
+def saturation_vapor_pressure(temp):
+    return 6.112 * np.exp((17.67 * temp) / (temp + 243.5))
+
+# absolute humidity (g of water per m3 of air)
+def absolute_humidity(tempF, RH):
+    temp = (tempF - 32) * (5 / 9)
+    vaporPressure = saturation_vapor_pressure(temp) * RH / 100 # hPa
+    return 216.7 * vaporPressure / (temp + 273.15)
+
+# humidity ratio (mixing ratio; g of water per kg of dry air) at sea level pressure, 1013.25 hPa
+def humidity_ratio(tempF, RH):
+    temp = (tempF - 32) * (5 / 9)
+    vaporPressure = saturation_vapor_pressure(temp) * RH / 100 # hPa
+    return 621.98 * vaporPressure / (1013.25 - vaporPressure)
+
+# equilibrium moisture content of wood (%), Hailwood-Horrobin equation as given in the USDA Wood Handbook
+def wood_emc(tempF, RH):
+    h = RH / 100
+    W = 330 + 0.452 * tempF + 0.00415 * tempF**2
+    K = 0.791 + 4.63e-4 * tempF - 8.44e-7 * tempF**2
+    K1 = 6.34 + 7.75e-4 * tempF - 9.35e-5 * tempF**2
+    K2 = 1.09 + 2.84e-2 * tempF - 9.04e-5 * tempF**2
+    Kh = K * h
+    return (1800 / W) * (Kh / (1 - Kh) + (K1 * Kh + 2 * K1 * K2 * Kh**2) / (1 + K1 * Kh + K1 * K2 * Kh**2))
+
+# channel name -> function computing it from temperature and RH
+DERIVED_CHANNELS = OrderedDict([(DP_COLUMN, dew_point), (AH_COLUMN, absolute_humidity), (HR_COLUMN, humidity_ratio),
+                                (EMC_COLUMN, wood_emc)])
+
+# values of a column of a parsed .pm2 dataframe, computing it if it is a derived channel
+def channel_values(df, column):
+    if column in df:
+        return df[column]
+    return DERIVED_CHANNELS[column](df[TEMP_COLUMN], df[RH_COLUMN])
+
+
+# RESAMPLING____________________________________________________________________________________________________________
+# resample every column of a dataframe with a DatetimeIndex onto a regular grid of the given step (the mean of the
+# values in each step, like resample(step).mean()) and fill empty steps by linear interpolation between the known
+# values on either side, if those are at most maxGap apart. With maxGap=None every gap is filled, like
+# interpolate(method='linear'): steps before the first known value stay empty and steps after the last known
+# value get the last value.
+# the grid starts at the step of the first row, or at start if given
+# returns the resampled dataframe and a boolean dataframe of the same shape that is True where a value was imputed
+@stage('resample')
+def resample_frame(df, step=RESAMPLE_STEP, maxGap=MAX_INTERPOLATION_GAP, start=None):
+    stepNs = np.int64(step / np.timedelta64(1, 'ns'))
+    columns = list(df.columns)
+    if len(df) == 0:
+        empty = pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name=df.index.name), dtype=np.float64)
+        return empty, empty.astype(bool)
+    # one integer bucket number per row, shared by all columns
+    bucket = df.index.values.astype('datetime64[ns]').astype(np.int64) // stepNs
+    firstBucket = bucket.min() if start is None else np.datetime64(start, 'ns').astype(np.int64) // stepNs
+    numBuckets = int(bucket.max() - firstBucket) + 1
+    # sums and counts of all columns in one bincount, over the flattened (bucket, column) cells
+    values = df.to_numpy(dtype=np.float64)
+    known = ~np.isnan(values)
+    cell = ((bucket - firstBucket)[:, None] * len(columns) + np.arange(len(columns))).ravel()
+    sums = np.bincount(cell[known.ravel()], weights=values[known], minlength=numBuckets * len(columns))
+    counts = np.bincount(cell[known.ravel()], minlength=numBuckets * len(columns))
+    with np.errstate(invalid='ignore'):
+        means = (sums / counts).reshape(numBuckets, len(columns))
+
+    # position of the known value before and after every step, per column
+    known = counts.reshape(numBuckets, len(columns)) > 0
+    position = np.arange(numBuckets)[:, None]
+    before = np.maximum.accumulate(np.where(known, position, -1), axis=0)
+    after = np.minimum.accumulate(np.where(known, position, numBuckets)[::-1], axis=0)[::-1]
+    if maxGap is None:
+        imputed = ~known & (before >= 0)
+    else:
+        maxSteps = maxGap // step
+        imputed = ~known & (before >= 0) & (after < numBuckets) & (after - before <= maxSteps)
+    after = np.where(after < numBuckets, after, before) # after the last known value, the last value is kept
+    valueBefore = np.take_along_axis(means, np.maximum(before, 0), axis=0)
+    valueAfter = np.take_along_axis(means, np.maximum(after, 0), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(after > before, (position - before) / (after - before), 0)
+    means[imputed] = (valueBefore + (valueAfter - valueBefore) * fraction)[imputed]
+
+    times = ((firstBucket + np.arange(numBuckets)) * stepNs).astype('datetime64[ns]')
+    index = pd.DatetimeIndex(times, name=df.index.name)
+    return pd.DataFrame(means, index=index, columns=columns), pd.DataFrame(imputed, index=index, columns=columns)
+
+# resample_frame for data that comes in chunks sorted by time (e.g. a large file read with chunksize); yields
+# (resampled, imputed) pieces that together are the same as resample_frame of all the data. Only the raw rows of the
+# steps that are not final yet are kept between chunks: the last step, which may continue in the next chunk, and
+# the steps after the last known value of a column, which need that value and the next one to be interpolated.
+# With a maxGap this is at most about 2 * maxGap of rows; with maxGap=None it can grow while a column has no data.
+def resample_chunks(chunks, step=RESAMPLE_STEP, maxGap=MAX_INTERPOLATION_GAP):
+    carry = None # raw rows kept from the chunks before
+    carryFrom = None # step the kept rows start at
+    emitFrom = None # start of the first step not yielded yet
+    for chunk in chunks:
+        if not chunk.index.is_monotonic_increasing:
+            chunk = chunk.sort_index(kind='mergesort')
+        if emitFrom is not None and len(chunk) and chunk.index[0] < emitFrom:
+            raise ValueError('the data must be sorted by time; {} comes after steps up to {} were already '
+                             'resampled'.format(chunk.index[0], emitFrom))
+        frame = chunk if carry is None else pd.concat([carry, chunk])
+        if len(frame) == 0:
+            continue
+        result, imputed = resample_frame(frame, step, maxGap, carryFrom)
+        numSteps = len(result)
+        if numSteps < 2:
+            # all rows are in the last step, which may continue in the next chunk; keep them for the next round
+            carry = frame
+            continue
+        # the last step is left out: it may continue in the next chunk, so its mean cannot be used yet
+        known = result.notna().values[:-1] & ~imputed.values[:-1]
+        position = np.arange(numSteps - 1)
+        # steps before cut are final
+        everKnown = known.any(axis=0)
+        lastKnown = np.where(everKnown, numSteps - 2 - np.argmax(known[::-1], axis=0), numSteps - 1)
+        if maxGap is not None:
+            lastKnown = np.maximum(lastKnown, numSteps - 1 - maxGap // step) # longer gaps are not interpolated
+        cut = min(lastKnown.min(), numSteps - 1)
+        # the next round needs the known value of every column at or before cut
+        before = np.max(np.where(known[:cut + 1], position[:cut + 1, None], -1), axis=0, initial=-1)
+        carryStart = min(before[before >= 0].tolist() + [cut])
+        if maxGap is not None:
+            carryStart = max(carryStart, cut - maxGap // step)
+        times = result.index
+        piece = slice(0 if emitFrom is None else times.searchsorted(emitFrom), cut)
+        yield result.iloc[piece], imputed.iloc[piece]
+        emitFrom = times[cut]
+        carryFrom = times[carryStart]
+        carry = frame[frame.index >= carryFrom]
+    if carry is not None and len(carry):
+        result, imputed = resample_frame(carry, step, maxGap, carryFrom)
+        piece = slice(0 if emitFrom is None else result.index.searchsorted(emitFrom), len(result))
+        yield result.iloc[piece], imputed.iloc[piece]
+
+# make .pm2 file into a dataframe of the selected channels resampled to RESAMPLE_STEP, with columns named after the file
+# (specific to Winterthur); returns the dataframe and the mask of interpolated values
+# parameters selects the channels, by their PARAMETER_COLUMNS keys, which are also the column name prefixes
+# the result is cached under the contents of the file (see winterthur_cache), so the same file is parsed only once
+def make_df_pm2(filename, contents, parameters=('Temp', 'RH'), maxGap=MAX_INTERPOLATION_GAP):
+    return cached(dataset_key(contents), [filename, list(parameters), str(maxGap)], resampled_channels, filename,
+                  contents, parameters, maxGap)
+
+def resampled_channels(filename, contents, parameters, maxGap):
+    df = read_pm2(contents)
+    # derived channels are computed from the readings before resampling
+    frame = pd.DataFrame({'{}_{}'.format(parameter, filename): channel_values(df, PARAMETER_COLUMNS[parameter])
+                          for parameter in parameters}, index=df.index)
+    return resample_frame(frame, maxGap=maxGap)
+
+# message for the interfaces about how much of the data that is used was interpolated
+# masks is a list of (imputed mask, rows of the mask that are used)
+def imputed_message(masks):
+    used = [imputed.loc[rows].to_numpy(dtype=bool) for imputed, rows in masks]
+    numValues = sum(mask.size for mask in used)
+    percent = 100 * sum(mask.sum() for mask in used) / numValues if numValues else 0
+    return '{:.1f}% of the values used were interpolated (gaps of up to {} minutes are interpolated; rows in longer ' \
+           'gaps are left out).'.format(percent, MAX_INTERPOLATION_GAP // np.timedelta64(1, 'm'))
+
+# seconds each reading stands for: the time to the next reading of the same room, at most MAX_INTERPOLATION_GAP so
+# outages (and months left out of the selection) are not counted; the last reading of a room counts like the one
+# before it; times are int64 ns and the rooms are consecutive blocks of rows given by their first row and count
+def sample_durations(times, starts, counts):
+    seconds = np.append(np.diff(times) / 1e9, 0)
+    nonEmpty = counts > 0
+    lasts = starts[nonEmpty] + counts[nonEmpty] - 1
+    seconds[lasts] = np.where(counts[nonEmpty] > 1, seconds[np.maximum(lasts - 1, 0)], 0)
+    return np.clip(seconds, 0, MAX_INTERPOLATION_GAP / np.timedelta64(1, 's'))
+
+
+# DATASET STORAGE_______________________________________________________________________________________________________
+# key identifying the contents of an uploaded file
+def dataset_key(contents):
+    return hashlib.sha1(contents.encode()).hexdigest()
+
+def store_dataset(key, pyramid):
+    DATASETS[key] = pyramid
+    DATASETS.move_to_end(key)
+    while len(DATASETS) > MAX_DATASETS:
+        DATASETS.popitem(last=False) # drop the least recently used dataset
+
+# returns None if the dataset is not (or no longer) stored on the server
+def get_dataset(key):
+    pyramid = DATASETS.get(key)
+    if pyramid is not None:
+        DATASETS.move_to_end(key)
+    return pyramid
+
+
+# AGGREGATE PYRAMID_____________________________________________________________________________________________________
+# start of the bucket each time falls in, for one pyramid level
+def bucket_starts(times, level):
+    if level == '15min':
+        minutes = times.astype('datetime64[m]').astype(np.int64)
+        return ((minutes // 15) * 15).astype('datetime64[m]').astype('datetime64[ns]')
+    units = {'hourly': 'h', 'daily': 'D', 'monthly': 'M'}[level]
+    return times.astype('datetime64[{}]'.format(units)).astype('datetime64[ns]')
+
+# start of the bucket after each bucket start
+def bucket_ends(starts, level):
+    if level == 'monthly':
+        return (starts.astype('datetime64[M]') + 1).astype('datetime64[ns]')
+    step = {'15min': np.timedelta64(15, 'm'), 'hourly': np.timedelta64(1, 'h'), 'daily': np.timedelta64(1, 'D')}[level]
+    return starts + step
+
+# calendar month (1-12) of each time
+def month_of(times):
+    return (times.astype('datetime64[M]').astype(np.int64) % 12 + 1).astype(np.int8)
+
+# aggregate one level into the next coarser level; buckets are contiguous because times are sorted
+def aggregate_level(finer, level, columns):
+    keys = bucket_starts(finer['time'], level)
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    coarser = {'time': keys[first], 'end': bucket_ends(keys[first], level),
+               'first': np.append(first, len(keys)), # children of bucket k are finer rows first[k]:first[k+1]
+               'rows': np.add.reduceat(finer['rows'], first),
+               'min': {}, 'max': {}, 'sum': {}, 'count': {}}
+    for column in columns:
+        coarser['min'][column] = np.fmin.reduceat(finer['min'][column], first) # fmin/fmax ignore NaN
+        coarser['max'][column] = np.fmax.reduceat(finer['max'][column], first)
+        coarser['sum'][column] = np.add.reduceat(finer['sum'][column], first, dtype=np.float64) # float32 samples
+        coarser['count'][column] = np.add.reduceat(finer['count'][column], first)
+    return coarser
+
+# samples of a SensorDataset in the same form as the aggregated levels; raw['values'][column] reads the channel from
+# the dataset, so derived channels are only computed if a query needs them. The min/max/sum/count of the given
+# columns are only needed to aggregate the samples into the levels above
+def raw_level(dataset, columns=()):
+    raw = {'time': dataset.times, 'month': dataset.month, 'values': dataset,
+           'rows': np.broadcast_to(np.int64(1), (len(dataset),)), 'min': {}, 'max': {}, 'sum': {}, 'count': {}}
+    for column in columns:
+        values = dataset[column]
+        raw['min'][column] = values
+        raw['max'][column] = values
+        raw['sum'][column] = np.nan_to_num(values)
+        raw['count'][column] = (~np.isnan(values)).astype(np.int64)
+    return raw
+
+# build the 15-minute, hourly, daily and monthly min/max/sum/count of each column of a SensorDataset
+# every level keeps the offsets of its children in the finer level, so queries can descend only where needed
+@stage('resample')
+def build_pyramid(dataset, columns):
+    raw = raw_level(dataset, columns)
+    times = raw['time']
+    pyramid = {'dataset': dataset, 'columns': columns, 'raw': raw}
+    finer = raw
+    for level in PYRAMID_LEVELS:
+        if len(times) == 0:
+            finer = {'time': times, 'end': times, 'first': np.zeros(1, dtype=np.int64),
+                     'rows': np.zeros(0, dtype=np.int64), 'min': {}, 'max': {}, 'sum': {}, 'count': {}}
+            for stat in ['min', 'max', 'sum', 'count']:
+                finer[stat] = {column: np.zeros(0) for column in columns}
+        else:
+            finer = aggregate_level(finer, level, columns)
+        pyramid[level] = finer
+    return pyramid
+
+# add samples that come after every sample of a pyramid (e.g. the new rows of a growing logger file, as a
+# SensorDataset) to its aggregated levels, in place; only the last bucket of each level is recomputed, along with
+# the new buckets
+@stage('resample')
+def extend_pyramid(aggregates, dataset):
+    columns = aggregates['columns']
+    tail = raw_level(dataset, columns)
+    if len(tail['time']) == 0:
+        return aggregates
+    # 15 minute level: the new samples were never aggregated, so the first new bucket is merged into the last
+    # bucket if they are the same bucket
+    old = aggregates['15min']
+    new = aggregate_level(tail, '15min', columns)
+    new['first'] += old['first'][-1] # offsets into all the samples, not only the new ones
+    k = len(old['time'])
+    if k and old['time'][-1] == new['time'][0]:
+        k -= 1
+        new['first'][0] = old['first'][k]
+        new['rows'][0] += old['rows'][k]
+        for column in columns:
+            new['min'][column][0] = np.fmin(new['min'][column][0], old['min'][column][k])
+            new['max'][column][0] = np.fmax(new['max'][column][0], old['max'][column][k])
+            new['sum'][column][0] += old['sum'][column][k]
+            new['count'][column][0] += old['count'][column][k]
+    aggregates['15min'] = splice_level(old, k, new, columns)
+    # coarser levels: the last bucket is aggregated again from all its children in the updated finer level
+    for finerName, levelName in zip(PYRAMID_LEVELS[:-1], PYRAMID_LEVELS[1:]):
+        finer = aggregates[finerName]
+        old = aggregates[levelName]
+        k = max(len(old['time']) - 1, 0)
+        start = old['first'][k]
+        children = {'time': finer['time'][start:], 'rows': finer['rows'][start:]}
+        for stat in ['min', 'max', 'sum', 'count']:
+            children[stat] = {column: finer[stat][column][start:] for column in columns}
+        new = aggregate_level(children, levelName, columns)
+        new['first'] += start
+        aggregates[levelName] = splice_level(old, k, new, columns)
+    return aggregates
+
+# rows :k of a pyramid level followed by the rows of new
+def splice_level(old, k, new, columns):
+    level = {'first': np.concatenate([old['first'][:k], new['first']])}
+    for name in ['time', 'end', 'rows']:
+        level[name] = np.concatenate([old[name][:k], new[name]])
+    for stat in ['min', 'max', 'sum', 'count']:
+        level[stat] = {column: np.concatenate([old[stat][column][:k], new[stat][column]]) for column in columns}
+    return level
+
+# the aggregated levels of a pyramid, without the samples; this is what is saved alongside a stored dataset
+def pyramid_aggregates(pyramid):
+    return {name: value for name, value in pyramid.items() if name not in ['dataset', 'raw']}
+
+# pyramid made of saved aggregates and the samples of a SensorDataset, which may cover only part of the data (for
+# example only the partitions a query needs); queries must stay within the range of the dataset
+def with_dataset(aggregates, dataset):
+    pyramid = dict(aggregates)
+    pyramid['dataset'] = dataset
+    pyramid['raw'] = raw_level(dataset)
+    return pyramid
+
+# rows (and their column values) of a pyramid level in the half-open date range (startDate, endDate]
+def level_slice(level, startDate, endDate):
+    first = np.searchsorted(level['time'], np.datetime64(startDate, 'ns'), side='right')
+    last = np.searchsorted(level['time'], np.datetime64(endDate, 'ns'), side='right')
+    return first, last
+
+# all indices in the ranges starts[k]:ends[k]
+def expand_ranges(starts, ends):
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(lengths.sum()) + offsets
+
+# children of the buckets idx, as indices into the finer level
+def children_of(level, idx):
+    return expand_ranges(level['first'][idx], level['first'][idx + 1])
+
+# samples in the buckets idx, as indices into the raw level; found by time because the raw level may be partial
+def samples_of(level, idx, raw):
+    return expand_ranges(np.searchsorted(raw['time'], level['time'][idx]),
+                         np.searchsorted(raw['time'], level['end'][idx]))
+
+# 1 where every row of the bucket satisfies value <= below (or value >= above), 0 where none do, -1 otherwise
+def classify_buckets(level, idx, column, below=None, above=None):
+    low = level['min'][column][idx]
+    high = level['max'][column][idx]
+    # compare in the type of the values; a float32 reading of 63.1 is below a float64 bound of 63.1
+    below = None if below is None else low.dtype.type(below)
+    above = None if above is None else low.dtype.type(above)
+    full = level['count'][column][idx] == level['rows'][idx] # a missing value never satisfies the condition
+    state = np.full(len(idx), -1, dtype=np.int8)
+    with np.errstate(invalid='ignore'):
+        if below is not None:
+            state[full & (high <= below)] = 1
+            state[(low > below) | (level['count'][column][idx] == 0)] = 0
+        else:
+            state[full & (low >= above)] = 1
+            state[(high < above) | (level['count'][column][idx] == 0)] = 0
+    return state
+
+# walk down the pyramid from the monthly level; buckets entirely inside the selection (and entirely satisfying the
+# condition, if there is one) are answered at the coarsest level possible, and only buckets that straddle the
+# date range or the condition are looked at on a finer level. Returns the answered buckets of each level and the
+# raw rows that had to be checked individually
+def select_buckets(pyramid, startDate, endDate, monthsArray, column=None, below=None, above=None):
+    start = np.datetime64(startDate, 'ns')
+    end = np.datetime64(endDate, 'ns')
+    months = monthsArray if monthsArray else list(range(1, 13))
+    selected = []
+    idx = np.arange(len(pyramid['monthly']['time']))
+    for levelName in PYRAMID_LEVELS[::-1]:
+        level = pyramid[levelName]
+        b0 = level['time'][idx]
+        b1 = level['end'][idx]
+        monthOk = np.isin(month_of(b0), months)
+        inside = (b0 > start) & (b1 <= end) & monthOk
+        done = (b1 <= start) | (b0 > end) | ~monthOk
+        if column is None:
+            answered = inside
+        else:
+            state = classify_buckets(level, idx, column, below, above)
+            answered = inside & (state == 1)
+            done = done | (inside & (state == 0))
+        selected.append((levelName, idx[answered]))
+        if levelName == '15min':
+            idx = samples_of(level, idx[~(done | answered)], pyramid['raw'])
+        else:
+            idx = children_of(level, idx[~(done | answered)])
+
+    # raw rows of the remaining buckets
+    raw = pyramid['raw']
+    times = raw['time'][idx]
+    mask = (times > start) & (times <= end) & np.isin(raw['month'][idx], months)
+    if column is not None:
+        values = raw['values'][column][idx]
+        with np.errstate(invalid='ignore'):
+            if below is not None:
+                mask &= values <= values.dtype.type(below)
+            else:
+                mask &= values >= values.dtype.type(above)
+    return selected, idx[mask]
+
+# number of rows in the selection (that satisfy value <= below or value >= above, if given) for each month
+# returns a Series indexed by the start of every month in the dataset
+def pyramid_count(pyramid, startDate, endDate, monthsArray, column=None, below=None, above=None):
+    monthly = pyramid['monthly']['time']
+    counts = np.zeros(len(monthly), dtype=np.int64)
+    selected, rows = select_buckets(pyramid, startDate, endDate, monthsArray, column, below, above)
+    for levelName, idx in selected + [('raw', rows)]:
+        level = pyramid[levelName]
+        owner = np.searchsorted(monthly, level['time'][idx], side='right') - 1 # monthly bucket of each row
+        counts += np.bincount(owner, weights=level['rows'][idx], minlength=len(monthly)).astype(np.int64)
+    return pd.Series(counts, index=pd.DatetimeIndex(monthly, name=TIME_COLUMN))
+
+# number of rows of a selection of samples (times, datetime64[ns]) where mask is True for each month, in the same form
+# as pyramid_count; for conditions the pyramid cannot answer, like bounds that change through the year
+def sample_count(pyramid, times, mask):
+    monthly = pyramid['monthly']['time']
+    owner = np.searchsorted(monthly, times[mask], side='right') - 1 # monthly bucket of each row
+    counts = np.bincount(owner, minlength=len(monthly)).astype(np.int64)
+    return pd.Series(counts, index=pd.DatetimeIndex(monthly, name=TIME_COLUMN))
+
+# exact minimum and maximum of a column over the selection
+def pyramid_extremes(pyramid, column, startDate, endDate, monthsArray):
+    selected, rows = select_buckets(pyramid, startDate, endDate, monthsArray)
+    lows = [pyramid['raw']['values'][column][rows]]
+    highs = [pyramid['raw']['values'][column][rows]]
+    for levelName, idx in selected:
+        lows.append(pyramid[levelName]['min'][column][idx])
+        highs.append(pyramid[levelName]['max'][column][idx])
+    # as python floats, so float32 readings round to the same values as the readings in the file
+    return float(np.nanmin(np.concatenate(lows))), float(np.nanmax(np.concatenate(highs)))
+
+# raw rows of the selection as a dataframe, for analyses that need every sample (e.g. swing)
+def pyramid_frame(pyramid, startDate, endDate, monthsArray):
+    return pyramid['dataset'].select(startDate, endDate, monthsArray).to_frame()
+
+# times and values of a column for graphing, from the finest level that has at most maxRows rows in the range;
+# values are the raw values or the bucket means
+def pyramid_series(pyramid, column, startDate, endDate, monthsArray, maxRows):
+    for levelName in ['raw'] + PYRAMID_LEVELS:
+        level = pyramid[levelName]
+        first, last = level_slice(level, startDate, endDate)
+        if last - first <= maxRows:
+            break
+    times = level['time'][first:last]
+    if levelName == 'raw':
+        values = level['values'][column][first:last]
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = level['sum'][column][first:last] / level['count'][column][first:last]
+    if monthsArray:
+        keep = np.isin(month_of(times), monthsArray)
+        times = times[keep]
+        values = values[keep]
+    return times, values
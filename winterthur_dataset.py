@@ -0,0 +1,143 @@
+# compact in-memory form of the readings of one sensor (room)
+# readings are float32 arrays and times are integer offsets from a fixed start in units of a fixed step, so a
+# reading takes 4 bytes per channel and 4 (or 8) bytes for its time, instead of 8 bytes per float64 column plus 8 for
+# the DatetimeIndex. Calendar fields (year, month, day of year, hour) are only computed when first used.
+# Derived channels (dew point, absolute humidity, humidity ratio, wood EMC) are computed from the temperature and RH
+# arrays the first time they are used, and kept with the dataset.
+# to_frame() gives the same dataframe as read_pm2 (plus the derived channels) for code that works on dataframes
+# import needed packages
+import pandas as pd
+import numpy as np
+from winterthur_data import TIME_COLUMN, TEMP_COLUMN, RH_COLUMN, LOCAL_TIMEZONE, DERIVED_CHANNELS
+
+CALENDAR_FIELDS = ['year', 'month', 'dayofyear', 'hour']
+
+
+class SensorDataset:
+    # start and step are in ns (since the epoch); offsets are sorted; channels maps column names to arrays of
+    # readings, one per offset, and must include temperature and RH
+    def __init__(self, start, step, offsets, channels):
+        self.start = np.int64(start)
+        self.step = np.int64(step)
+        self.offsets = offsets
+        self.channels = {name: np.asarray(values, dtype=np.float32) for name, values in channels.items()}
+        self._calendar = {} # calendar fields computed so far
+
+    # dataset from sorted times (datetime64 or int64 ns) and the readings at those times
+    # the step is the largest step all times are a whole number of steps apart by, so times are stored exactly
+    @classmethod
+    def from_times(cls, times, channels):
+        times = np.asarray(times).astype('datetime64[ns]').astype(np.int64)
+        if len(times) == 0:
+            return cls(0, 1, np.zeros(0, dtype=np.int32), channels)
+        differences = np.diff(times)
+        step = np.gcd.reduce(differences[differences > 0]) if (differences > 0).any() else 1
+        offsets = (times - times[0]) // step
+        if offsets[-1] < 2**31:
+            offsets = offsets.astype(np.int32)
+        return cls(times[0], step, offsets, channels)
+
+    # dataset of the temperature and RH of a dataframe from read_pm2
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_times(df.index.values, {column: df[column].to_numpy(dtype=np.float32)
+                                                for column in [TEMP_COLUMN, RH_COLUMN]})
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # readings of a channel; derived channels are computed (in float32) the first time
+    def channel(self, name):
+        if name not in self.channels:
+            self.channels[name] = DERIVED_CHANNELS[name](self.channels[TEMP_COLUMN], self.channels[RH_COLUMN])
+        return self.channels[name]
+
+    # dataset[name] is the same as dataset.channel(name), like selecting a dataframe column
+    def __getitem__(self, name):
+        return self.channel(name)
+
+    # datetime64[ns] time of every reading
+    @property
+    def times(self):
+        return (self.start + self.offsets.astype(np.int64) * self.step).astype('datetime64[ns]')
+
+    # year, month, day of year or hour of every reading (same types as add_calendar_columns), computed once
+    def calendar(self, field):
+        if field not in self._calendar:
+            times = self.times
+            if field in ['year', 'dayofyear']:
+                years = times.astype('datetime64[Y]')
+                if field == 'year':
+                    values = (years.astype(np.int64) + 1970).astype(np.int16)
+                else:
+                    values = ((times.astype('datetime64[D]') - years).astype(np.int64) + 1).astype(np.int16)
+            elif field == 'month':
+                values = (times.astype('datetime64[M]').astype(np.int64) % 12 + 1).astype(np.int8)
+            else:
+                values = (times.astype('datetime64[h]') - times.astype('datetime64[D]')).astype(np.int64)
+                values = values.astype(np.int8)
+            self._calendar[field] = values
+        return self._calendar[field]
+
+    @property
+    def month(self):
+        return self.calendar('month')
+
+    # local (LOCAL_TIMEZONE) wall-clock time of every reading, computed once
+    @property
+    def local_times(self):
+        if 'localtime' not in self._calendar:
+            local = pd.DatetimeIndex(self.times).tz_localize('UTC').tz_convert(LOCAL_TIMEZONE).tz_localize(None)
+            self._calendar['localtime'] = local.values.astype('datetime64[ns]')
+        return self._calendar['localtime']
+
+    # number of the local hour, day or week ('h', 'D' or 'W') of every reading, computed once; weeks start on
+    # Monday. Numbers only increase with time, except that the hour repeated when daylight saving time ends gets the
+    # same number twice
+    def local_bucket(self, unit):
+        field = 'local' + unit
+        if field not in self._calendar:
+            localTime = self.local_times
+            if unit == 'W':
+                # 1 January 1970 was a Thursday
+                values = (localTime.astype('datetime64[D]').astype(np.int64) + 3) // 7
+            else:
+                values = localTime.astype('datetime64[{}]'.format(unit)).astype(np.int64)
+            self._calendar[field] = values
+        return self._calendar[field]
+
+    # offset of the first reading after a time (a date, Timestamp or datetime64)
+    def _position(self, date):
+        time = np.datetime64(pd.Timestamp(date).to_datetime64(), 'ns').astype(np.int64)
+        return np.searchsorted(self.offsets, (time - self.start) // self.step, side='right')
+
+    # readings in (startDate, endDate] and, if any are given, the selected months; same selection as filter_data
+    def select(self, startDate, endDate, monthsArray):
+        first = self._position(startDate)
+        last = self._position(endDate)
+        rows = slice(first, last)
+        subset = self._subset(rows)
+        if monthsArray and len(set(monthsArray)) < 12:
+            subset = subset._subset(np.isin(subset.month, monthsArray))
+        return subset
+
+    def _subset(self, rows):
+        subset = SensorDataset(self.start, self.step, self.offsets[rows],
+                               {name: values[rows] for name, values in self.channels.items()})
+        subset._calendar = {field: values[rows] for field, values in self._calendar.items()}
+        return subset
+
+    # bytes used by the readings, times and calendar fields computed so far
+    @property
+    def nbytes(self):
+        arrays = [self.offsets] + list(self.channels.values()) + list(self._calendar.values())
+        return sum(array.nbytes for array in arrays)
+
+    # same dataframe as read_pm2 plus the derived channels: indexed by time, with the channels and calendar columns
+    def to_frame(self):
+        for name in DERIVED_CHANNELS:
+            self.channel(name)
+        data = dict(self.channels)
+        for field in CALENDAR_FIELDS:
+            data[field] = self.calendar(field)
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self.times, name=TIME_COLUMN))
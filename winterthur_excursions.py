@@ -0,0 +1,94 @@
+# out-of-bounds excursions: each unbroken period in which a parameter is over the upper bound or under the lower
+# bound, with its start, end, duration, peak deviation from the bound and degree-hours (the deviation integrated
+# over time, in parameter units times hours)
+# with a hysteresis, an excursion only ends once the parameter is back inside the bounds by at least the hysteresis,
+# so a reading that hovers around a bound does not make many short excursions; the readings inside the bounds in
+# between are not counted in its duration or degree-hours. Excursions with less time out of bounds than the minimum
+# duration are left out, so single-reading blips do not count
+# an excursion also ends at a gap in the readings longer than MAX_INTERPOLATION_GAP (or between selected months)
+# every step is vectorized, so each file is done in one pass over its readings
+# import needed packages
+import pandas as pd
+import numpy as np
+from winterthur_data import MAX_INTERPOLATION_GAP, sample_durations
+from winterthur_metrics import stage
+
+# names of the columns of an excursion table
+EXCURSION_COLUMNS = ['Room Name', 'Direction', 'Start', 'End', 'Duration (hours)', 'Peak Deviation', 'Degree-Hours']
+# names of the columns of an excursion summary
+SUMMARY_COLUMNS = ['Number of Excursions', 'Hours in Excursions', 'Longest Excursion (hours)', 'Degree-Hours']
+# defaults for the interfaces
+MIN_EXCURSION_MINUTES = 60
+EXCURSION_HYSTERESIS = 0 # in the units of the parameter, so there is no default that suits every parameter
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# excursions of values (at times, int64 ns) outside lower and upper, which can be numbers or one bound per reading;
+# a bound that is None is not checked. minDuration is in seconds and hysteresis in the units of the values.
+# returns a dataframe with EXCURSION_COLUMNS, sorted by start time
+@stage('analyse')
+def find_excursions(room, times, values, lower, upper, minDuration=0, hysteresis=0):
+    times = np.asarray(times, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    durations = sample_durations(times, np.zeros(1, dtype=np.int64), np.array([len(times)]))
+    # readings more than MAX_INTERPOLATION_GAP after the one before start a new excursion
+    joined = np.append(False, np.diff(times) <= MAX_INTERPOLATION_GAP / np.timedelta64(1, 'ns'))[:len(times)]
+    frames = []
+    if upper is not None:
+        frames.append(excursion_frame(room, 'Over', times, values - upper, durations, joined, minDuration, hysteresis))
+    if lower is not None:
+        frames.append(excursion_frame(room, 'Under', times, lower - values, durations, joined, minDuration,
+                                      hysteresis))
+    if not frames:
+        return pd.DataFrame(columns=EXCURSION_COLUMNS)
+    return pd.concat(frames, ignore_index=True).sort_values('Start', kind='mergesort', ignore_index=True)
+
+# excursions of one direction, from the deviation past the bound of every reading; a reading at the bound is out of
+# bounds, as in the percentages out of bounds, and is back in once it is more than the hysteresis inside the bound
+def excursion_frame(room, direction, times, deviation, durations, joined, minDuration, hysteresis):
+    isOut = deviation >= 0
+    out = excursion_state(isOut, deviation < -hysteresis)
+    # run-length encoding of the readings in an excursion
+    starts = out & ~(np.append(False, out[:-1]) & joined)
+    outRows = np.flatnonzero(out)
+    runIds = np.cumsum(starts)[outRows] - 1
+    # first reading of each run (always out of bounds) and its last reading out of bounds; readings of the run inside
+    # the hysteresis band count for neither time nor degree-hours
+    runFirst = np.flatnonzero(starts[outRows])
+    first = outRows[runFirst]
+    last = np.maximum.reduceat(np.where(isOut[outRows], outRows, -1), runFirst) if len(first) else first
+    outDurations = np.where(isOut[outRows], durations[outRows], 0)
+    seconds = np.bincount(runIds, outDurations, minlength=len(first))
+    degreeHours = np.bincount(runIds, np.fmax(deviation[outRows], 0) * outDurations, minlength=len(first))
+    degreeHours = degreeHours / 3600
+    peaks = np.fmax.reduceat(deviation[outRows], runFirst) if len(first) else np.zeros(0)
+    keep = seconds >= minDuration
+    return pd.DataFrame({'Room Name': room, 'Direction': direction,
+                         'Start': pd.DatetimeIndex(times[first[keep]]),
+                         'End': pd.DatetimeIndex(times[last[keep]] + (durations[last[keep]] * 1e9).astype(np.int64)),
+                         'Duration (hours)': seconds[keep] / 3600, 'Peak Deviation': peaks[keep],
+                         'Degree-Hours': degreeHours[keep]}, columns=EXCURSION_COLUMNS)
+
+# True from every reading that is out until the next reading that is back in; readings that are neither (inside the
+# hysteresis band, or missing) keep the state of the reading before
+def excursion_state(out, backIn):
+    known = out | backIn
+    latest = np.maximum.accumulate(np.where(known, np.arange(len(out)), -1)) if len(out) else np.zeros(0, dtype=int)
+    return (latest >= 0) & out[np.maximum(latest, 0)]
+
+# number of excursions, total and longest duration (hours) and total degree-hours of each room (or of each value of
+# another column, e.g. the parameter)
+def excursion_summary(excursions, rooms, by='Room Name'):
+    grouped = excursions.groupby(by)
+    summary = pd.DataFrame({'Number of Excursions': grouped.size(),
+                            'Hours in Excursions': grouped['Duration (hours)'].sum(),
+                            'Longest Excursion (hours)': grouped['Duration (hours)'].max(),
+                            'Degree-Hours': grouped['Degree-Hours'].sum()}, columns=SUMMARY_COLUMNS)
+    return summary.reindex(rooms).fillna(0).astype({'Number of Excursions': int})
+
+# records of an excursion table for a dash DataTable, with times as text and numbers rounded
+def excursion_records(excursions):
+    table = excursions.round({'Duration (hours)': 2, 'Peak Deviation': 2, 'Degree-Hours': 2})
+    for column in ['Start', 'End']:
+        table[column] = table[column].dt.strftime('%Y-%m-%d %H:%M')
+    return table.to_dict('records')
@@ -0,0 +1,206 @@
+# local runner for long analyses, so callbacks do not hold up the server while they run
+# a callback submits a job and gets its id back at once; the job runs in a thread pool and the page polls its status
+# with a dcc.Interval until the result is ready. The status, progress and result of every job are kept on disk (an
+# SQLite table and a pickle file per result), so any server process can answer the polls.
+# a job is a function that takes the keyword argument progress: calling progress(fraction, message) reports how far
+# it is and stops the job (raises JobCancelled) once it has been cancelled
+# submitting the same function with the same arguments while a job for them is still queued or running returns the
+# id of that job instead of starting another one, also when server processes submit it at the same time; uploaded
+# files among the arguments are compared by their content key
+# every server process touches the jobs it runs every HEARTBEAT_INTERVAL; a queued or running job that has not been
+# touched for STALE_AFTER belonged to a process that stopped, and is marked failed so it is not waited on forever
+# import needed packages
+import os
+import time
+import threading
+import uuid
+import pickle
+import sqlite3
+import hashlib
+import traceback
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from dash import no_update
+import dash_html_components as html
+from winterthur_metrics import stage
+from winterthur_data import dataset_key
+
+# location of the job table and results; can be changed with the WINTERTHUR_JOBS environment variable
+JOBS_DIRECTORY = os.environ.get('WINTERTHUR_JOBS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs'))
+MAX_WORKERS = 4 # jobs run at the same time by each server process
+MAX_JOBS = 200 # finished jobs kept, with their results
+POLL_INTERVAL = 1000 # ms between status polls of the interfaces
+HEARTBEAT_INTERVAL = 10 # s between updates of the jobs a process is running
+STALE_AFTER = 120 # s without an update after which a queued or running job is taken to be orphaned
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+FUTURES = {} # job id -> future of the jobs submitted by this process
+HEARTBEAT = [] # the heartbeat thread of this process, once started
+ORPHANED = 'The server process running it stopped. Please run it again.'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+def job_table():
+    os.makedirs(JOBS_DIRECTORY, exist_ok=True)
+    # transactions are begun explicitly (see submit_job); other statements are committed one by one
+    db = sqlite3.connect(os.path.join(JOBS_DIRECTORY, 'jobs.sqlite'), timeout=30, isolation_level=None)
+    db.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, key TEXT, status TEXT, progress REAL, '
+               'message TEXT, created REAL, updated REAL)')
+    db.execute('CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)')
+    return closing(db)
+
+def result_path(jobId):
+    return os.path.join(JOBS_DIRECTORY, jobId + '.pickle')
+
+# run function(*args, progress=...) as a job; returns the job id
+def submit_job(function, *args):
+    key = hashlib.sha1(pickle.dumps((function.__module__, function.__qualname__, job_arguments(args)))).hexdigest()
+    recover_jobs()
+    start_heartbeat()
+    with job_table() as db:
+        # the lookup and the insert are one transaction, holding the write lock of the table, so processes
+        # submitting the same job at once cannot both miss the other's job
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            running = db.execute("SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running')",
+                                 (key,)).fetchone()
+            if running is None:
+                jobId = uuid.uuid4().hex
+                now = time.time()
+                db.execute('INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)', (jobId, key, 'queued', 0, '', now, now))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+    if running is not None:
+        return running[0]
+    remove_old_jobs()
+    FUTURES[jobId] = EXECUTOR.submit(run_job, jobId, function, args)
+    return jobId
+
+# arguments of a job as they are compared: uploaded files (dcc.Upload contents, also in lists) by their content key,
+# so a large upload is not pickled for every submit
+def job_arguments(args):
+    if isinstance(args, str) and args.startswith('data:'):
+        return 'upload', dataset_key(args)
+    if isinstance(args, (list, tuple)):
+        return [job_arguments(arg) for arg in args]
+    return args
+
+def run_job(jobId, function, args):
+    try:
+        update_job(jobId, 'running', 0, 'Starting', 'queued')
+        report_progress(jobId, 0, 'Starting') # stops a job cancelled before it started
+        result = function(*args, progress=lambda fraction, message='': report_progress(jobId, fraction, message))
+        report_progress(jobId, 1, 'Saving the result') # a job cancelled during its last step is not saved
+        with open(result_path(jobId) + '.writing', 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(result_path(jobId) + '.writing', result_path(jobId))
+        update_job(jobId, 'done', 1, 'Done')
+    except JobCancelled:
+        pass
+    except Exception as error:
+        traceback.print_exc()
+        update_job(jobId, 'failed', None, '{}: {}'.format(type(error).__name__, error))
+    finally:
+        FUTURES.pop(jobId, None)
+
+# mark the queued and running jobs of processes that stopped as failed
+def recover_jobs():
+    with job_table() as db, db:
+        db.execute("UPDATE jobs SET status = 'failed', message = ?, updated = ? WHERE status IN ('queued', 'running') "
+                   "AND updated < ?", (ORPHANED, time.time(), time.time() - STALE_AFTER))
+
+def start_heartbeat():
+    if not HEARTBEAT:
+        HEARTBEAT.append(threading.Thread(target=heartbeat, daemon=True))
+        HEARTBEAT[0].start()
+
+# keep the jobs of this process from being taken for orphaned ones, also during long steps without progress reports
+def heartbeat():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        try:
+            with job_table() as db, db:
+                db.executemany("UPDATE jobs SET updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+                               [(time.time(), jobId) for jobId in list(FUTURES)])
+        except sqlite3.Error:
+            traceback.print_exc()
+
+# change the status of a job that is running (or has the given status), so a cancelled job stays cancelled
+def update_job(jobId, status, progress=None, message=None, fromStatus='running'):
+    with job_table() as db, db:
+        db.execute('UPDATE jobs SET status = ?, progress = COALESCE(?, progress), message = COALESCE(?, message), '
+                   'updated = ? WHERE id = ? AND status = ?', (status, progress, message, time.time(), jobId,
+                                                              fromStatus))
+
+# progress of a running job (fraction from 0 to 1); stops the job if it was cancelled (or given up as orphaned)
+def report_progress(jobId, fraction, message=''):
+    with job_table() as db, db:
+        db.execute("UPDATE jobs SET progress = ?, message = ?, updated = ? WHERE id = ? AND status = 'running'",
+                   (fraction, message, time.time(), jobId))
+        status = db.execute('SELECT status FROM jobs WHERE id = ?', (jobId,)).fetchone()
+    if status is None or status[0] != 'running':
+        raise JobCancelled()
+
+# status ('queued', 'running', 'done', 'failed' or 'cancelled'), progress and message of a job; None if unknown
+def job_status(jobId):
+    recover_jobs()
+    with job_table() as db:
+        row = db.execute('SELECT status, progress, message FROM jobs WHERE id = ?', (jobId,)).fetchone()
+    if row is None:
+        return None
+    return {'status': row[0], 'progress': row[1], 'message': row[2]}
+
+# progress reports of analyses run outside a job are ignored
+def no_progress(fraction, message=''):
+    pass
+
+@stage('serialize')
+def job_result(jobId):
+    with open(result_path(jobId), 'rb') as f:
+        return pickle.load(f)
+
+# cancel a job; a running job stops at its next progress report
+def cancel_job(jobId):
+    with job_table() as db, db:
+        db.execute("UPDATE jobs SET status = 'cancelled', message = 'Cancelled', updated = ? WHERE id = ? AND "
+                   "status IN ('queued', 'running')", (time.time(), jobId))
+    future = FUTURES.pop(jobId, None)
+    if future is not None:
+        future.cancel() # only stops jobs that have not started
+
+# drop all but the MAX_JOBS most recent finished jobs
+def remove_old_jobs():
+    with job_table() as db, db:
+        old = db.execute("SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') ORDER BY created DESC "
+                         "LIMIT -1 OFFSET ?", (MAX_JOBS,)).fetchall()
+        db.executemany('DELETE FROM jobs WHERE id = ?', old)
+    for jobId, in old:
+        if os.path.exists(result_path(jobId)):
+            os.remove(result_path(jobId))
+
+# outputs of a callback that polls a job with numOutputs result outputs: the results (once the job is done), whether
+# the polling interval is disabled, and a progress message
+def job_outputs(jobId, numOutputs):
+    status = job_status(jobId) if jobId else None
+    waiting = [no_update] * numOutputs
+    if status is None:
+        return waiting + [True, None]
+    elif status['status'] == 'done':
+        result = job_result(jobId)
+        return (list(result) if numOutputs > 1 else [result]) + [True, None]
+    elif status['status'] in ['failed', 'cancelled']:
+        children = 'The analysis {}. {}'.format('was cancelled' if status['status'] == 'cancelled' else 'failed',
+                                                status['message'] if status['status'] == 'failed' else '')
+        return waiting + [True, html.Div([html.H6(children=children, style={'color': '#4dbfff'})])]
+    children = '{} ({:.0f}%). {}'.format('Waiting to start' if status['status'] == 'queued' else 'Running',
+                                         100 * (status['progress'] or 0), status['message'] or '')
+    return waiting + [False, html.Div([html.H6(children=children, style={'color': '#4dbfff'})])]
+
+
+# jobs left queued or running by earlier runs of the server
+recover_jobs()
@@ -0,0 +1,395 @@
+# timing and memory of the interfaces, to find out where a slow page spends its time: every Dash callback (see
+# CallbackRegistry in winterthur_app.py) and every stage of the analyses marked with @stage(<name>) (decode, parse,
+# resample, serialize, analyse and figure) is measured. For each call the wall time, the CPU time of the thread running
+# it, the peak memory and the bytes of data in and out are added to the totals of the callback or function; a stage
+# called within another stage is counted in both. For a callback the bytes are those of the request and of the
+# response, and the time Dash takes outside the callback to decode the request and encode the response is counted as
+# the serialize stage of function 'dash_response'.
+# the totals are served at /metrics of each server in the Prometheus text format, e.g. for a Prometheus server to
+# scrape or to read with curl. Each server process writes its totals to the metrics folder every few seconds, so the
+# page shows the sum of all the processes of a server (delete the folder to start from zero). The totals of processes
+# that stopped are added to one file of retired totals and their own files removed, so the folder does not grow with
+# every restart and the memory of processes that are gone is no longer reported
+# optional, with environment variables:
+#   WINTERTHUR_METRICS_LOG=<file>  every call is also appended to the file as a line of JSON, for offline profiling
+#   WINTERTHUR_METRICS_MEMORY=1    memory allocations are traced (tracemalloc) to measure the peak memory of each
+#                                  call; this makes code that allocates a lot a few times slower, so it is off by
+#                                  default. Allocations of other threads running at the same time are counted too
+#   WINTERTHUR_METRICS_ALLOW=<addresses>  comma-separated addresses allowed to read /metrics (default: this machine)
+# import needed packages
+import os
+import json
+import time
+import uuid
+import atexit
+import traceback
+import tracemalloc
+import functools
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+import flask
+# resource (the peak memory of the process) is not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# location of the totals of every server process; can be changed with the WINTERTHUR_METRICS environment variable
+METRICS_DIRECTORY = os.environ.get('WINTERTHUR_METRICS',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+LOG_PATH = os.environ.get('WINTERTHUR_METRICS_LOG')
+TRACE_MEMORY = os.environ.get('WINTERTHUR_METRICS_MEMORY') == '1'
+ALLOWED_ADDRESSES = os.environ.get('WINTERTHUR_METRICS_ALLOW', '127.0.0.1,::1').split(',')
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120] # upper bounds of the histogram
+SNAPSHOT_INTERVAL = 5 # seconds between writes of the totals of a server process to the metrics folder
+STALE_SNAPSHOT = 60 # seconds after which the totals of a process that has not written them are taken to be retired
+RETIRED_NAME = 'retired.json' # file of the added up totals of the processes that stopped
+SAMPLED_ITEMS = 100 # the size of a longer list is estimated from its first items
+SNAPSHOT_NAME = '{}-{}.json'.format(os.getpid(), uuid.uuid4().hex[:8]) # file of the totals of this process
+TOTALS = {} # (kind, labels) -> totals of the calls of a callback or function
+STATE = {'server': False}
+OPEN_CALLS = [] # calls being measured in every thread, for their peak memory
+LOCK = threading.Lock()
+LOG_LOCK = threading.Lock()
+SNAPSHOT_LOCK = threading.Lock()
+CONTEXT = threading.local() # calls being measured in this thread, outermost first
+# metrics of each kind of call: name, type, help and the field of the totals
+FAMILIES = [('seconds', 'histogram', 'Wall time of the calls.', 'seconds'),
+            ('cpu_seconds_total', 'counter', 'CPU time of the thread running the calls.', 'cpuSeconds'),
+            ('exceptions_total', 'counter', 'Calls that ended with an exception (other than PreventUpdate).',
+             'exceptions'),
+            ('in_bytes_total', 'counter', 'Bytes of data passed to the calls (of the request for a callback).',
+             'bytesIn'),
+            ('out_bytes_total', 'counter', 'Bytes of data returned by the calls (of the response for a callback).',
+             'bytesOut'),
+            ('peak_memory_bytes', 'gauge', 'Largest memory allocated during a call, above that at its start '
+                                           '(with WINTERTHUR_METRICS_MEMORY=1).', 'peakMemory')]
+
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# decorator measuring every call of a function as a stage; bytes in are those of the arguments and bytes out those of
+# the result (see payload_size)
+def stage(name):
+    def decorate(function):
+        labels = {'stage': name, 'function': '{}.{}'.format(function.__module__, function.__qualname__)}
+
+        @functools.wraps(function)
+        def measured(*args, **kwargs):
+            with measure('stage', labels, sum(payload_size(arg) for arg in args)) as call:
+                result = function(*args, **kwargs)
+                call['bytesOut'] = payload_size(result)
+            return result
+        return measured
+    return decorate
+
+# Dash callback measuring every call of function; within a request the call is recorded once the response is made,
+# with the bytes of the request and the response (see after_request). quietErrors are the exceptions that are not
+# counted (PreventUpdate)
+def measured_callback(function, outputs, quietErrors=()):
+    output = outputs[0] if isinstance(outputs, (list, tuple)) else outputs
+    labels = {'interface': function.__module__, 'callback': function.__name__,
+              'output': '{}.{}'.format(output.component_id, output.component_property)}
+
+    @functools.wraps(function)
+    def measured(*args, **kwargs):
+        with measure('callback', labels, quietErrors=quietErrors) as call:
+            if flask.has_request_context():
+                call['deferred'] = True
+                flask.g.metricsCall = call
+            return function(*args, **kwargs)
+    return measured
+
+# context measuring the code run within it; yields the call, in which bytesOut can be set
+@contextlib.contextmanager
+def measure(kind, labels, bytesIn=0, quietErrors=()):
+    stack = open_calls()
+    call = {'kind': kind, 'labels': labels, 'bytesIn': bytesIn, 'bytesOut': 0, 'exception': None,
+            'parent': dict(stack[-1]['labels']) if stack else None, 'deferred': False}
+    stack.append(call)
+    if TRACE_MEMORY:
+        start_memory(call)
+    started = time.perf_counter()
+    cpuStarted = time.thread_time()
+    try:
+        yield call
+    except BaseException as error:
+        if not isinstance(error, quietErrors):
+            call['exception'] = type(error).__name__
+        raise
+    finally:
+        call['seconds'] = time.perf_counter() - started
+        call['cpuSeconds'] = time.thread_time() - cpuStarted
+        if TRACE_MEMORY:
+            stop_memory(call)
+        stack.pop()
+        if call['exception'] is not None or not call['deferred']:
+            call['deferred'] = False
+            record(call)
+
+def open_calls():
+    if not hasattr(CONTEXT, 'calls'):
+        CONTEXT.calls = []
+    return CONTEXT.calls
+
+# the peak of the traced memory is reset at the start of every call, after adding it to the calls already running
+def start_memory(call):
+    with LOCK:
+        update_peaks()
+        if hasattr(tracemalloc, 'reset_peak'): # Python 3.9 and later; before, the peak since tracing started is used
+            tracemalloc.reset_peak()
+        call['memoryStart'] = call['memoryPeak'] = tracemalloc.get_traced_memory()[0]
+        OPEN_CALLS.append(call)
+
+def stop_memory(call):
+    with LOCK:
+        update_peaks()
+        OPEN_CALLS.remove(call)
+    call['peakMemory'] = max(call['memoryPeak'] - call['memoryStart'], 0)
+
+def update_peaks():
+    peak = tracemalloc.get_traced_memory()[1]
+    for call in OPEN_CALLS:
+        call['memoryPeak'] = max(call['memoryPeak'], peak)
+
+# add a finished call to the totals of its callback or function, and to the log
+def record(call):
+    key = (call['kind'], tuple(call['labels'].items()))
+    with LOCK:
+        totals = TOTALS.get(key)
+        if totals is None:
+            totals = TOTALS[key] = new_totals()
+        add_call(totals, call)
+    if LOG_PATH:
+        log_call(call)
+
+def new_totals():
+    return {'calls': 0, 'seconds': 0.0, 'buckets': [0] * len(SECONDS_BUCKETS), 'cpuSeconds': 0.0, 'exceptions': 0,
+            'bytesIn': 0, 'bytesOut': 0, 'peakMemory': 0}
+
+def add_call(totals, call):
+    totals['calls'] += 1
+    totals['seconds'] += call['seconds']
+    for i, bound in enumerate(SECONDS_BUCKETS): # buckets are cumulative, as in Prometheus
+        if call['seconds'] <= bound:
+            totals['buckets'][i] += 1
+    totals['cpuSeconds'] += call['cpuSeconds']
+    totals['exceptions'] += call['exception'] is not None
+    totals['bytesIn'] += call['bytesIn']
+    totals['bytesOut'] += call['bytesOut']
+    totals['peakMemory'] = max(totals['peakMemory'], call.get('peakMemory', 0))
+
+# add a line of JSON for a call to the log file
+def log_call(call):
+    line = json.dumps({'time': time.time(), 'pid': os.getpid(), 'thread': threading.current_thread().name,
+                       'kind': call['kind'], 'labels': call['labels'], 'parent': call['parent'],
+                       'seconds': call['seconds'], 'cpuSeconds': call['cpuSeconds'],
+                       'peakMemory': call.get('peakMemory'), 'bytesIn': call['bytesIn'], 'bytesOut': call['bytesOut'],
+                       'exception': call['exception']})
+    with LOG_LOCK, open(LOG_PATH, 'a') as f:
+        f.write(line + '\n')
+
+# in-memory size of the data passed to or returned by a function: arrays (and anything else with nbytes, such as a
+# SensorDataset), dataframes, strings and bytes, also within lists, tuples and dicts (such as a figure). The size of a
+# long list is estimated from its first SAMPLED_ITEMS items
+def payload_size(value, depth=4):
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (bool, int, float, np.generic)):
+        return 8
+    if isinstance(getattr(value, 'nbytes', None), (int, np.integer)):
+        return int(value.nbytes)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage().sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage())
+    if depth == 0:
+        return 0
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        sample = value[:SAMPLED_ITEMS]
+        size = sum(payload_size(item, depth - 1) for item in sample)
+        return size * len(value) // len(sample) if sample else 0
+    return 0
+
+
+# METRICS ENDPOINT______________________________________________________________________________________________________
+# measure the callbacks of the Dash apps of a Flask server and serve the totals at /metrics; a server is set up once
+def instrument_server(server):
+    if 'winterthur_metrics' in server.extensions:
+        return
+    server.extensions['winterthur_metrics'] = True
+    server.before_request(before_request)
+    server.after_request(after_request)
+    server.add_url_rule('/metrics', 'metrics', metrics_page)
+    if not STATE['server']:
+        STATE['server'] = True
+        threading.Thread(target=keep_snapshot, daemon=True).start()
+        atexit.register(write_snapshot)
+
+# write the totals of this process every SNAPSHOT_INTERVAL, also while it is idle, so they are not taken to be those
+# of a process that stopped
+def keep_snapshot():
+    while True:
+        try:
+            write_snapshot()
+        except OSError:
+            traceback.print_exc()
+        time.sleep(SNAPSHOT_INTERVAL)
+
+def before_request():
+    flask.g.metricsStarted = time.perf_counter()
+    flask.g.metricsCpuStarted = time.thread_time()
+
+# record the callback of the request, with the bytes of the request and the response, and the time of the request
+# outside the callback as the serialize stage
+def after_request(response):
+    call = flask.g.pop('metricsCall', None)
+    if call is not None and call['deferred']:
+        call['bytesIn'] = flask.request.content_length or 0
+        call['bytesOut'] = response.calculate_content_length() or 0
+        record(call)
+        serialize = {'kind': 'stage', 'labels': {'stage': 'serialize', 'function': 'dash_response'},
+                     'seconds': max(time.perf_counter() - flask.g.metricsStarted - call['seconds'], 0),
+                     'cpuSeconds': max(time.thread_time() - flask.g.metricsCpuStarted - call['cpuSeconds'], 0),
+                     'bytesIn': call['bytesIn'], 'bytesOut': call['bytesOut'], 'exception': None,
+                     'parent': dict(call['labels'])}
+        record(serialize)
+    return response
+
+def metrics_page():
+    if flask.request.remote_addr not in ALLOWED_ADDRESSES:
+        flask.abort(403)
+    write_snapshot()
+    return flask.Response(prometheus_text(read_snapshots()), mimetype='text/plain; version=0.0.4')
+
+# write the totals of this process to the metrics folder
+def write_snapshot():
+    with LOCK:
+        snapshot = {'pid': os.getpid(), 'maxResidentBytes': max_resident_bytes(),
+                    'totals': [[kind, dict(labels), dict(totals, buckets=list(totals['buckets']))]
+                               for (kind, labels), totals in TOTALS.items()]}
+    os.makedirs(METRICS_DIRECTORY, exist_ok=True)
+    path = os.path.join(METRICS_DIRECTORY, SNAPSHOT_NAME)
+    with SNAPSHOT_LOCK: # the snapshot thread and the metrics page both write it
+        with open(path + '.writing', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.writing', path)
+
+# totals of every process that has written them and of the retired processes, added up, and the peak memory of each
+# process that is still running
+def read_snapshots():
+    retire_snapshots()
+    totals = {}
+    processes = []
+    for name in sorted(os.listdir(METRICS_DIRECTORY)):
+        if not name.endswith('.json'):
+            continue
+        snapshot = read_snapshot(os.path.join(METRICS_DIRECTORY, name))
+        if snapshot is None: # removed or replaced while reading
+            continue
+        if name != RETIRED_NAME:
+            processes.append(snapshot)
+        merge_totals(totals, snapshot['totals'])
+    return totals, processes
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# add the totals of a snapshot to totals, a dict (kind, labels) -> totals
+def merge_totals(totals, snapshotTotals):
+    for kind, labels, processTotals in snapshotTotals:
+        key = (kind, tuple(labels.items()))
+        merged = totals.setdefault(key, new_totals())
+        for field, value in processTotals.items():
+            if field == 'buckets':
+                merged[field] = [a + b for a, b in zip(merged[field], value)]
+            elif field == 'peakMemory':
+                merged[field] = max(merged[field], value)
+            else:
+                merged[field] += value
+
+# add the totals of the processes that have not written them for STALE_SNAPSHOT to the retired totals and remove
+# their files; done holding a lock file, so the totals of a process are only added once
+def retire_snapshots():
+    from winterthur_cache import with_lock_file # winterthur_cache imports this module
+    if not stale_snapshots():
+        return
+    with_lock_file('winterthur-metrics-retired', fold_snapshots)
+
+def stale_snapshots():
+    cutoff = time.time() - STALE_SNAPSHOT
+    stale = []
+    for entry in os.scandir(METRICS_DIRECTORY):
+        if entry.name == RETIRED_NAME or not (entry.name.endswith('.json') or entry.name.endswith('.writing')):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                stale.append(entry.path)
+        except FileNotFoundError: # retired by another process
+            pass
+    return stale
+
+def fold_snapshots():
+    stale = stale_snapshots() # again, now that no other process is retiring them
+    retiredPath = os.path.join(METRICS_DIRECTORY, RETIRED_NAME)
+    retired = read_snapshot(retiredPath) or {'totals': []}
+    totals = {}
+    merge_totals(totals, retired['totals'])
+    for path in stale:
+        snapshot = read_snapshot(path) if path.endswith('.json') else None # a .writing file was never complete
+        if snapshot is not None:
+            merge_totals(totals, snapshot['totals'])
+    with open(retiredPath + '.writing', 'w') as f:
+        json.dump({'totals': [[kind, dict(labels), values] for (kind, labels), values in totals.items()]}, f)
+    os.replace(retiredPath + '.writing', retiredPath)
+    for path in stale:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# peak resident memory of this process in bytes (None where it is not available)
+def max_resident_bytes():
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if os.uname().sysname == 'Darwin' else 1024)
+
+# the totals in the Prometheus text format
+def prometheus_text(snapshots):
+    totals, processes = snapshots
+    lines = []
+    for kind in ['callback', 'stage']:
+        series = [(labels, values) for (seriesKind, labels), values in sorted(totals.items()) if seriesKind == kind]
+        for suffix, metricType, description, field in FAMILIES:
+            if field == 'peakMemory' and not any(values[field] for labels, values in series):
+                continue
+            name = 'winterthur_{}_{}'.format(kind, suffix)
+            lines += ['# HELP {} {}'.format(name, description), '# TYPE {} {}'.format(name, metricType)]
+            for labels, values in series:
+                if metricType == 'histogram':
+                    for bound, count in zip(SECONDS_BUCKETS + ['+Inf'], values['buckets'] + [values['calls']]):
+                        lines.append('{}_bucket{} {}'.format(name, label_text(labels + (('le', str(bound)),)), count))
+                    lines.append('{}_sum{} {}'.format(name, label_text(labels), values['seconds']))
+                    lines.append('{}_count{} {}'.format(name, label_text(labels), values['calls']))
+                else:
+                    lines.append('{}{} {}'.format(name, label_text(labels), values[field]))
+    name = 'winterthur_process_max_resident_bytes'
+    lines += ['# HELP {} Peak resident memory of each server process.'.format(name), '# TYPE {} gauge'.format(name)]
+    lines += ['{}{} {}'.format(name, label_text((('pid', str(process['pid'])),)), process['maxResidentBytes'])
+              for process in processes if process['maxResidentBytes'] is not None]
+    return '\n'.join(lines) + '\n'
+
+def label_text(labels):
+    escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels]
+    return '{' + ','.join('{}="{}"'.format(name, value) for name, value in escaped) + '}'
@@ -0,0 +1,117 @@
+# preservation-risk indices of the environment of each room, computed from temperature and RH
+#   TWPI: time-weighted preservation index (years), as used by the Image Permanence Institute. The preservation index
+#     PI is the expected life of organic materials (paper, film, textiles) kept at a temperature and RH; its rate of
+#     decay follows the Arrhenius equation. The TWPI is the life the whole period adds up to, i.e. the total time
+#     divided by the integral of dt / PI.
+#   mould risk: progress towards visible mould growth on pine sapwood in the VTT model (Hukka and Viitanen), i.e. the
+#     integral of dt / (time to mould growth) over each unbroken period in which RH is above the critical RH for
+#     mould; 1 means mould growth has started
+#   mechanical risk: share of the time RH is more than MECHANICAL_RH_LIMIT away from its 30-day moving average
+#     (as in EN 15757), i.e. the fluctuations that wood, paint layers and the like have not adapted to
+# every room is computed in one pass over the concatenated readings of all rooms
+# import needed packages
+import numpy as np
+from winterthur_data import TEMP_COLUMN, RH_COLUMN, sample_durations
+from winterthur_metrics import stage
+
+# preservation index: activation energy of the decay (J/mol) and the PI at a reference temperature (C) and RH (%);
+# the rate of decay is taken as proportional to RH
+PI_ACTIVATION_ENERGY = 90000
+GAS_CONSTANT = 8.314 # J/(mol K)
+PI_REFERENCE_TEMP = 20
+PI_REFERENCE_RH = 50
+PI_REFERENCE_YEARS = 45
+# mould: the VTT model is fitted for temperatures from 0 to 50 C
+MOULD_TEMP_RANGE = (0, 50)
+# mechanical risk: allowed distance (RH %) from the moving average and the length of the moving average
+MECHANICAL_RH_LIMIT = 10
+MECHANICAL_WINDOW = np.timedelta64(30, 'D')
+
+# floorplan colour levels of each analysis (good limit, risk limit) and whether higher values are better
+RISK_LEVELS = {'TWPIAnalysis': (75, 45, True), # years
+               'MouldAnalysis': (0.5, 1, False), # progress to mould growth
+               'MechanicalAnalysis': (5, 20, False)} # % of time
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# TWPI (years), peak mould growth progress, % of time with mechanical risk and hours of data of each dataset
+# (SensorDataset); rooms without data get NaN
+@stage('analyse')
+def preservation_indices(datasets):
+    counts = np.array([len(dataset) for dataset in datasets], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    roomIds = np.repeat(np.arange(len(datasets)), counts)
+    times = np.concatenate([dataset.times.astype(np.int64) for dataset in datasets] + [np.zeros(0, dtype=np.int64)])
+    temp = (np.concatenate([dataset[TEMP_COLUMN] for dataset in datasets] + [np.zeros(0)]).astype(np.float64)
+            - 32) * (5 / 9)
+    RH = np.concatenate([dataset[RH_COLUMN] for dataset in datasets] + [np.zeros(0)]).astype(np.float64)
+    durations = sample_durations(times, starts, counts)
+    # missing readings count for no time (and get values that keep every rate finite)
+    missing = np.isnan(temp) | np.isnan(RH)
+    durations[missing] = 0
+    temp[missing] = PI_REFERENCE_TEMP
+    RH[missing] = 0
+
+    totalTime = np.bincount(roomIds, durations, minlength=len(datasets))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # time-weighted harmonic mean of the preservation index
+        decay = np.bincount(roomIds, durations * decay_rate(temp, RH), minlength=len(datasets))
+        twpi = totalTime / decay
+        mould = peak_mould_progress(mould_growth_rate(temp, RH) * durations, starts, counts)
+        outside = np.abs(RH - moving_average(times, RH, durations, roomIds)) > MECHANICAL_RH_LIMIT
+        mechanical = 100 * np.bincount(roomIds, durations * outside, minlength=len(datasets)) / totalTime
+    twpi[counts == 0] = np.nan
+    return {'twpi': twpi, 'mould': mould, 'mechanical': mechanical, 'hours': totalTime / 3600}
+
+# rate of decay (1/years) relative to the reference conditions, 1 / PI
+def decay_rate(temp, RH):
+    arrhenius = np.exp(-PI_ACTIVATION_ENERGY / GAS_CONSTANT * (1 / (temp + 273.15) - 1 / (PI_REFERENCE_TEMP + 273.15)))
+    return arrhenius * (RH / PI_REFERENCE_RH) / PI_REFERENCE_YEARS
+
+# critical RH (%) below which mould does not grow (VTT model)
+def critical_rh(temp):
+    return np.where(temp <= 20, -0.00267 * temp**3 + 0.160 * temp**2 - 3.13 * temp + 100, 80)
+
+# mould growth progress per second (VTT model for pine sapwood, i.e. the time to the start of growth is
+# exp(-0.68 ln(T) - 13.9 ln(RH) + 66.02) weeks); zero where mould does not grow
+def mould_growth_rate(temp, RH):
+    grows = (RH >= critical_rh(temp)) & (temp > MOULD_TEMP_RANGE[0]) & (temp < MOULD_TEMP_RANGE[1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weeks = np.exp(-0.68 * np.log(temp) - 13.9 * np.log(RH) + 66.02)
+    return np.where(grows, 1 / (weeks * 7 * 24 * 3600), 0)
+
+# largest progress accumulated in an unbroken period of growth in each room; a reading without growth, or the
+# start of a room, starts over from zero
+def peak_mould_progress(increments, starts, counts):
+    total = np.cumsum(increments)
+    before = total - increments # total before each reading
+    restart = increments == 0
+    restart[starts[counts > 0]] = True
+    # total is non-decreasing, so the total at the latest restart is a running maximum
+    base = np.maximum.accumulate(np.where(restart, before, 0)) if len(total) else total
+    progress = total - base
+    peaks = np.full(len(counts), np.nan)
+    if len(total):
+        peaks[counts > 0] = np.maximum.reduceat(progress, starts[counts > 0])
+    return peaks
+
+# time-weighted centered moving average of each room over MECHANICAL_WINDOW, from running sums
+def moving_average(times, values, durations, roomIds):
+    if len(times) == 0:
+        return values
+    seconds = (times - times.min()) // 10**9
+    halfWindow = int(MECHANICAL_WINDOW / np.timedelta64(1, 's')) // 2
+    # one sorted key for all rooms, with the rooms far enough apart that no window reaches into the next room
+    key = roomIds * (seconds.max() + 2 * halfWindow + 1) + seconds
+    first = np.searchsorted(key, key - halfWindow, side='left')
+    last = np.searchsorted(key, key + halfWindow, side='right')
+    weighted = np.concatenate([[0], np.cumsum(values * durations)])
+    weights = np.concatenate([[0], np.cumsum(durations)])
+    return (weighted[last] - weighted[first]) / (weights[last] - weights[first])
+
+# floorplan colour of each value of an analysis: green (0.7) good, yellow (0.5) fair, red (0.2) at risk
+def risk_colors(analysis, values):
+    goodLimit, riskLimit, higherIsBetter = RISK_LEVELS[analysis]
+    if not higherIsBetter:
+        values, goodLimit, riskLimit = -values, -goodLimit, -riskLimit
+    return np.select([values >= goodLimit, values >= riskLimit], [0.7, 0.5], 0.2)
@@ -0,0 +1,70 @@
+# season-dependent set-points: the lower and upper bound of a parameter at every reading
+#   fixed: the same minimum and maximum all year
+#   monthly: a minimum and maximum for each month
+#   ramped: the monthly set-points apply in the middle of each month and are interpolated linearly between, so the
+#     bounds drift smoothly through the year instead of jumping on the first of the month
+#   floating: a band of +/- the half-width around the running mean of the parameter over the last
+#     FLOATING_WINDOW, kept within the fixed minimum and maximum (as in the ASHRAE and Bizot guidelines, where the
+#     set-point may follow the season but short fluctuations may not)
+# the bounds of every reading are looked up from its month or day of year (or a running sum), so evaluating them
+# is one vectorized step per file
+# import needed packages
+import numpy as np
+
+SETPOINT_OPTIONS = [{'label': 'Fixed bounds', 'value': 'fixed'},
+                    {'label': 'Monthly bounds', 'value': 'monthly'},
+                    {'label': 'Monthly bounds, ramped between months', 'value': 'ramped'},
+                    {'label': 'Floating band around the 30-day running mean', 'value': 'floating'}]
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+               'November', 'December']
+FLOATING_WINDOW = np.timedelta64(30, 'D')
+# day of the year in the middle of each month (for a year of 365 days), where the monthly set-points of a ramped
+# schedule apply
+MID_MONTH_DAYS = np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]) + 15
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# rows of the set-point table, each month starting from the fixed bounds
+def setpoint_table(inputMin, inputMax):
+    return [{'Month': month, 'Minimum': inputMin, 'Maximum': inputMax} for month in MONTH_NAMES]
+
+# lower and upper bound of each reading (times are int64 ns) for a set-point mode; the bounds are numbers for fixed
+# bounds and arrays otherwise. table is the set-point table (for monthly and ramped bounds) and band the half-width
+# of the floating band
+def setpoint_bounds(times, values, mode, inputMin, inputMax, table=None, band=None):
+    times = np.asarray(times, dtype=np.int64).astype('datetime64[ns]')
+    if mode == 'monthly':
+        lows, highs = monthly_setpoints(table, inputMin, inputMax)
+        months = times.astype('datetime64[M]').astype(np.int64) % 12
+        return lows[months], highs[months]
+    elif mode == 'ramped':
+        lows, highs = monthly_setpoints(table, inputMin, inputMax)
+        days = np.arange(366)
+        # one value per day of the year, wrapping around from December to January
+        lowTable = np.interp(days, MID_MONTH_DAYS, lows, period=365)
+        highTable = np.interp(days, MID_MONTH_DAYS, highs, period=365)
+        dayOfYear = (times - times.astype('datetime64[Y]')).astype('timedelta64[D]').astype(np.int64)
+        return lowTable[dayOfYear], highTable[dayOfYear]
+    elif mode == 'floating':
+        mean = running_mean(times.astype(np.int64), values, FLOATING_WINDOW)
+        return np.maximum(mean - (band or 0), inputMin), np.minimum(mean + (band or 0), inputMax)
+    return inputMin, inputMax
+
+# minimum and maximum of each month from the set-point table; empty cells use the fixed bounds
+def monthly_setpoints(table, inputMin, inputMax):
+    rows = table or setpoint_table(inputMin, inputMax)
+    lows = np.array([inputMin if row.get('Minimum') in (None, '') else row['Minimum'] for row in rows], dtype=float)
+    highs = np.array([inputMax if row.get('Maximum') in (None, '') else row['Maximum'] for row in rows], dtype=float)
+    return lows, highs
+
+# mean of the values over the window before each reading (including it), from running sums; missing values are
+# left out
+def running_mean(times, values, window):
+    values = np.asarray(values, dtype=np.float64)
+    known = ~np.isnan(values)
+    sums = np.concatenate([[0], np.cumsum(np.where(known, values, 0))])
+    counts = np.concatenate([[0], np.cumsum(known)])
+    first = np.searchsorted(times, times - window / np.timedelta64(1, 'ns'), side='right')
+    last = np.arange(1, len(times) + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[last] - sums[first]) / (counts[last] - counts[first])
@@ -0,0 +1,278 @@
+# local on-disk store for .pm2 data, partitioned by room, year and month
+# each partition is a folder of .npy files, one per column, so a query only reads (memory-maps) the months it needs:
+#   <store>/<room>/<year>/<month>/time.npy (int64 ns), temperature.npy, relative_humidity.npy (float32)
+#   <store>/<room>/manifest.json   what was ingested, and which partitions exist
+#   (a file that has grown since it was ingested is recognised by the end of the part already ingested, and only the
+#   new rows are parsed and appended)
+#   <store>/<room>/aggregates.pickle   aggregate pyramid of the whole room (see winterthur_data)
+# a file that is neither the stored file nor a grown version of it is stored as a new version of the room, so the
+# history already stored for a room is never written over
+# import needed packages
+import os
+import re
+import json
+import pickle
+import uuid
+import shutil
+import hashlib
+import pandas as pd
+import numpy as np
+from winterthur_data import (TEMP_COLUMN, RH_COLUMN, PARAMETER_COLUMNS, DATASETS, decode_contents, read_pm2_bytes,
+                             dataset_key, build_pyramid, pyramid_aggregates, extend_pyramid, with_dataset, get_dataset,
+                             store_dataset)
+from winterthur_dataset import SensorDataset
+from winterthur_cache import cache_key, single_flight, with_lock_file
+from winterthur_metrics import stage
+
+# location of the store; can be changed with the WINTERTHUR_STORE environment variable
+STORE_DIRECTORY = os.environ.get('WINTERTHUR_STORE',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sensor_store'))
+# file name of each stored column
+STORE_COLUMNS = {TEMP_COLUMN: 'temperature', RH_COLUMN: 'relative_humidity'}
+# channels in the saved aggregates: the stored columns and every derived channel
+AGGREGATE_COLUMNS = list(PARAMETER_COLUMNS.values())
+# message of the interfaces for a room that is not (or no longer) in the store
+MISSING_ROOM = '{} is no longer in the local data store. Please upload the file again.'
+# number of bytes at the end of the ingested part of a file that must be unchanged for a new version of the file
+# to be treated as the same file with rows added
+OVERLAP_BYTES = 4096
+
+
+# folder of a room; room names are file names, so only characters that are safe in a folder name are kept, followed
+# by a hash of the exact name so names that only differ in other characters (e.g. 'Room A' and 'Room_A') get folders
+# of their own. Rooms stored before the hash was added keep their folder
+def room_directory(room):
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', room)
+    directory = os.path.join(STORE_DIRECTORY, '{}-{}'.format(name, hashlib.sha1(room.encode()).hexdigest()[:12]))
+    legacy = os.path.join(STORE_DIRECTORY, name)
+    if not os.path.exists(directory) and (directory_manifest(legacy) or {}).get('room') == room:
+        return legacy
+    return directory
+
+def read_manifest(room):
+    return directory_manifest(room_directory(room))
+
+def directory_manifest(directory):
+    path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+# manifests of all rooms in the store; folders being written or removed start with '.'
+def stored_manifests():
+    if not os.path.isdir(STORE_DIRECTORY):
+        return []
+    manifests = [directory_manifest(os.path.join(STORE_DIRECTORY, name)) for name in os.listdir(STORE_DIRECTORY)
+                 if not name.startswith('.')]
+    return [manifest for manifest in manifests if manifest is not None]
+
+# names of all rooms in the store
+def list_rooms():
+    return sorted(manifest['room'] for manifest in stored_manifests())
+
+# manifests of the versions of a room (the room itself and '<room> (version 2)', ...), oldest first
+def room_versions(room):
+    versions = [manifest for manifest in stored_manifests() if manifest.get('baseRoom', manifest['room']) == room]
+    return sorted(versions, key=lambda manifest: manifest.get('version', 1))
+
+
+def write_json(path, data):
+    with open(path + '.writing', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.writing', path)
+
+# checksum of the last OVERLAP_BYTES bytes before position end
+def overlap_checksum(decoded, end):
+    return hashlib.sha1(decoded[max(end - OVERLAP_BYTES, 0):end]).hexdigest()
+
+
+# INGESTION_____________________________________________________________________________________________________________
+# add an uploaded .pm2 file to the store under the given room name; returns the name of the room it is stored as
+# a file that was already ingested for the room (or one of its versions) is not ingested again, and a file that is an
+# ingested file with rows added at the end (a newer export of the same logger) only has the new rows parsed and
+# appended. Any other file (e.g. of another logger, or an older or shorter export) is stored as a new version of the
+# room, '<room> (version 2)', ..., rather than replacing what is stored
+def ingest_pm2(room, contents):
+    key = dataset_key(contents)
+    # the same file uploaded by several users at once is ingested once while the others wait for it; different files
+    # for the same room are ingested one after the other, holding a lock file of the room
+    return single_flight(cache_key(key, 'ingest_pm2', room),
+                         lambda: with_lock_file(cache_key(room, 'ingest_room', None),
+                                                lambda: ingest_contents(room, contents, key)))
+
+def ingest_contents(room, contents, key):
+    versions = room_versions(room)
+    for manifest in versions:
+        if manifest['contentKey'] == key:
+            return manifest['room']
+    decoded = decode_contents(contents)
+    for manifest in versions:
+        if is_continuation(manifest, decoded):
+            tailBytes = decoded[manifest['bytes']:]
+            tail = read_pm2_bytes(tailBytes, header=False) if tailBytes.strip() else None
+            # the new rows must all come after the last stored row, otherwise the file is ingested again; it holds
+            # every row stored for the version, so nothing stored is lost
+            if not ((tail is None or tail.index[0] > pd.Timestamp(manifest['last'])) and
+                    append_room(manifest['room'], manifest, tail, key, decoded)):
+                write_room(manifest['room'], read_pm2_bytes(decoded), key, decoded, room,
+                           manifest.get('version', 1))
+            return manifest['room']
+    version = max([manifest.get('version', 1) for manifest in versions], default=0) + 1
+    name = room if version == 1 else '{} (version {})'.format(room, version)
+    write_room(name, read_pm2_bytes(decoded), key, decoded, room, version)
+    return name
+
+# True if the bytes ingested for a room are the start of decoded
+def is_continuation(manifest, decoded):
+    end = manifest.get('bytes')
+    return (end is not None and manifest['last'] is not None and len(decoded) > end and
+            overlap_checksum(decoded, end) == manifest['overlapChecksum'])
+
+# year/month partition name of each block of rows of a sorted dataframe, with the first and last+1 row of the block
+def month_blocks(df):
+    monthKey = df['year'].values.astype(np.int64) * 12 + df['month'].values
+    starts = np.flatnonzero(np.r_[True, monthKey[1:] != monthKey[:-1]]) if len(df) else np.zeros(0, dtype=np.int64)
+    return [('{}/{:02d}'.format(df['year'].iat[first], df['month'].iat[first]), first, last)
+            for first, last in zip(starts, np.append(starts[1:], len(df)))]
+
+# write a parsed dataframe as the partitions of a room (version number version of baseRoom), replacing what was
+# stored for it before; only called with the lock of baseRoom held (see ingest_pm2)
+@stage('serialize')
+def write_room(room, df, key, decoded, baseRoom, version):
+    directory = room_directory(room)
+    temporary = os.path.join(STORE_DIRECTORY, '.writing-' + uuid.uuid4().hex)
+    os.makedirs(temporary)
+    partitions = []
+    # data is sorted, so each year/month partition is a contiguous block of rows
+    for partition, first, last in month_blocks(df):
+        write_partition(os.path.join(temporary, partition), df.iloc[first:last])
+        partitions.append(partition)
+    # aggregates of the whole room, so summaries do not have to read every partition
+    save_aggregates(temporary, pyramid_aggregates(build_pyramid(SensorDataset.from_frame(df), AGGREGATE_COLUMNS)))
+    manifest = {'room': room, 'baseRoom': baseRoom, 'version': version, 'contentKey': key,
+                'partitions': partitions, 'rows': len(df),
+                'first': str(df.index[0]) if len(df) else None, 'last': str(df.index[-1]) if len(df) else None,
+                'bytes': len(decoded), 'overlapChecksum': overlap_checksum(decoded, len(decoded))}
+    write_json(os.path.join(temporary, 'manifest.json'), manifest)
+    # swap the new folder in only once it is complete, then remove the old one
+    old = os.path.join(STORE_DIRECTORY, '.removing-' + uuid.uuid4().hex)
+    if os.path.exists(directory):
+        os.replace(directory, old)
+    os.replace(temporary, directory)
+    shutil.rmtree(old, ignore_errors=True)
+
+# append the new rows of a grown file to a room: the last stored partition is rewritten with the rows that fall in
+# its month, later months get new partitions, and the saved aggregates are extended; cost is proportional to the
+# new rows (plus at most one month of stored rows)
+# returns False, without changing anything, if the stored room does not match its manifest (e.g. an earlier append
+# was interrupted), in which case the whole file has to be ingested again
+@stage('serialize')
+def append_room(room, manifest, tail, key, decoded):
+    directory = room_directory(room)
+    if tail is not None:
+        aggregatesPath = os.path.join(directory, 'aggregates.pickle')
+        with open(aggregatesPath, 'rb') as f:
+            aggregates = pickle.load(f)
+        if aggregates['15min']['first'][-1] != manifest['rows']: # number of samples in the aggregates
+            return False
+        last = np.datetime64(pd.Timestamp(manifest['last']).to_datetime64(), 'ns').astype(np.int64)
+        for partition, first, end in month_blocks(tail):
+            path = os.path.join(directory, partition)
+            if partition in manifest['partitions']:
+                times, columns = read_partition(path)
+                keep = np.searchsorted(times, last, side='right') # rows beyond the manifest are not ingested yet
+                stored = (times[:keep], {column: values[:keep] for column, values in columns.items()})
+                write_partition(path, tail.iloc[first:end], stored)
+            else:
+                write_partition(path, tail.iloc[first:end])
+                manifest['partitions'].append(partition)
+        save_aggregates(directory, extend_pyramid(aggregates, SensorDataset.from_frame(tail)))
+        manifest['rows'] += len(tail)
+        manifest['last'] = str(tail.index[-1])
+    DATASETS.pop(manifest['contentKey'], None) # aggregates cached under the old contents are out of date
+    manifest.update({'contentKey': key, 'bytes': len(decoded),
+                     'overlapChecksum': overlap_checksum(decoded, len(decoded))})
+    # written last; until then queries and the next ingestion only see the rows of the old manifest
+    write_json(os.path.join(directory, 'manifest.json'), manifest)
+    return True
+
+def save_aggregates(directory, aggregates):
+    path = os.path.join(directory, 'aggregates.pickle')
+    with open(path + '.writing', 'wb') as f:
+        pickle.dump(aggregates, f)
+    os.replace(path + '.writing', path)
+
+# write rows as a partition; with stored=(times, columns) of an existing partition, the rows are appended to it
+def write_partition(path, df, stored=None):
+    os.makedirs(path, exist_ok=True)
+    arrays = {'time': df.index.values.astype('datetime64[ns]').astype(np.int64)}
+    for column, name in STORE_COLUMNS.items():
+        arrays[name] = df[column].to_numpy(dtype=np.float32)
+    if stored is not None:
+        arrays['time'] = np.concatenate([stored[0], arrays['time']])
+        for column, name in STORE_COLUMNS.items():
+            arrays[name] = np.concatenate([stored[1][column], arrays[name]])
+    for name, values in arrays.items():
+        np.save(os.path.join(path, name + '.writing.npy'), values)
+    for name in arrays:
+        os.replace(os.path.join(path, name + '.writing.npy'), os.path.join(path, name + '.npy'))
+
+
+# QUERIES_______________________________________________________________________________________________________________
+# partitions of a room that can hold rows in (startDate, endDate] for the selected months
+def prune_partitions(manifest, startDate, endDate, monthsArray):
+    first = pd.Timestamp(startDate)
+    last = pd.Timestamp(endDate)
+    firstKey = first.year * 12 + first.month
+    lastKey = last.year * 12 + last.month
+    kept = []
+    for partition in manifest['partitions']:
+        year, month = [int(part) for part in partition.split('/')]
+        if firstKey <= year * 12 + month <= lastKey and (not monthsArray or month in monthsArray):
+            kept.append(partition)
+    return kept
+
+# readings are returned as float32 (stores written before readings were saved as float32 hold float64)
+def read_partition(path):
+    times = np.load(os.path.join(path, 'time.npy'), mmap_mode='r')
+    columns = {column: np.load(os.path.join(path, name + '.npy'), mmap_mode='r').astype(np.float32, copy=False)
+               for column, name in STORE_COLUMNS.items()}
+    return times, columns
+
+# rows of a room in the date range and months as a SensorDataset; only the partitions that can hold selected rows
+# are read
+@stage('serialize')
+def query_room(room, startDate, endDate, monthsArray):
+    manifest = read_manifest(room)
+    if manifest is None:
+        return None
+    directory = room_directory(room)
+    parts = [read_partition(os.path.join(directory, partition))
+             for partition in prune_partitions(manifest, startDate, endDate, monthsArray)]
+    times = np.concatenate([part[0] for part in parts]) if parts else np.zeros(0, dtype=np.int64)
+    data = {column: np.concatenate([part[1][column] for part in parts]) if parts else np.zeros(0, dtype=np.float32)
+            for column in STORE_COLUMNS}
+    dataset = SensorDataset.from_times(times, data)
+    if manifest['last'] is not None: # rows of an append that has not finished are left out
+        endDate = min(pd.Timestamp(endDate), pd.Timestamp(manifest['last']))
+    return dataset.select(startDate, endDate, monthsArray)
+
+# pyramid of a room for a date range and months: the saved aggregates plus the samples of the selected partitions
+def load_room(room, startDate, endDate, monthsArray):
+    manifest = read_manifest(room)
+    if manifest is None:
+        return None
+    key = manifest['contentKey']
+    aggregates = get_dataset(key)
+    if aggregates is None:
+        with open(os.path.join(room_directory(room), 'aggregates.pickle'), 'rb') as f:
+            aggregates = pickle.load(f)
+        if aggregates['columns'] != AGGREGATE_COLUMNS:
+            # saved before some of the derived channels existed; aggregated again from all the partitions, once
+            firstTime = pd.Timestamp(manifest['first']) - pd.Timedelta(1, 'ns') # start of the range is exclusive
+            everything = query_room(room, firstTime, manifest['last'], [])
+            aggregates = pyramid_aggregates(build_pyramid(everything, AGGREGATE_COLUMNS))
+            save_aggregates(room_directory(room), aggregates)
+        store_dataset(key, aggregates)
+    return with_dataset(aggregates, query_room(room, startDate, endDate, monthsArray))
@@ -0,0 +1,73 @@
+# swing over calendar periods in local time (LOCAL_TIMEZONE): the difference between the maximum and minimum of a
+# parameter within each clock hour (the hourly rate of change), each midnight-to-midnight day or each Monday-to-Sunday
+# week. The readings of a period are consecutive, so the maximum and minimum of every period, for every parameter at
+# once, are two grouped reductions (reduceat) over the stacked (parameter x time) readings.
+# import needed packages
+import pandas as pd
+import numpy as np
+from winterthur_metrics import stage
+
+# swing modes of the interfaces; 'rolling' is the swing over the 24 hours after each reading (rolling_swings)
+SWING_OPTIONS = [{'label': '24-hour rolling swing', 'value': 'rolling'},
+                 {'label': 'Daily swing (midnight to midnight, local time)', 'value': 'daily'},
+                 {'label': 'Weekly swing (Monday to Sunday, local time)', 'value': 'weekly'},
+                 {'label': 'Hourly rate of change (change within each clock hour, local time)', 'value': 'hourly'}]
+# calendar unit and name of the periods of each calendar swing mode
+SWING_UNITS = {'hourly': 'h', 'daily': 'D', 'weekly': 'W'}
+SWING_PERIODS = {'hourly': 'hours', 'daily': 'days', 'weekly': 'weeks'}
+# number of 15-minute readings in the 24 hours of a rolling swing
+ROLLING_SWING_POINTS = 96
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# local start time (the time of the first reading) of every period of a calendar swing mode in a SensorDataset, and
+# the swing of each column in each period as an array of (columns x periods); periods with a single reading have no
+# swing (NaN)
+@stage('analyse')
+def calendar_swings(dataset, columns, mode):
+    keys = dataset.local_bucket(SWING_UNITS[mode])
+    if len(keys) == 0:
+        return np.zeros(0, dtype='datetime64[ns]'), np.zeros((len(columns), 0))
+    starts = np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+    values = np.vstack([dataset[column] for column in columns])
+    with np.errstate(invalid='ignore'):
+        swings = np.fmax.reduceat(values, starts, axis=1) - np.fmin.reduceat(values, starts, axis=1)
+    swings[:, np.diff(np.append(starts, len(keys))) < 2] = np.nan
+    return dataset.local_times[starts], swings
+
+# largest swing, number of periods with a swing of at least the permitted swing, and number of periods with a swing
+def swing_statistics(swings, permitted):
+    known = swings[~np.isnan(swings)]
+    return (float(known.max()) if len(known) else np.nan), int(np.sum(known >= permitted)), len(known)
+
+# percentage of the periods of each month (rows) and year (columns) with a swing of at least the permitted swing,
+# for the contour plots
+def monthly_percent_over(periodStarts, swings, permitted):
+    known = ~np.isnan(swings)
+    starts = pd.DatetimeIndex(periodStarts[known])
+    over = pd.Series((swings[known] >= permitted) * 100.0)
+    return over.groupby([starts.month, starts.year]).mean().unstack()
+
+# swing over the window readings starting at each reading, for every row of a (parameter x time) array at once, as
+# in swing_analysis of the thesis tools (see benchmarks/parity.py): the readings of the last window of a selection have no full window and get a swing of 0
+# the maximum and minimum over each window are taken from the maxima and minima over windows of 1, 2, 4, ...
+# readings, so the cost grows with the log of the window instead of the window; missing readings are left out
+@stage('analyse')
+def rolling_swings(values, window=ROLLING_SWING_POINTS):
+    numEntries = values.shape[1]
+    numWindows = max(int(numEntries - window - 1), 0) # same windows as the thesis swing_analysis
+    swings = np.zeros(values.shape)
+    if numWindows == 0:
+        return swings
+    highs = lows = values
+    width = 1
+    while 2 * width <= window:
+        highs = np.fmax(highs[:, :-width], highs[:, width:])
+        lows = np.fmin(lows[:, :-width], lows[:, width:])
+        width *= 2
+    # a window is covered by the two (overlapping) power-of-two windows at its start and end
+    ends = np.arange(numWindows) + window - width
+    with np.errstate(invalid='ignore'):
+        swings[:, :numWindows] = (np.fmax(highs[:, :numWindows], highs[:, ends]) -
+                                  np.fmin(lows[:, :numWindows], lows[:, ends]))
+    return swings
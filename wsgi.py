@@ -0,0 +1,40 @@
+# one WSGI application serving all four interfaces, each under its own URL path, with an index page linking to them
+# it is meant for a production server running several worker processes, e.g. gunicorn (see gunicorn.conf.py):
+#   gunicorn -c gunicorn.conf.py wsgi:application
+# every worker serves every interface; the state the interfaces share between callbacks (uploaded data, jobs, cached
+# results and the data store) is kept on the server's disk, so any worker can answer any request
+# the timing of the callbacks and analyses of all the workers is served at /metrics (see winterthur_metrics.py)
+# import needed packages
+import flask
+import Bounds_and_Swing_Analysis_For_One_File
+import Bounds_And_Swing_Analysis_For_Multiple_Files
+import Cross_Correlation
+import Factor_Analysis
+
+# URL path, title and module of each interface
+INTERFACES = [('one-file', 'Bounds and Swing Analysis for One File', Bounds_and_Swing_Analysis_For_One_File),
+              ('multiple-files', 'Bounds and Swing Analysis for Multiple Files',
+               Bounds_And_Swing_Analysis_For_Multiple_Files),
+              ('cross-correlation', 'Cross-Correlation Analysis', Cross_Correlation),
+              ('factor-analysis', 'Factor Analysis', Factor_Analysis)]
+
+
+# FUNCTIONS_____________________________________________________________________________________________________________
+# Flask server with every interface mounted under /<path>/
+def create_server():
+    server = flask.Flask(__name__)
+    for path, title, module in INTERFACES:
+        module.create_app(server, '/{}/'.format(path))
+    server.add_url_rule('/', 'index', index)
+    return server
+
+def index():
+    links = ''.join('<li><a href="/{}/">{}</a></li>'.format(path, title) for path, title, module in INTERFACES)
+    return '<html><head><title>Winterthur Interfaces</title></head><body><h1>Winterthur Interfaces</h1>' \
+           '<ul>{}</ul></body></html>'.format(links)
+
+
+application = create_server()
+
+if __name__ == '__main__':
+    application.run(port=8050, threaded=True) # development server; use gunicorn (see gunicorn.conf.py) in production